@@ -0,0 +1,77 @@
+"""Benchmark of aggregations over chemical–gene interactions and chemical–disease associations in SQLite and in the
+columnar backend (Parquet files queried with DuckDB)
+
+Needs ``pip install pyctd[columnar]``. The database is filled with random associations.
+
+python3 docs/benchmark_columnar.py [number of rows]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+from pyctd.manager import models
+from pyctd.manager.columnar import ColumnarQueryManager, export_parquet
+from pyctd.manager.query import QueryManager
+
+
+def fill(query, number_of_rows):
+    query.create_all()
+    random = np.random.default_rng(0)
+    ids = np.arange(1, number_of_rows + 1)
+    pd.DataFrame({
+        'id': ids,
+        'chemical__id': random.integers(1, 10000, number_of_rows),
+        'gene__id': random.integers(1, 20000, number_of_rows),
+        'organism_id': random.choice([9606, 10090, 10116], number_of_rows),
+    }).to_sql(models.ChemGeneIxn.__tablename__, query.engine, if_exists='append', index=False, chunksize=100000)
+    pd.DataFrame({
+        'id': ids,
+        'chemical__id': random.integers(1, 10000, number_of_rows),
+        'disease__id': random.integers(1, 5000, number_of_rows),
+        'inference_score': random.random(number_of_rows) * 100,
+    }).to_sql(models.ChemicalDisease.__tablename__, query.engine, if_exists='append', index=False, chunksize=100000)
+
+
+def aggregations(query):
+    session = query.session
+    return [
+        ('count interactions in human',
+         lambda: query.count('get_chem_gene_interaction_actions', organism_id=9606)),
+        ('interactions per organism',
+         lambda: session.query(models.ChemGeneIxn.organism_id, func.count()).group_by(
+             models.ChemGeneIxn.organism_id).all()),
+        ('top 10 diseases by mean inference score',
+         lambda: session.query(models.ChemicalDisease.disease__id, func.avg(models.ChemicalDisease.inference_score))
+         .group_by(models.ChemicalDisease.disease__id)
+         .order_by(func.avg(models.ChemicalDisease.inference_score).desc()).limit(10).all()),
+    ]
+
+
+def main(number_of_rows):
+    directory = tempfile.mkdtemp()
+    row_store = QueryManager(connection='sqlite:///' + os.path.join(directory, 'pyctd.db'))
+    fill(row_store, number_of_rows)
+    export_parquet(row_store.engine, os.path.join(directory, 'parquet'))
+    column_store = ColumnarQueryManager(os.path.join(directory, 'parquet'))
+
+    print('{:<42}{:>12}{:>12}{:>10}'.format('aggregation ({} rows)'.format(number_of_rows), 'SQLite s', 'DuckDB s',
+                                            'speedup'))
+
+    for (name, row_function), (_, column_function) in zip(aggregations(row_store), aggregations(column_store)):
+        column_function()
+        timings = []
+        for function in (row_function, column_function):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        print('{:<42}{:>12.3f}{:>12.3f}{:>9.0f}x'.format(name, timings[0], timings[1], timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000000)
@@ -0,0 +1,40 @@
+"""Benchmark of the startup time of the library and the command line app
+
+Every command is run in a new Python process; the median wall time of all runs is reported. ``import pyctd`` and
+``pyctd get-connection`` must not import SQLAlchemy, pandas or numpy, ``QueryManager`` needs them.
+
+python3 docs/benchmark_import.py [number of runs]
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ('python (no import)', [sys.executable, '-c', 'pass']),
+    ('import pyctd', [sys.executable, '-c', 'import pyctd']),
+    ('pyctd get-connection', [sys.executable, '-m', 'pyctd', 'get-connection']),
+    ('pyctd --help', [sys.executable, '-m', 'pyctd', '--help']),
+    ('pyctd.query (QueryManager)', [sys.executable, '-c', 'import pyctd; pyctd.query']),
+]
+
+
+def measure(command, number_of_runs):
+    timings = []
+    for _ in range(number_of_runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(number_of_runs):
+    print('{:<32}{:>12}'.format('command ({} runs)'.format(number_of_runs), 'median ms'))
+
+    for name, command in COMMANDS:
+        print('{:<32}{:>12.1f}'.format(name, measure(command, number_of_runs) * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
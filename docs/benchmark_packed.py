@@ -0,0 +1,70 @@
+"""Benchmark of the import of PubMed identifiers as one row per identifier and as packed ID lists (compact storage
+mode)
+
+A CTD chemical–gene interaction file with PubMed identifiers drawn from a pool of 150,000 publications is imported
+into two SQLite databases; the import time of the identifiers (including the inverted index of the packed lists) and
+the size of the databases are compared.
+
+python3 docs/benchmark_packed.py [number of interactions] [mean number of PubMed identifiers per interaction]
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pyctd.manager import table_conf
+from pyctd.manager.database import DbManager
+from pyctd.manager.models import ChemGeneIxn
+
+
+def write_file(path, number_of_rows, mean_number_of_ids):
+    random = np.random.default_rng(0)
+    counts = random.poisson(mean_number_of_ids - 1, number_of_rows) + 1
+    publications = random.choice(35000000, 150000, replace=False) + 1
+    ids = publications[random.integers(0, len(publications), counts.sum())]
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    with gzip.open(path, 'wt', compresslevel=1) as file:
+        file.write('# Fields:\n# ChemicalName\tChemicalID\tCasRN\tGeneSymbol\tGeneID\tGeneForms\tOrganism\t'
+                   'OrganismID\tInteraction\tInteractionActions\tPubMedIDs\n#\n')
+        for row in range(number_of_rows):
+            file.write('\t'.join(['', '', '', '', '', '', '', '', '', '', '|'.join(
+                map(str, ids[offsets[row]:offsets[row + 1]]))]) + '\n')
+
+    return int(counts.sum())
+
+
+def main(number_of_rows, mean_number_of_ids):
+    directory = tempfile.mkdtemp()
+    DbManager.pyctd_data_dir = directory
+    table = next(table for table in DbManager().tables if table.model is ChemGeneIxn)
+    file_path = os.path.join(directory, table_conf.tables[ChemGeneIxn].file_name)
+    number_of_ids = write_file(file_path, number_of_rows, mean_number_of_ids)
+    column_index = DbManager.get_index_of_column('PubMedIDs', file_path)
+
+    print('{} interactions with {} PubMed identifiers'.format(number_of_rows, number_of_ids))
+    print('{:<10}{:>12}{:>12}'.format('storage', 'import s', 'size MB'))
+
+    for storage in ('rows', 'packed'):
+        path = os.path.join(directory, storage + '.db')
+        manager = DbManager(connection='sqlite:///' + path)
+        manager.create_all()
+
+        start = time.perf_counter()
+        if storage == 'rows':
+            manager.import_one_to_many(file_path, column_index, table, 'pubmed_id')
+        else:
+            manager.import_packed_id_list(file_path, column_index, table, 'pubmed_id')
+            manager.build_packed_id_index()
+        duration = time.perf_counter() - start
+
+        manager.engine.dispose()
+        print('{:<10}{:>12.1f}{:>12.1f}'.format(storage, duration, os.path.getsize(path) / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, float(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,61 @@
+"""Benchmark of PubMed lookups (all chemical–gene interactions of a batch of PubMed identifiers) by scanning the child
+table and with the inverted index
+
+The CTD chemical–gene interaction file of ``docs/benchmark_packed.py`` is imported with one row per PubMed identifier
+into a SQLite database; a batch of random PubMed identifiers is looked up before and after the inverted index is built.
+
+python3 docs/benchmark_pubmed.py [number of interactions] [number of PubMed identifiers per batch]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from benchmark_packed import write_file
+from pyctd.manager import table_conf
+from pyctd.manager.database import DbManager
+from pyctd.manager.models import ChemGeneIxn, ChemGeneIxnPubmed
+from pyctd.manager.query import QueryManager
+
+
+def measure(query, pmids):
+    start = time.perf_counter()
+    parent_ids = query.get_parent_ids('chem_gene_ixn__pubmed_id', pmids)
+    return time.perf_counter() - start, sum(len(ids) for ids in parent_ids.values())
+
+
+def main(number_of_rows, batch_size):
+    directory = tempfile.mkdtemp()
+    DbManager.pyctd_data_dir = directory
+    connection = 'sqlite:///' + os.path.join(directory, 'pyctd.db')
+
+    manager = DbManager(connection=connection)
+    manager.create_all()
+    table = next(table for table in manager.tables if table.model is ChemGeneIxn)
+    file_path = os.path.join(directory, table_conf.tables[ChemGeneIxn].file_name)
+    write_file(file_path, number_of_rows, 3)
+    manager.import_one_to_many(file_path, DbManager.get_index_of_column('PubMedIDs', file_path), table, 'pubmed_id')
+
+    query = QueryManager(connection=connection)
+    pubmed_ids = np.unique([row[0] for row in query.session.execute(select(ChemGeneIxnPubmed.pubmed_id))])
+    pmids = np.random.default_rng(1).choice(pubmed_ids, batch_size, replace=False).tolist()
+
+    scan, number_of_interactions = measure(query, pmids)
+
+    start = time.perf_counter()
+    manager.build_packed_id_index()
+    build = time.perf_counter() - start
+
+    index, _ = measure(query, pmids)
+
+    print('{} interactions, {} PubMed identifiers with {} interactions'.format(
+        number_of_rows, batch_size, number_of_interactions))
+    print('scan {:.3f} s, inverted index {:.3f} s (built in {:.1f} s)'.format(scan, index, build))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
@@ -0,0 +1,58 @@
+"""Micro-benchmark of the per-call overhead of QueryManager methods with and without statement cache
+
+Runs against an in-memory SQLite database with a few rows, so the measured time is mostly spent in Python
+(building, compiling and binding the statement) and not in the database.
+
+python3 docs/benchmark_statement_cache.py
+"""
+
+import timeit
+
+from pyctd.manager import models
+from pyctd.manager.query import QueryManager
+
+NUMBER = 2000
+
+CALLS = [
+    ('get_gene', dict(gene_symbol='APP')),
+    ('get_chemical', dict(chemical_id='D001241')),
+    ('get_chem_gene_interaction_actions', dict(gene_symbol='APP', chemical_name='Aspirin', organism_id=9606)),
+    ('get_chemical_diseases', dict(chemical_name='Aspirin', disease_name='Asthma', limit=10)),
+]
+
+
+def fill(query):
+    query.create_all()
+    session = query.session
+    gene = models.Gene(gene_symbol='APP', gene_name='amyloid beta precursor protein', gene_id=351)
+    chemical = models.Chemical(chemical_name='Aspirin', chemical_id='D001241', cas_rn='50-78-2')
+    disease = models.Disease(disease_name='Asthma', disease_id='MESH:D001249')
+    session.add_all([
+        gene, chemical, disease,
+        models.ChemGeneIxn(chemical=chemical, gene=gene, organism_id=9606, interaction='Aspirin decreases APP'),
+        models.ChemicalDisease(chemical=chemical, disease=disease, direct_evidence='therapeutic'),
+    ])
+    session.commit()
+
+
+def main():
+    query = QueryManager(connection='sqlite://')
+    fill(query)
+
+    print('{:<40}{:>14}{:>14}{:>10}'.format('method', 'uncached µs', 'cached µs', 'speedup'))
+
+    for method, kwargs in CALLS:
+        function = getattr(query, method)
+
+        query.statement_cache_size = 0
+        uncached = timeit.timeit(lambda: function(**kwargs), number=NUMBER) / NUMBER * 1e6
+
+        query.statement_cache_size = QueryManager.statement_cache_size
+        function(**kwargs)
+        cached = timeit.timeit(lambda: function(**kwargs), number=NUMBER) / NUMBER * 1e6
+
+        print('{:<40}{:>14.1f}{:>14.1f}{:>9.1f}x'.format(method, uncached, cached, uncached / cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -86,6 +86,7 @@ create_uml_files([
     models.ChemGeneIxn,
     models.ChemGeneIxnGeneForm,
     models.ChemGeneIxnInteractionAction,
+    models.InteractionActionType,
     models.ChemGeneIxnPubmed,
     models.Gene,
     models.Chemical
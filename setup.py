@@ -14,15 +14,22 @@ KEYWORDS = ['Toxicogenomics', 'Database', 'Bioinformatics', 'Human health']
 
 INSTALL_REQUIRES = [
     'pandas',
-    'sqlalchemy',
+    'sqlalchemy>=1.4',
     'requests',
     'click',
     'pymysql',
     'numpy',
+    'scipy',
     'pydantic',
     'cryptography'
 ]
 
+EXTRAS_REQUIRE = {
+    'async': ['aiosqlite', 'aiomysql', 'asyncpg'],
+    'columnar': ['duckdb', 'duckdb-engine'],
+    'export': ['pyarrow'],
+}
+
 if sys.version_info < (3,):
     INSTALL_REQUIRES.append('configparser')
 
@@ -77,6 +84,7 @@ setup(
     license=find_meta('license'),
     packages=PACKAGES,
     install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
     package_dir={'': 'src'},
     classifiers=[
         'Development Status :: 5 - Production/Stable',
@@ -14,13 +14,30 @@ Installation
     pip install pyctd
 """
 
-from . import manager
-from .manager.database import update
-from .manager.database import set_connection, set_mysql_connection
-from .manager.query import QueryManager as query
+import importlib
+
+from .manager.config import set_connection, set_mysql_connection
 
 __all__ = ['update', 'query', 'set_connection', 'set_mysql_connection']
 
+_lazy_attributes = {
+    'manager': ('.manager', None),
+    'update': ('.manager.database', 'update'),
+    'query': ('.manager.query', 'QueryManager'),
+}
+
+
+def __getattr__(name):
+    """imports :mod:`pyctd.manager` (and with it SQLAlchemy, pandas and numpy) on first use"""
+    if name not in _lazy_attributes:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+    module_name, attribute = _lazy_attributes[name]
+    module = importlib.import_module(module_name, __name__)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
 __version__ = '0.5.10-dev'
 
 __title__ = 'PyCTD'
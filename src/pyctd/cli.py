@@ -23,41 +23,140 @@ import click
 
 from . import manager
 from .constants import PYCTD_DIR
-from .manager.database import get_connection_string
-
-logging.basicConfig(level=logging.DEBUG)
 
 log = logging.getLogger('pyctd')
-log.setLevel(logging.INFO)
 
-fh_path = os.path.join(PYCTD_DIR, time.strftime('pyctd_%Y_%m_%d_%H_%M_%S.txt'))
-fh = logging.FileHandler(fh_path)
-fh.setLevel(logging.DEBUG)
-log.addHandler(fh)
+CONNECTION_HELP = 'Connection string. Defaults to the configured connection string (see "pyctd get-connection")'
+
+LIGHT_COMMANDS = ('get-connection', 'set-connnection', 'set-mysql')
+"""commands which only read or write the configuration (no log file, no SQLAlchemy)"""
+
+
+def setup_logging():
+    """logs to stderr and to a timestamped file in the pyctd folder"""
+    logging.basicConfig(level=logging.DEBUG)
+    log.setLevel(logging.INFO)
+
+    os.makedirs(PYCTD_DIR, exist_ok=True)
+    fh_path = os.path.join(PYCTD_DIR, time.strftime('pyctd_%Y_%m_%d_%H_%M_%S.txt'))
+    fh = logging.FileHandler(fh_path)
+    fh.setLevel(logging.DEBUG)
+    log.addHandler(fh)
 
 
 @click.group(help="PyCTD Command Line Utilities on {}".format(sys.executable))
 @click.version_option()
-def main():
-    pass
+@click.pass_context
+def main(ctx):
+    if ctx.invoked_subcommand not in LIGHT_COMMANDS:
+        setup_logging()
 
 
 @main.command()
-@click.option('-c', '--connection', help='Connection string. Defaults to {}'.format(get_connection_string()))
+@click.option('-c', '--connection', help=CONNECTION_HELP)
 @click.option('-f', '--force_download', is_flag=True, help='forces download; overwrites last download')
-def update(connection, force_download):
+@click.option('-k', '--top_k', type=int, help='builds tables with the top k ranked associations per disease and '
+                                              'chemical for ranked queries')
+@click.option('-p', '--parquet_dir', help='exports all tables as Parquet files to this directory for the '
+                                           'columnar backend')
+@click.option('-s', '--similarity', is_flag=True, help='builds the MinHash/LSH indices for similarity searches')
+@click.option('--packed', is_flag=True, help='stores PubMed and OMIM identifiers as packed lists (compact storage)')
+def update(connection, force_download, top_k, parquet_dir, similarity, packed):
     """Update the database"""
     manager.database.update(
         connection=connection,
-        force_download=force_download
+        force_download=force_download,
+        top_k=top_k,
+        parquet_dir=parquet_dir,
+        similarity=similarity,
+        packed=packed
     )
 
 
+@main.command()
+@click.option('-c', '--connection', help=CONNECTION_HELP)
+@click.option('-k', '--top_k', type=int, default=500, help='number of top ranked associations (default: 500)')
+def build_top_k(connection, top_k):
+    """Build top-k tables for ranked queries in an existing database"""
+    manager.database.DbManager(connection=connection).build_top_k(top_k)
+
+
+@main.command()
+@click.option('-c', '--connection', help=CONNECTION_HELP)
+@click.option('-d', '--directory', help='directory of the Parquet files')
+def build_parquet(connection, directory):
+    """Export all tables of an existing database as Parquet files for the columnar backend"""
+    manager.database.DbManager(connection=connection).build_parquet(directory)
+
+
+@main.command()
+@click.option('-c', '--connection', help=CONNECTION_HELP)
+def build_similarity(connection):
+    """Build the MinHash/LSH indices for similarity searches of chemicals, genes and diseases"""
+    manager.database.DbManager(connection=connection).build_similarity_indices()
+
+
+@main.command()
+@click.option('-c', '--connection', help=CONNECTION_HELP)
+def build_id_index(connection):
+    """Build the inverted index of PubMed and OMIM identifiers (e.g. for lookups by PubMed identifier)"""
+    manager.database.DbManager(connection=connection).build_packed_id_index()
+
+
+@main.command()
+@click.option('-c', '--connection', help=CONNECTION_HELP)
+@click.option('-o', '--directory', default='.', help='directory of the exported files (default: current directory)')
+@click.option('-f', '--file_format', type=click.Choice(['tsv', 'jsonl', 'parquet', 'neo4j']), default='tsv',
+              help='file format; neo4j writes node and relationship CSV files for neo4j-admin import')
+@click.option('-t', '--table', 'tables', multiple=True, help='table to export, e.g. chemical (default: all tables)')
+@click.option('--children', is_flag=True, help='adds one-to-many child tables (e.g. synonyms) as list columns')
+@click.option('-w', '--workers', type=int, default=4, help='number of tables exported at the same time')
+@click.option('--chunksize', type=int, default=50000, help='number of rows written at once (default: 50000)')
+def export(connection, directory, file_format, tables, children, workers, chunksize):
+    """Export tables to TSV, JSON Lines, Parquet or neo4j-admin import files"""
+    engine = manager.database.BaseDbManager(connection=connection).engine
+
+    if file_format == 'neo4j':
+        manager.export.export_neo4j(engine, directory, chunksize=chunksize, workers=workers)
+    else:
+        manager.export.export_tables(engine, directory, tables=tables or None, file_format=file_format,
+                                     chunksize=chunksize, children=children, workers=workers)
+
+
+@main.group()
+def snapshot():
+    """Create and restore prebuilt database snapshots"""
+
+
+@snapshot.command()
+@click.argument('path')
+@click.option('-c', '--connection', help=CONNECTION_HELP)
+@click.option('--compression', type=click.Choice(['gz', 'none']), default='gz', help='compression (default: gz)')
+@click.option('--dump', is_flag=True, help='dumps a SQLite database table by table (restorable to other dialects)')
+def create(path, connection, compression, dump):
+    """Package the database with a manifest into a snapshot file, e.g. ctd.tar.gz"""
+    manifest = manager.snapshot.create_snapshot(path, connection=connection, dump=dump,
+                                                compression=None if compression == 'none' else compression)
+    click.echo('snapshot of data version {} written to {}'.format(manifest['data_version'], path))
+
+
+@snapshot.command()
+@click.argument('source')
+@click.option('-c', '--connection', help=CONNECTION_HELP)
+@click.option('--sha256', help='expected SHA-256 checksum of the snapshot (default: from <source>.sha256)')
+@click.option('-f', '--force', is_flag=True, help='restores snapshots of another schema version')
+def restore(source, connection, sha256, force):
+    """Restore the database from a snapshot file or URL"""
+    manifest = manager.snapshot.restore_snapshot(source, connection=connection, checksum=sha256, force=force)
+    click.echo('restored data version {} (CTD release {})'.format(manifest['data_version'],
+                                                                  manifest['ctd_release']))
+
+
 @main.command()
 @click.argument('connection')
 def set_connnection(connection):
     """Set the SQLAlchemy connection string"""
-    manager.database.set_connection(connection)
+    manager.config.set_connection(connection)
 
 
 @main.command()
@@ -68,7 +167,7 @@ def set_connnection(connection):
 @click.option('-c', '--charset', default='utf8')
 def set_mysql(host, user, password, db, charset):
     """Set the SQLAlchemy connection string with MySQL settings"""
-    manager.database.set_mysql_connection(
+    manager.config.set_mysql_connection(
         host=host,
         user=user,
         password=password,
@@ -80,7 +179,7 @@ def set_mysql(host, user, password, db, charset):
 @main.command()
 def get_connection():
     """Get the connection string"""
-    click.echo(get_connection_string())
+    click.echo(manager.config.get_connection_string())
 
 
 if __name__ == '__main__':
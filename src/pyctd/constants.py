@@ -3,12 +3,11 @@
 import os
 
 PYCTD_DIR = os.path.expanduser('~/.pyctd')
-if not os.path.exists(PYCTD_DIR):
-    os.mkdir(PYCTD_DIR)
+"""directory of the configuration and log files (created when the first file is written)"""
 
 PYCTD_DATA_DIR = os.path.join(PYCTD_DIR, 'data')
-if not os.path.exists(PYCTD_DATA_DIR):
-    os.mkdir(PYCTD_DATA_DIR)
+"""directory of the downloaded CTD files, the default SQLite database and cached indices (created when the first
+file is written)"""
 
 
 class bcolors:
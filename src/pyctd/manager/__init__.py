@@ -5,8 +5,19 @@ The pyctd.manager module serves as an interface between the CTD graph data struc
 databases.
 """
 
-from . import defaults
-from . import models
-from . import table_conf
-from . import database
-from . import query
+import importlib
+
+_submodules = {
+    'async_query', 'columnar', 'config', 'database', 'defaults', 'enrichment', 'explain', 'export', 'graph',
+    'hierarchy', 'instrumentation', 'loading', 'matrices', 'model_types', 'models', 'packed', 'pagination',
+    'propagation', 'query', 'readonly', 'records', 'resolver', 'similarity', 'snapshot', 'statements', 'table',
+    'table_conf',
+}
+
+
+def __getattr__(name):
+    """imports the submodules on first use, so that e.g. reading the configuration does not load SQLAlchemy"""
+    if name not in _submodules:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+    return importlib.import_module('.' + name, __name__)
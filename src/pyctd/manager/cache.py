@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""Files with data derived from the database (graphs, matrices and indices) cached in the pyctd data folder
+
+A file is named ``<name>_<connection>_<data version>.<extension>`` with a hash of the connection string, so that
+databases with the same data version never share a file. Files are written under a temporary name and renamed when
+complete, so a file is never read half-written. After a new file is written, the files of the same name and
+connection with other data versions are removed.
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+
+from ..constants import PYCTD_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+
+def get_connection_key(connection):
+    """returns a short hash of a connection string (without password in file names)
+
+    :param str connection: SQLAlchemy connection string
+    :rtype: str
+    """
+    return hashlib.sha1(str(connection).encode('utf-8')).hexdigest()[:12]
+
+
+def get_path(manager, name, extension='npz', cache_dir=PYCTD_DATA_DIR):
+    """returns the path of the cached file of the current data version or None if the data version is not set
+
+    :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+    :param str name: name of the cached data, e.g. 'graph'
+    :param str extension: file extension
+    :param str cache_dir: directory of cached files
+    :rtype: Optional[str]
+    """
+    data_version = manager.data_version
+
+    if data_version is None:
+        return None
+
+    file_name = '{}_{}_{}.{}'.format(name, get_connection_key(manager.connection), data_version, extension)
+    return os.path.join(cache_dir, file_name)
+
+
+def prune(path):
+    """removes the files of the same name and connection as path with other data versions
+
+    :param str path: path of a cached file (see :func:`get_path`)
+    """
+    directory, file_name = os.path.split(path)
+    prefix, extension = os.path.splitext(file_name)
+    prefix = prefix.rsplit('_', 1)[0]
+
+    for stale_path in glob.glob(os.path.join(glob.escape(directory), glob.escape(prefix) + '_*' + extension)):
+        if stale_path == path:
+            continue
+        try:
+            os.remove(stale_path)
+        except OSError:
+            log.warning('can not remove stale cache file %s', stale_path)
+        else:
+            log.info('removed stale cache file %s', stale_path)
+
+
+def load_or_build(manager, name, build, load, save, extension='npz', cache_dir=PYCTD_DATA_DIR, reload=False):
+    """loads data of the current data version from the cache folder or builds, caches and returns it
+
+    :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+    :param str name: name of the cached data, e.g. 'graph'
+    :param build: function without arguments which builds the data from the database
+    :param load: function which loads the data from a path
+    :param save: function which saves data to a path
+    :param str extension: file extension
+    :param str cache_dir: directory of cached files
+    :param bool reload: if True the built data is loaded from the written file (e.g. to memory map it)
+    """
+    path = get_path(manager, name, extension=extension, cache_dir=cache_dir)
+
+    if path is None:
+        return build()
+
+    if os.path.exists(path):
+        log.info('load %s from %s', name, path)
+        return load(path)
+
+    data = build()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(prefix='.tmp.', suffix='.' + extension, dir=cache_dir)
+    os.close(file_descriptor)
+    try:
+        save(data, temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+    log.info('%s cached in %s', name, path)
+    prune(path)
+
+    return load(path) if reload else data
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""Columnar query backend on Parquet files and DuckDB
+
+All tables are exported from the SQL database to Parquet files (one per table, compressed, ordered by primary key).
+:class:`ColumnarQueryManager` serves the same ``get_*`` API as :class:`pyctd.manager.query.QueryManager` from these
+files with DuckDB, an embedded vectorized engine: only the columns of a query are read (projection pruning), filters
+skip row groups by their min/max statistics (predicate pushdown) and scans and aggregations run on all cores. No SQL
+server is needed; the files can be shared read-only by many processes.
+
+Install the dependencies with ``pip install pyctd[columnar]``.
+
+.. code-block:: python
+
+    >>> from pyctd.manager.columnar import ColumnarQueryManager
+    >>> query = ColumnarQueryManager()
+    >>> query.get_chem_gene_interaction_actions(gene_symbol='APP', as_df=True)
+    >>> query.count('get_chemical_diseases', direct_evidence='therapeutic')
+"""
+
+import logging
+import os
+
+import duckdb
+import pandas as pd
+from sqlalchemy import inspect, select
+from sqlalchemy.sql import sqltypes
+
+from . import models
+from .database import get_engine, get_scoped_session
+from .query import QueryManager
+from ..constants import PYCTD_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PARQUET_DIR = os.path.join(PYCTD_DATA_DIR, 'parquet')
+"""default directory of the Parquet files"""
+
+DATABASE_FILE_NAME = 'pyctd.duckdb'
+"""name of the DuckDB database with the views on the Parquet files"""
+
+ROW_GROUP_SIZE = 122880
+"""rows per row group of the Parquet files (unit of predicate pushdown and parallel scans)"""
+
+_duckdb_types = (
+    (sqltypes.SmallInteger, 'SMALLINT'),
+    (sqltypes.BigInteger, 'BIGINT'),
+    (sqltypes.Integer, 'INTEGER'),
+    (sqltypes.Float, 'DOUBLE'),
+    (sqltypes.Numeric, 'DOUBLE'),
+    (sqltypes.Boolean, 'BOOLEAN'),
+    (sqltypes.LargeBinary, 'BLOB'),
+)
+
+
+def get_duckdb_type(column_type):
+    """returns the DuckDB type of a SQLAlchemy column type
+
+    :param sqlalchemy.types.TypeEngine column_type: SQLAlchemy type
+    :rtype: str
+    """
+    for sqlalchemy_type, duckdb_type in _duckdb_types:
+        if isinstance(column_type, sqlalchemy_type):
+            return duckdb_type
+    return 'VARCHAR'
+
+
+def _quote(path):
+    return "'{}'".format(path.replace("'", "''"))
+
+
+def export_parquet(engine, directory=DEFAULT_PARQUET_DIR, chunksize=100000, row_group_size=ROW_GROUP_SIZE):
+    """exports all tables of a database to Parquet files and creates the DuckDB database with views on them
+
+    :param sqlalchemy.engine.Engine engine: engine of the SQL database
+    :param str directory: directory of the Parquet files
+    :param int chunksize: number of rows read from the SQL database at once
+    :param int row_group_size: rows per row group of the Parquet files
+    """
+    directory = os.path.abspath(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    staging_path = os.path.join(directory, 'staging.duckdb')
+    if os.path.exists(staging_path):
+        os.remove(staging_path)
+
+    table_names = set(inspect(engine).get_table_names())
+    tables = [table for table in models.Base.metadata.sorted_tables if table.name in table_names]
+
+    with duckdb.connect(staging_path) as staging:
+        for table in tables:
+            log.info('export %s to Parquet', table.name)
+            columns = ', '.join('"{}" {}'.format(column.name, get_duckdb_type(column.type)) for column in table.columns)
+            staging.execute('CREATE TABLE "{}" ({})'.format(table.name, columns))
+
+            integer_columns = [column.name for column in table.columns if isinstance(column.type, sqltypes.Integer)]
+            statement = select(table).order_by(*table.primary_key.columns)
+
+            for chunk in pd.read_sql(statement, engine, chunksize=chunksize):
+                for name in integer_columns:
+                    chunk[name] = chunk[name].astype('Int64')
+                staging.register('chunk', chunk)
+                staging.execute('INSERT INTO "{0}" BY NAME SELECT * FROM chunk'.format(table.name))
+                staging.unregister('chunk')
+
+            path = os.path.join(directory, table.name + '.parquet')
+            staging.execute("COPY (SELECT * FROM \"{}\" ORDER BY {}) TO {} (FORMAT PARQUET, COMPRESSION ZSTD, "
+                            "ROW_GROUP_SIZE {:d})".format(
+                                table.name, ', '.join('"{}"'.format(c.name) for c in table.primary_key.columns),
+                                _quote(path + '.tmp'), row_group_size))
+            os.replace(path + '.tmp', path)
+            staging.execute('DROP TABLE "{}"'.format(table.name))
+
+    os.remove(staging_path)
+
+    database_path = os.path.join(directory, DATABASE_FILE_NAME)
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    with duckdb.connect(database_path, config={'file_search_path': directory}) as database:
+        for table in tables:
+            database.execute('CREATE VIEW "{}" AS SELECT * FROM read_parquet({})'.format(
+                table.name, _quote(table.name + '.parquet')))
+
+    log.info('Parquet files exported to %s', directory)
+
+
+class ColumnarQueryManager(QueryManager):
+    """Query interface to the Parquet files exported by :func:`export_parquet` (see
+    :meth:`pyctd.manager.database.DbManager.build_parquet`)
+
+    All ``get_*`` methods, :meth:`count`, :meth:`paginate` and the properties of
+    :class:`pyctd.manager.query.QueryManager` are available. The files are opened read-only.
+    """
+
+    def __init__(self, directory=DEFAULT_PARQUET_DIR, threads=None, memory_limit=None, echo=False,
+                 scopefunc=None, **engine_kwargs):
+        """
+        :param str directory: directory of the Parquet files
+        :param int threads: number of threads of scans and aggregations (default: number of cores)
+        :param str memory_limit: maximum memory of DuckDB, e.g. '4GB' (default: 80% of the RAM)
+        :param bool echo: True or False for SQL output of SQLAlchemy engine
+        :param scopefunc: function returning an identifier of the current scope (default: current thread)
+        :param engine_kwargs: further arguments for :func:`sqlalchemy.create_engine`
+        """
+        directory = os.path.abspath(directory)
+        database_path = os.path.join(directory, DATABASE_FILE_NAME)
+
+        if not os.path.exists(database_path):
+            raise ValueError('no Parquet files in {}, export them with "pyctd build-parquet"'.format(directory))
+
+        config = {'file_search_path': directory}
+        if threads:
+            config['threads'] = threads
+        if memory_limit:
+            config['memory_limit'] = memory_limit
+
+        engine_kwargs.setdefault('connect_args', {'read_only': True, 'config': config})
+
+        self.directory = directory
+        self.connection = 'duckdb:///' + database_path
+        self.engine = get_engine(self.connection, echo=echo, **engine_kwargs)
+        self.scoped_session = get_scoped_session(self.engine, scopefunc=scopefunc)
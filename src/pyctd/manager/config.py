@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""Reads and writes the SQLAlchemy connection string in the configuration file
+
+This module only needs the standard library, so the command line app can read the configuration without importing
+SQLAlchemy or pandas.
+"""
+
+import logging
+import os
+from configparser import RawConfigParser
+
+from . import defaults
+from ..constants import PYCTD_DIR
+
+log = logging.getLogger(__name__)
+
+
+def get_connection_string(connection=None):
+    """return SQLAlchemy connection string if it is set
+
+    Without configuration file the default connection string is returned (the file is only written by
+    :func:`set_connection`).
+
+    :param connection: get the SQLAlchemy connection string #TODO
+    :rtype: str
+    """
+    if not connection:
+        cfp = defaults.config_file_path
+        connection = defaults.sqlalchemy_connection_string_default
+
+        if os.path.exists(cfp):
+            config = RawConfigParser()
+            log.info('fetch database configuration from %s', cfp)
+            config.read(cfp)
+            connection = config['database']['sqlalchemy_connection_string']
+            log.info('load connection string from %s: %s', cfp, connection)
+
+    return connection
+
+
+def set_connection(connection=defaults.sqlalchemy_connection_string_default):
+    """Set the connection string for SQLAlchemy
+
+    :param str connection: SQLAlchemy connection string
+    """
+    cfp = defaults.config_file_path
+    config = RawConfigParser()
+
+    if not os.path.exists(cfp):
+        os.makedirs(PYCTD_DIR, exist_ok=True)
+        with open(cfp, 'w') as config_file:
+            config['database'] = {'sqlalchemy_connection_string': connection}
+            config.write(config_file)
+            log.info('create configuration file %s', cfp)
+    else:
+        config.read(cfp)
+        config.set('database', 'sqlalchemy_connection_string', connection)
+        with open(cfp, 'w') as configfile:
+            config.write(configfile)
+
+
+def set_mysql_connection(host='localhost', user='pyctd_user', password='pyctd_passwd', db='pyctd', charset='utf8'):
+    """Sets the connection using MySQL Parameters"""
+    set_connection('mysql+pymysql://{user}:{passwd}@{host}/{db}?charset={charset}'.format(
+        host=host,
+        user=user,
+        passwd=password,
+        db=db,
+        charset=charset)
+    )
+
+
+def set_test_connection():
+    """Sets the connection with the default SQLite test database"""
+    set_connection(defaults.DEFAULT_SQLITE_TEST_DATABASE_NAME)
@@ -2,16 +2,17 @@
 
 """PyCTD loads all CTD content in the database. Content is available via functions."""
 
-from codecs import ignore_errors
-import configparser
 import gzip
 import io
 import logging
 import os
 import re
 import sys
+import threading
 import time
-from configparser import RawConfigParser
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 from .table import Table
 from typing import List, Dict
 from .table_conf import OneToManyConfig
@@ -19,14 +20,17 @@ from .table_conf import OneToManyConfig
 import numpy as np
 import pandas as pd
 from requests.compat import urlparse
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.engine import reflection
+from sqlalchemy import create_engine, distinct, exc, func, inspect, literal, select
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.sql import sqltypes
 
 from . import defaults
 from . import models
 from . import table_conf
+from .config import get_connection_string, set_connection, set_mysql_connection, set_test_connection
+from .model_types import action
+from .packed import pack, set_storage_mode, unpack_many
 from .table import get_table_configurations
 from .table import Table
 from ..constants import PYCTD_DATA_DIR, PYCTD_DIR, bcolors
@@ -42,66 +46,226 @@ alchemy_pandas_dytpe_mapper = {
     sqltypes.Text: np.unicode_,
     sqltypes.String: np.unicode_,
     sqltypes.Integer: np.float64,
+    sqltypes.SmallInteger: np.float64,
     sqltypes.REAL: np.double,
     sqltypes.BigInteger: 'Int64',
 }
 
 
-def get_connection_string(connection=None):
-    """return SQLAlchemy connection string if it is set
+_engines = {}
+_scoped_sessions = {}
+_registry_lock = threading.RLock()
+_log_handler = None
 
-    :param connection: get the SQLAlchemy connection string #TODO
-    :rtype: str
+
+def _add_log_file_handler():
+    """adds the file handler for the database log (only once per process)"""
+    global _log_handler
+
+    with _registry_lock:
+        if _log_handler is not None:
+            return
+
+        log.setLevel(logging.INFO)
+        os.makedirs(PYCTD_DIR, exist_ok=True)
+        _log_handler = logging.FileHandler(os.path.join(
+            PYCTD_DIR, defaults.TABLE_PREFIX + 'database.log'))
+        _log_handler.setLevel(logging.INFO)
+
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        _log_handler.setFormatter(formatter)
+        log.addHandler(_log_handler)
+
+
+def get_engine(connection, echo=False, factory=create_engine, **engine_kwargs):
+    """returns the engine (and with it the connection pool) for a connection string shared by the whole process
+
+    :param str connection: SQLAlchemy connection string
+    :param bool echo: True or False for SQL output of SQLAlchemy engine
+    :param factory: function which creates the engine, e.g. :func:`sqlalchemy.ext.asyncio.create_async_engine`
+    :param engine_kwargs: further arguments for the factory, e.g. pool_size, max_overflow or pool_recycle
+    :rtype: sqlalchemy.engine.Engine
     """
-    if not connection:
-        config = configparser.ConfigParser()
-        cfp = defaults.config_file_path
-        if os.path.exists(cfp):
-            log.info('fetch database configuration from %s', cfp)
-            config.read(cfp)
-            connection = config['database']['sqlalchemy_connection_string']
-            log.info('load connection string from %s: %s', cfp, connection)
-        else:
-            with open(cfp, 'w') as config_file:
-                connection = defaults.sqlalchemy_connection_string_default
-                config['database'] = {
-                    'sqlalchemy_connection_string': connection}
-                config.write(config_file)
-                log.info('create configuration file %s', cfp)
+    key = (factory, connection, echo, repr(sorted(engine_kwargs.items())))
+
+    with _registry_lock:
+        if key not in _engines:
+            url = make_url(connection)
+            log.info('create engine for %s', url.render_as_string(hide_password=True))
+
+            if url.get_backend_name() == 'sqlite' and os.path.dirname(url.database or '') == PYCTD_DATA_DIR:
+                os.makedirs(PYCTD_DATA_DIR, exist_ok=True)
+
+            _engines[key] = factory(connection, echo=echo, **engine_kwargs)
+        return _engines[key]
+
+
+def get_scoped_session(engine, scopefunc=None):
+    """returns the shared session registry of an engine
+
+    Without scopefunc every thread gets its own session. A scopefunc (e.g. returning an identifier of the
+    current web request) creates one session per scope instead.
+
+    :param sqlalchemy.engine.Engine engine: SQLAlchemy engine
+    :param scopefunc: function returning a hashable identifier of the current scope
+    :rtype: sqlalchemy.orm.scoped_session
+    """
+    key = (engine, scopefunc)
+
+    with _registry_lock:
+        if key not in _scoped_sessions:
+            _scoped_sessions[key] = scoped_session(
+                sessionmaker(bind=engine, autoflush=False, expire_on_commit=False),
+                scopefunc=scopefunc
+            )
+        return _scoped_sessions[key]
+
+
+def dispose_engines(connection=None):
+    """removes all sessions and closes all connection pools of the process
 
-    return connection
+    :param str connection: only the engines and sessions of this connection string (default: all)
+    """
+    with _registry_lock:
+        engines = {key: engine for key, engine in _engines.items() if connection in (None, key[1])}
+
+        for key, registry in list(_scoped_sessions.items()):
+            if key[0] in engines.values():
+                registry.remove()
+                del _scoped_sessions[key]
+
+        for key, engine in engines.items():
+            if hasattr(engine, 'sync_engine'):
+                engine.sync_engine.dispose()
+            else:
+                engine.dispose()
+            del _engines[key]
 
 
 class BaseDbManager(object):
-    """Creates a connection to database and a persistient session using SQLAlchemy"""
+    """Creates a connection to database and provides sessions using SQLAlchemy
+
+    Engines (and their connection pools) are shared by all managers with the same connection string in a process,
+    so creating a manager is cheap. :attr:`session` returns a session of the current thread (or scope, see
+    :func:`get_scoped_session`). Call :meth:`remove_session` (or use :meth:`session_scope`) at the end of a request
+    to release the session and its identity map.
+    """
+
+    _session = None
 
-    def __init__(self, connection=None, echo=False):
+    def __init__(self, connection=None, echo=False, scopefunc=None, **engine_kwargs):
         """
-        :param str connection: SQLAlchemy 
+        :param str connection: SQLAlchemy connection string
         :param bool echo: True or False for SQL output of SQLAlchemy engine
+        :param scopefunc: function returning an identifier of the current scope (default: current thread)
+        :param engine_kwargs: further arguments for :func:`sqlalchemy.create_engine`, e.g. pool_size,
+            max_overflow or pool_recycle
         """
-        log.setLevel(logging.INFO)
-        handler = logging.FileHandler(os.path.join(
-            PYCTD_DIR, defaults.TABLE_PREFIX + 'database.log'))
-        handler.setLevel(logging.INFO)
-
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        log.addHandler(handler)
+        _add_log_file_handler()
 
         try:
             self.connection = get_connection_string(connection)
-            self.engine = create_engine(self.connection, echo=echo)
-            self.inspector = reflection.Inspector.from_engine(self.engine)
-            self.sessionmaker = sessionmaker(
-                bind=self.engine, autoflush=False, expire_on_commit=False)
-            self.session = scoped_session(self.sessionmaker)()
+            self.engine = get_engine(self.connection, echo=echo, **engine_kwargs)
+            self.scoped_session = get_scoped_session(self.engine, scopefunc=scopefunc)
         except Exception as e:
             print(e)
             self.set_connection_string_by_user_input()
             self.__init__()
 
+    @classmethod
+    def from_session(cls, session):
+        """creates a manager which uses an existing session instead of connecting to the database
+
+        :param session: SQLAlchemy session or None for a manager without database connection
+        :type session: sqlalchemy.orm.Session or None
+        """
+        manager = cls.__new__(cls)
+        manager._session = session
+        manager.scoped_session = None
+        manager.engine = session.bind if session is not None else None
+        manager.connection = str(manager.engine.url) if manager.engine is not None else None
+        return manager
+
+    @property
+    def session(self):
+        """session of the current thread (or scope)
+
+        :rtype: sqlalchemy.orm.Session
+        """
+        if self.scoped_session is None:
+            return self._session
+        return self.scoped_session()
+
+    @property
+    def inspector(self):
+        """inspector of the database
+
+        :rtype: sqlalchemy.engine.reflection.Inspector
+        """
+        return inspect(self.engine)
+
+    def remove_session(self):
+        """closes the session of the current thread (or scope) and releases its connection and identity map"""
+        if self.scoped_session is not None:
+            self.scoped_session.remove()
+
+    @contextmanager
+    def session_scope(self):
+        """context manager which provides the session of the current thread and removes it at exit
+
+        .. code-block:: python
+
+            >>> with query.session_scope():
+            ...     genes = query.get_gene(gene_symbol='APP')
+        """
+        try:
+            yield self.session
+        finally:
+            self.remove_session()
+
+    def get_meta(self, key, default=None):
+        """returns a value from the meta table (see :class:`pyctd.manager.models.Meta`)
+
+        :param str key: key
+        :param default: value returned if the key (or the meta table) does not exist
+        :rtype: str
+        """
+        try:
+            meta = self.session.query(models.Meta).filter(models.Meta.key == key).one_or_none()
+        except exc.SQLAlchemyError:
+            self.session.rollback()
+            return default
+
+        return default if meta is None else meta.value
+
+    def set_meta(self, key, value):
+        """sets a value in the meta table (see :class:`pyctd.manager.models.Meta`)
+
+        :param str key: key
+        :param value: value (stored as string)
+        """
+        meta = self.session.query(models.Meta).filter(models.Meta.key == key).one_or_none()
+
+        if meta is None:
+            meta = models.Meta(key=key)
+            self.session.add(meta)
+
+        meta.value = str(value)
+        self.session.commit()
+
+    @property
+    def data_version(self):
+        """identifier of the imported data, changes with every import
+
+        :rtype: str
+        """
+        return self.get_meta('data_version')
+
+    def set_data_version(self):
+        """sets a new data version, so that values cached per data version (e.g. vocabularies) are reloaded"""
+        self.set_meta('data_version', datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
+
     def set_connection_string_by_user_input(self):
         """Prompts the user to input a connection string"""
         user_connection = input(
@@ -148,6 +312,41 @@ class BaseDbManager(object):
         self.session.commit()
 
 
+top_k_tables = (
+    (models.TopChemicalDisease, models.ChemicalDisease, 'disease__id',
+     (models.ChemicalDisease.inference_score.desc(), models.ChemicalDisease.id)),
+    (models.TopChemGoEnriched, models.ChemGoEnriched, 'chemical__id',
+     (models.ChemGoEnriched.highest_go_level.desc(), models.ChemGoEnriched.corrected_p_value,
+      models.ChemGoEnriched.id)),
+    (models.TopChemPathwayEnriched, models.ChemPathwayEnriched, 'chemical__id',
+     (models.ChemPathwayEnriched.corrected_p_value, models.ChemPathwayEnriched.id)),
+)
+"""(top-k model, model, partition column, order of ranking) for :meth:`DbManager.build_top_k`"""
+
+vocabulary_columns = OrderedDict([
+    ('gene_form', models.ChemGeneIxnGeneForm.gene_form),
+    ('interaction_action', select(models.InteractionActionType.interaction_action).join_from(
+        models.ChemGeneIxnInteractionAction, models.InteractionActionType).subquery().c.interaction_action),
+    ('direct_evidence', models.GeneDisease.direct_evidence),
+])
+"""names and columns of the vocabularies in :class:`pyctd.manager.models.Vocabulary`"""
+
+
+def split_interaction_action(interaction_action):
+    """splits an interaction action (e.g. 'increases^expression') in degree of interaction and action type name
+
+    :param str interaction_action: interaction action
+    :return: degree of interaction and action type name or None if not in the form degree^action
+    :rtype: tuple[str,str]
+    """
+    interaction, separator, type_name = interaction_action.partition('^')
+
+    if not separator:
+        return None, None
+
+    return interaction, type_name
+
+
 class DbManager(BaseDbManager):
     """Implements functions to upload CTD files into a database. Preferred SQL Alchemy database is MySQL with
     :mod:`pymysql`.
@@ -164,16 +363,30 @@ class DbManager(BaseDbManager):
         super(DbManager, self).__init__(connection=connection)
         self.tables: List[Table] = get_table_configurations()
 
-    def db_import(self, urls=None, force_download=False):
+    def db_import(self, urls=None, force_download=False, top_k=None, parquet_dir=None, similarity=False,
+                  packed=False):
         """Updates the CTD database
 
         1. downloads all files from CTD
         2. drops all tables in database
         3. creates all tables in database
         4. import all data from CTD files
+        5. builds the inverted index of the PubMed and OMIM identifiers (see :meth:`build_packed_id_index`)
+        6. builds the vocabularies (see :meth:`build_vocabularies`)
+        7. builds top-k tables for ranked queries (optional, see :meth:`build_top_k`)
+        8. updates the table statistics of the query planner (see :meth:`analyze`)
+        9. exports all tables as Parquet files (optional, see :meth:`build_parquet`)
+        10. builds the similarity indices of chemicals, genes and diseases (optional, see
+           :meth:`build_similarity_indices`)
 
         :param iter[str] urls: An iterable of URL strings
         :param bool force_download: force method to download
+        :param int top_k: number of top ranked associations materialized per disease and chemical (None: no top-k
+            tables)
+        :param str parquet_dir: directory of the Parquet files (None: no export)
+        :param bool similarity: if True the MinHash/LSH similarity indices are built
+        :param bool packed: if True the PubMed and OMIM identifiers are stored as packed ID lists (compact storage
+            mode, see :mod:`pyctd.manager.packed`)
         """
         if not urls:
             urls = [
@@ -186,9 +399,125 @@ class DbManager(BaseDbManager):
         self.drop_all()
         self.download_urls(urls=urls, force_download=force_download)
         self.create_all()
-        self.import_tables()
+        self.import_tables(packed=packed)
+        self.set_meta('id_lists', 'packed' if packed else 'rows')
+        set_storage_mode(self.engine, 'packed' if packed else 'rows')
+        self.build_packed_id_index()
+        self.build_vocabularies()
+
+        if top_k:
+            self.build_top_k(top_k)
+
+        self.analyze()
+
+        ctd_release = self.get_ctd_release()
+        if ctd_release:
+            self.set_meta('ctd_release', ctd_release)
+
+        self.set_data_version()
+
+        if parquet_dir:
+            self.build_parquet(parquet_dir)
+
+        if similarity:
+            self.build_similarity_indices()
+
         self.session.close()
 
+    def analyze(self):
+        """updates the table statistics of the query planner (``ANALYZE``), e.g. for
+        :meth:`pyctd.manager.query.QueryManager.estimate` on SQLite
+        """
+        log.info('analyze tables')
+
+        with self.engine.begin() as connection:
+            if self.engine.dialect.name == 'mysql':
+                connection.exec_driver_sql('ANALYZE TABLE ' + ', '.join(self.inspector.get_table_names()))
+            elif self.engine.dialect.name in ('sqlite', 'postgresql'):
+                connection.exec_driver_sql('ANALYZE')
+
+    def build_vocabularies(self):
+        """counts the distinct values of all vocabulary columns (see :data:`vocabulary_columns`) in
+        :class:`pyctd.manager.models.Vocabulary`
+        """
+        log.info('build vocabularies')
+        models.Vocabulary.__table__.create(self.engine, checkfirst=True)
+
+        with self.engine.begin() as connection:
+            connection.execute(models.Vocabulary.__table__.delete())
+
+            for name, column in vocabulary_columns.items():
+                connection.execute(models.Vocabulary.__table__.insert().from_select(
+                    ['name', 'value', 'count'],
+                    select(literal(name), column, func.count()).where(column.isnot(None)).group_by(column)
+                ))
+
+    def build_top_k(self, k=500):
+        """materializes the top k ranked associations for the ranked queries of
+        :class:`pyctd.manager.query.QueryManager`
+
+        - chemicals per disease by inference score (:class:`pyctd.manager.models.TopChemicalDisease`)
+        - GO terms per chemical by highest GO level and corrected p-value
+          (:class:`pyctd.manager.models.TopChemGoEnriched`)
+        - pathways per chemical by corrected p-value (:class:`pyctd.manager.models.TopChemPathwayEnriched`)
+
+        Queries with a limit <= k use these tables instead of sorting all associations.
+
+        :param int k: number of top ranked associations per disease or chemical
+        """
+        log.info('build top %s tables', k)
+        models.Base.metadata.create_all(self.engine, tables=[model.__table__ for model, _, _, _ in top_k_tables])
+
+        with self.engine.begin() as connection:
+            for top_model, model, partition_column, order_by in top_k_tables:
+                connection.execute(top_model.__table__.delete())
+
+                foreign_key_column = model.table_suffix + '__id'
+                sort_columns = [
+                    column.key for column in top_model.__table__.columns
+                    if column.key not in ('id', 'rank', partition_column, foreign_key_column)
+                ]
+
+                ranked = select(
+                    model.id.label(foreign_key_column),
+                    getattr(model, partition_column),
+                    *[getattr(model, column) for column in sort_columns],
+                    func.row_number().over(partition_by=getattr(model, partition_column), order_by=order_by).label(
+                        'rank')
+                ).subquery()
+
+                column_names = [foreign_key_column, partition_column] + sort_columns + ['rank']
+                connection.execute(top_model.__table__.insert().from_select(
+                    column_names,
+                    select(*[ranked.c[name] for name in column_names]).where(ranked.c.rank <= k)
+                ))
+
+        self.set_meta('top_k', k)
+
+        if self.data_version:
+            # top-k tables of an existing database were rebuilt, cached values of k are outdated
+            self.set_data_version()
+
+    def build_parquet(self, directory=None):
+        """exports all tables as Parquet files for :class:`pyctd.manager.columnar.ColumnarQueryManager`
+
+        Needs the optional dependencies of ``pip install pyctd[columnar]``.
+
+        :param str directory: directory of the Parquet files (default:
+            :data:`pyctd.manager.columnar.DEFAULT_PARQUET_DIR`)
+        """
+        from . import columnar
+
+        columnar.export_parquet(self.engine, directory or columnar.DEFAULT_PARQUET_DIR)
+
+    def build_similarity_indices(self):
+        """builds and caches the MinHash/LSH indices of all profiles in :data:`pyctd.manager.similarity.PROFILES`
+        for the current data version (see :class:`pyctd.manager.similarity.SimilarityIndex`)"""
+        from .similarity import PROFILES, SimilarityIndex
+
+        for entity_type, profile in PROFILES:
+            SimilarityIndex.from_cache(self, entity_type=entity_type, profile=profile)
+
     @property
     def mapper(self):
         """returns a dictionary with keys of pyctd.manager.table_con.domains_to_map and pandas.DataFrame as values. 
@@ -234,11 +563,13 @@ class DbManager(BaseDbManager):
                 self.__mapper[domain] = df
         return self.__mapper
 
-    def import_tables(self, only_tables=None, exclude_tables=None):
+    def import_tables(self, only_tables=None, exclude_tables=None, packed=False):
         """Imports all data in database tables
 
         :param set[str] only_tables: names of tables to be imported
         :param set[str] exclude_tables: names of tables to be excluded
+        :param bool packed: if True the child tables in :data:`pyctd.manager.models.PACKED_ID_LISTS` are stored as
+            packed ID lists
         """
         for table in self.tables:
             if only_tables is not None and table.name not in only_tables:
@@ -246,7 +577,7 @@ class DbManager(BaseDbManager):
 
             if exclude_tables is not None and table.name in exclude_tables:
                 continue
-            self.import_table(table)
+            self.import_table(table, packed=packed)
 
     @classmethod
     def get_index_of_column(cls, column, file_path):
@@ -288,10 +619,12 @@ class DbManager(BaseDbManager):
                     column_names_in_db.append(columns_dict[column])
         return use_columns_with_index, column_names_in_db
 
-    def import_table(self, table: Table):
+    def import_table(self, table: Table, packed=False):
         """import table by Table object
 
         :param `manager.table_conf.Table` table: Table object
+        :param bool packed: if True the child tables in :data:`pyctd.manager.models.PACKED_ID_LISTS` are stored as
+            packed ID lists
         """
         file_path = os.path.join(self.pyctd_data_dir, table.file_name)
         log.info('importing %s data into table %s', file_path, table.name)
@@ -303,8 +636,16 @@ class DbManager(BaseDbManager):
             o2m_column_index = self.get_index_of_column(
                 one_to_many_config.values_col, file_path)
 
-            if o2m_column_index:
+            if not o2m_column_index:
+                continue
+
+            child_table_name = table.name + '__' + one_to_many_config.id_col
 
+            if packed and child_table_name in models.PACKED_ID_LISTS:
+                self.import_packed_id_list(file_path, o2m_column_index, table, one_to_many_config.id_col)
+            elif child_table_name == models.ChemGeneIxnInteractionAction.table_suffix:
+                self.import_interaction_actions(file_path, o2m_column_index, table)
+            else:
                 self.import_one_to_many(
                     file_path, o2m_column_index, table, one_to_many_config.id_col)
 
@@ -319,6 +660,22 @@ class DbManager(BaseDbManager):
         :param parent_table:
         :param column_in_one2many_table: 
         """
+        parent_id_column_name = parent_table.name + '__id'
+        o2m_table_name = defaults.TABLE_PREFIX + \
+            parent_table.name + '__' + column_in_one2many_table
+
+        for parent_id_values, child_values in self._read_one_to_many(file_path, o2m_column_index, parent_table):
+            pd.DataFrame({
+                parent_id_column_name: parent_id_values,
+                column_in_one2many_table: child_values
+            }).to_sql(name=o2m_table_name, if_exists='append', con=self.engine, index=False)
+
+    def _read_one_to_many(self, file_path, o2m_column_index, parent_table):
+        """yields the primary keys of the parents and the values of a one-to-many column (separated by '|') per
+        chunk of the file
+
+        :rtype: iter[tuple[list[int],list[str]]]
+        """
         chunks = pd.read_csv(
             file_path,
             usecols=[o2m_column_index],
@@ -345,14 +702,170 @@ class DbManager(BaseDbManager):
                     parent_id_values.append(parent_id)
                     child_values.append(value.strip())
 
-            parent_id_column_name = parent_table.name + '__id'
-            o2m_table_name = defaults.TABLE_PREFIX + \
-                parent_table.name + '__' + column_in_one2many_table
+            yield parent_id_values, child_values
+
+    def import_interaction_actions(self, file_path, o2m_column_index, parent_table):
+        """imports the interaction actions of chemical–gene interactions as codes of
+        :class:`pyctd.manager.models.InteractionActionType` into
+        :class:`pyctd.manager.models.ChemGeneIxnInteractionAction`
+
+        :param str file_path: path to CTD download file
+        :param int o2m_column_index: index of the InteractionActions column in the file
+        :param parent_table: `manager.table.Table` object of the chemical–gene interactions
+        """
+        model = models.ChemGeneIxnInteractionAction
+
+        for parent_id_values, child_values in self._read_one_to_many(file_path, o2m_column_index, parent_table):
+            type_ids = self.get_interaction_action_type_ids(child_values)
 
             pd.DataFrame({
-                parent_id_column_name: parent_id_values,
-                column_in_one2many_table: child_values
-            }).to_sql(name=o2m_table_name, if_exists='append', con=self.engine, index=False)
+                'chem_gene_ixn__id': parent_id_values,
+                'interaction_action_type__id': [type_ids[value] for value in child_values]
+            }).to_sql(name=model.__tablename__, if_exists='append', con=self.engine, index=False)
+
+    def get_interaction_action_type_ids(self, interaction_actions):
+        """returns the codes of interaction actions (e.g. 'increases^expression') in
+        :class:`pyctd.manager.models.InteractionActionType`; new interaction actions are parsed into degree of
+        interaction (see :data:`pyctd.manager.model_types.action.interaction`) and action
+        (see :class:`pyctd.manager.models.Action`) and added
+
+        :param iter[str] interaction_actions: interaction actions
+        :rtype: dict[str,int]
+        """
+        model = models.InteractionActionType
+        type_ids = dict(self.session.query(model.interaction_action, model.id))
+        new_interaction_actions = sorted(set(interaction_actions) - set(type_ids))
+
+        if not new_interaction_actions:
+            return type_ids
+
+        action_ids = dict(self.session.query(models.Action.type_name, models.Action.id))
+
+        for interaction_action in new_interaction_actions:
+            interaction, type_name = split_interaction_action(interaction_action)
+
+            if interaction not in action.interaction:
+                log.warning('unknown interaction action %s', interaction_action)
+                interaction, type_name = None, None
+
+            self.session.add(model(interaction_action=interaction_action, interaction=interaction,
+                                   action__id=action_ids.get(type_name)))
+
+        self.session.commit()
+        return dict(self.session.query(model.interaction_action, model.id))
+
+    def import_packed_id_list(self, file_path, o2m_column_index, parent_table, column_in_one2many_table):
+        """imports the identifiers of a one-to-many column as one packed list per parent into
+        :class:`pyctd.manager.models.PackedIdList` instead of one row per identifier
+
+        :param str file_path: path to CTD download file
+        :param int o2m_column_index: index of the column with the identifiers in the file
+        :param parent_table: `manager.table.Table` object of the parent
+        :param str column_in_one2many_table: column of the identifiers in the child table, e.g. 'pubmed_id'
+        """
+        code = models.PACKED_ID_LISTS.index(parent_table.name + '__' + column_in_one2many_table)
+
+        chunks = pd.read_csv(
+            file_path,
+            usecols=[o2m_column_index],
+            header=None,
+            comment='#',
+            index_col=False,
+            chunksize=1000000,
+            dtype=str,
+            sep="\t"
+        )
+
+        for chunk in chunks:
+            chunk.index += 1
+            entries = chunk[o2m_column_index].dropna()
+
+            parent_ids = []
+            packed_lists = []
+
+            for parent_id, entry in entries.items():
+                ids = [int(value) for value in entry.split('|') if value.strip().isdigit()]
+                if ids:
+                    parent_ids.append(parent_id)
+                    packed_lists.append(pack(ids))
+
+            pd.DataFrame({
+                'child': code,
+                'parent__id': parent_ids,
+                'ids': packed_lists
+            }).to_sql(name=models.PackedIdList.__tablename__, if_exists='append', con=self.engine, index=False)
+
+    def build_packed_id_index(self, chunksize=1000000):
+        """builds the inverted index :class:`pyctd.manager.models.PackedIdIndex` of the PubMed and OMIM identifiers
+        of associations (from the packed ID lists or from the child tables), e.g. for
+        :meth:`pyctd.manager.query.QueryManager.get_by_pubmed`
+
+        :param int chunksize: number of packed lists or child rows read at once
+        """
+        model = models.PackedIdIndex
+        models.Base.metadata.create_all(self.engine, tables=[models.PackedIdList.__table__, model.__table__])
+        self.session.query(model).delete()
+        self.session.commit()
+
+        number_of_values = 0
+
+        for code, child_table_name in enumerate(models.PACKED_ID_LISTS):
+            log.info('build inverted index of %s', child_table_name)
+            ids, parent_ids = self._get_id_pairs(code, child_table_name, chunksize)
+
+            if not len(ids):
+                continue
+
+            order = np.lexsort((parent_ids, ids))
+            ids, parent_ids = ids[order], parent_ids[order]
+            values, starts = np.unique(ids, return_index=True)
+            number_of_values += len(values)
+
+            pd.DataFrame({
+                'child': code,
+                'value': values,
+                'parent_ids': [pack(group.tolist()) for group in np.split(parent_ids, starts[1:])]
+            }).to_sql(name=model.__tablename__, if_exists='append', con=self.engine, index=False,
+                      chunksize=100000)
+
+        self.set_meta('id_index', number_of_values)
+
+        if self.data_version:
+            # index of an existing database was (re)built, cached values of has_id_index are outdated
+            self.set_data_version()
+
+    def _get_id_pairs(self, code, child_table_name, chunksize):
+        """returns the identifiers and primary keys of their parents of a child table in :data:`PACKED_ID_LISTS`
+        (read from the packed ID lists if there are any)
+
+        :rtype: tuple[numpy.ndarray,numpy.ndarray]
+        """
+        ids, parent_ids = [], []
+
+        packed = select(models.PackedIdList.parent__id, models.PackedIdList.ids).where(
+            models.PackedIdList.child == code)
+
+        for df in pd.read_sql(packed, self.engine, chunksize=chunksize):
+            if df.empty:
+                continue
+            chunk_ids, counts = unpack_many(df['ids'].tolist())
+            ids.append(chunk_ids)
+            parent_ids.append(np.repeat(df['parent__id'].to_numpy(dtype=np.int64), counts))
+
+        if not ids:
+            table = models.Base.metadata.tables[defaults.TABLE_PREFIX + child_table_name]
+            parent_table_name, _, column_name = child_table_name.rpartition('__')
+            rows = select(table.c[column_name], table.c[parent_table_name + '__id']).where(
+                table.c[column_name].isnot(None))
+
+            for df in pd.read_sql(rows, self.engine, chunksize=chunksize):
+                ids.append(df[column_name].to_numpy(dtype=np.int64))
+                parent_ids.append(df[parent_table_name + '__id'].to_numpy(dtype=np.int64))
+
+        if not ids:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+        return np.concatenate(ids), np.concatenate(parent_ids)
 
     # TODO document get_dtypes
     @staticmethod
@@ -442,6 +955,37 @@ class DbManager(BaseDbManager):
                     return [column.strip() for column in line[1:].split("\t")]
         return []
 
+    @staticmethod
+    def get_report_date(file_path):
+        """returns the creation date in the header of a CTD download file ('# Report created: ...') or None
+
+        :param str file_path: path to CTD download file
+        :rtype: str
+        """
+        opener = gzip.open if file_path.endswith('.gz') else open
+
+        with opener(file_path, 'rt') as file:
+            for line in file:
+                if not line.startswith('#'):
+                    break
+
+                match = re.match(r'#\s*Report created\s*:\s*(.+)$', line.strip())
+                if match:
+                    return match.group(1)
+
+    def get_ctd_release(self):
+        """returns the creation date of the downloaded CTD files as release of the imported data or None
+
+        :rtype: str
+        """
+        for table in self.tables:
+            file_path = os.path.join(self.pyctd_data_dir, table.file_name)
+
+            if os.path.exists(file_path):
+                report_date = self.get_report_date(file_path)
+                if report_date:
+                    return report_date
+
     @classmethod
     def download_urls(cls, urls, force_download=False):
         """Downloads all CTD URLs that don't exist
@@ -449,6 +993,8 @@ class DbManager(BaseDbManager):
         :param iter[str] urls: iterable of URL of CTD
         :param bool force_download: force method to download
         """
+        os.makedirs(cls.pyctd_data_dir, exist_ok=True)
+
         for url in urls:
             file_path = cls.get_path_to_file_from_url(url)
 
@@ -472,49 +1018,20 @@ class DbManager(BaseDbManager):
         return os.path.join(cls.pyctd_data_dir, file_name)
 
 
-def update(connection=None, urls=None, force_download=False):
+def update(connection=None, urls=None, force_download=False, top_k=None, parquet_dir=None, similarity=False,
+           packed=False):
     """Updates CTD database
 
     :param iter[str] urls: list of urls to download
     :param str connection: custom database connection string
     :param bool force_download: force method to download
+    :param int top_k: number of top ranked associations materialized per disease and chemical (None: no top-k
+        tables)
+    :param str parquet_dir: directory of the Parquet files for the columnar backend (None: no export)
+    :param bool similarity: if True the MinHash/LSH similarity indices are built
+    :param bool packed: if True the PubMed and OMIM identifiers are stored as packed ID lists (compact storage mode)
     """
     db = DbManager(connection)
-    db.db_import(urls=urls, force_download=force_download)
+    db.db_import(urls=urls, force_download=force_download, top_k=top_k, parquet_dir=parquet_dir,
+                 similarity=similarity, packed=packed)
     db.session.close()
-
-
-def set_mysql_connection(host='localhost', user='pyctd_user', password='pyctd_passwd', db='pyctd', charset='utf8'):
-    """Sets the connection using MySQL Parameters"""
-    set_connection('mysql+pymysql://{user}:{passwd}@{host}/{db}?charset={charset}'.format(
-        host=host,
-        user=user,
-        passwd=password,
-        db=db,
-        charset=charset)
-    )
-
-
-def set_test_connection():
-    """Sets the connection with the default SQLite test database"""
-    set_connection(defaults.DEFAULT_SQLITE_TEST_DATABASE_NAME)
-
-
-def set_connection(connection=defaults.sqlalchemy_connection_string_default):
-    """Set the connection string for SQLAlchemy
-
-    :param str connection: SQLAlchemy connection string
-    """
-    cfp = defaults.config_file_path
-    config = RawConfigParser()
-
-    if not os.path.exists(cfp):
-        with open(cfp, 'w') as config_file:
-            config['database'] = {'sqlalchemy_connection_string': connection}
-            config.write(config_file)
-            log.info('create configuration file %s', cfp)
-    else:
-        config.read(cfp)
-        config.set('database', 'sqlalchemy_connection_string', connection)
-        with open(cfp, 'w') as configfile:
-            config.write(configfile)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""Gene set enrichment analysis against the pathways in CTD
+
+CTD provides enriched pathways and GO terms (:class:`pyctd.manager.models.ChemPathwayEnriched`,
+:class:`pyctd.manager.models.ChemGoEnriched`) only for the genes interacting with a chemical. With this module any
+gene set is tested for over-representation in pathways (hypergeometric test) against a gene×pathway incidence
+matrix built from :class:`pyctd.manager.models.GenePathway`. All gene sets of a batch are scored in one sparse
+matrix product.
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> query = pyctd.query()
+    >>> query.enrich([348, 351, 4137, 5663, 5664])
+    >>> query.enrich_batch({'set1': [348, 351], 'set2': [4137, 5663, 5664]}, max_p_value=0.05)
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import hypergeom
+from sqlalchemy import select
+
+from . import cache
+from . import models
+from ..constants import PYCTD_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+CORRECTIONS = ('bonferroni', 'fdr_bh')
+
+RESULT_COLUMNS = ['gene_set', 'pathway_id', 'pathway_name', 'target_match_qty', 'target_total_qty',
+                  'background_match_qty', 'background_total_qty', 'p_value', 'corrected_p_value']
+"""columns of the enrichment results (named as in :class:`pyctd.manager.models.ChemPathwayEnriched`)"""
+
+
+class IncidenceMatrix(object):
+    """Sparse gene×pathway incidence matrix; the background are all genes annotated to at least one pathway"""
+
+    def __init__(self, matrix, gene_ids, pathway_ids, pathway_names):
+        """
+        :param scipy.sparse.csr_matrix matrix: boolean matrix with genes as rows and pathways as columns
+        :param numpy.ndarray gene_ids: sorted NCBI Gene identifiers of the rows
+        :param numpy.ndarray pathway_ids: KEGG or REACTOME identifiers of the columns
+        :param numpy.ndarray pathway_names: names of the columns
+        """
+        self.matrix = matrix
+        self.gene_ids = gene_ids
+        self.pathway_ids = pathway_ids
+        self.pathway_names = pathway_names
+        self.pathway_sizes = np.asarray(matrix.sum(axis=0)).ravel()
+
+    def __repr__(self):
+        return 'IncidenceMatrix(genes={}, pathways={})'.format(*self.matrix.shape)
+
+    @classmethod
+    def from_manager(cls, manager):
+        """builds the incidence matrix from the gene–pathway associations in the database
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :rtype: IncidenceMatrix
+        """
+        pathways = pd.read_sql(
+            select(models.Pathway.id, models.Pathway.pathway_id, models.Pathway.pathway_name).order_by(
+                models.Pathway.id),
+            manager.engine
+        )
+        statement = select(models.Gene.gene_id, models.GenePathway.pathway__id).join(
+            models.Gene, models.Gene.id == models.GenePathway.gene__id).distinct()
+        associations = pd.read_sql(statement, manager.engine).dropna()
+
+        gene_ids, rows = np.unique(associations['gene_id'].to_numpy().astype(np.int64), return_inverse=True)
+        columns = np.searchsorted(pathways['id'].to_numpy(), associations['pathway__id'].to_numpy().astype(np.int64))
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, columns)),
+            shape=(len(gene_ids), len(pathways))
+        )
+
+        return cls(
+            matrix=matrix,
+            gene_ids=gene_ids,
+            pathway_ids=pathways['pathway_id'].to_numpy(dtype=str),
+            pathway_names=pathways['pathway_name'].fillna('').to_numpy(dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """loads an incidence matrix from a ``.npz`` file
+
+        :param str path: path to file
+        :rtype: IncidenceMatrix
+        """
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+            return cls(matrix, data['gene_ids'], data['pathway_ids'], data['pathway_names'])
+
+    def save(self, path):
+        """saves the incidence matrix in a ``.npz`` file
+
+        :param str path: path to file
+        """
+        np.savez(
+            path,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            gene_ids=self.gene_ids,
+            pathway_ids=self.pathway_ids,
+            pathway_names=self.pathway_names,
+        )
+
+    @classmethod
+    def from_cache(cls, manager, cache_dir=PYCTD_DATA_DIR):
+        """loads the incidence matrix of the current data version from disk or builds and caches it
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :param str cache_dir: directory of cached matrices
+        :rtype: IncidenceMatrix
+        """
+        return cache.load_or_build(manager, 'gene_pathway', lambda: cls.from_manager(manager), cls.load, cls.save,
+                                   cache_dir=cache_dir)
+
+    def enrich(self, gene_sets, correction='bonferroni', max_p_value=None):
+        """tests gene sets for over-representation in pathways
+
+        Genes not annotated to any pathway are ignored. Pathways without overlap (p-value 1) are not returned, but
+        are counted in the multiple testing correction.
+
+        :param dict gene_sets: names of gene sets as keys and iterables of NCBI Gene identifiers as values
+        :param str correction: 'bonferroni' (as in CTD) or 'fdr_bh' (Benjamini–Hochberg)
+        :param float max_p_value: only return results with a corrected p-value less or equal
+        :return: results ordered by gene set and p-value with :data:`RESULT_COLUMNS`
+        :rtype: pandas.DataFrame
+        """
+        if correction not in CORRECTIONS:
+            raise ValueError('correction {} not in {}'.format(correction, CORRECTIONS))
+
+        names = list(gene_sets)
+        if not names:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        rows, columns = [], []
+
+        for index, name in enumerate(names):
+            gene_ids = np.unique(np.asarray(list(gene_sets[name]), dtype=np.int64))
+            positions = np.searchsorted(self.gene_ids, gene_ids[np.isin(gene_ids, self.gene_ids)])
+            rows.append(np.full(len(positions), index))
+            columns.append(positions)
+
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+        queries = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, columns)),
+            shape=(len(names), self.matrix.shape[0])
+        )
+        set_sizes = np.asarray(queries.sum(axis=1)).ravel()
+        overlaps = (queries @ self.matrix).tocoo()
+
+        set_index, pathway_index, matches = overlaps.row, overlaps.col, overlaps.data
+        background_total = self.matrix.shape[0]
+        p_values = hypergeom.sf(matches - 1, background_total, self.pathway_sizes[pathway_index],
+                                set_sizes[set_index])
+        p_values = np.clip(p_values, 0, 1)
+
+        order = np.lexsort((p_values, set_index))
+        set_index, pathway_index = set_index[order], pathway_index[order]
+        matches, p_values = matches[order], p_values[order]
+
+        corrected = self._correct(p_values, set_index, self.matrix.shape[1], correction)
+
+        results = pd.DataFrame({
+            'gene_set': np.array(names, dtype=object)[set_index],
+            'pathway_id': self.pathway_ids[pathway_index],
+            'pathway_name': self.pathway_names[pathway_index],
+            'target_match_qty': matches,
+            'target_total_qty': set_sizes[set_index],
+            'background_match_qty': self.pathway_sizes[pathway_index],
+            'background_total_qty': background_total,
+            'p_value': p_values,
+            'corrected_p_value': corrected,
+        }, columns=RESULT_COLUMNS)
+
+        if max_p_value is not None:
+            results = results[results['corrected_p_value'] <= max_p_value].reset_index(drop=True)
+
+        return results
+
+    @staticmethod
+    def _correct(p_values, set_index, number_of_tests, correction):
+        """corrects p-values (ordered by gene set and p-value) for multiple testing within each gene set"""
+        if correction == 'bonferroni':
+            return np.minimum(p_values * number_of_tests, 1)
+
+        starts = np.searchsorted(set_index, set_index)
+        ranks = np.arange(len(p_values)) - starts + 1
+        adjusted = pd.Series(p_values * number_of_tests / ranks)[::-1]
+        return np.minimum(adjusted.groupby(set_index[::-1]).cummin()[::-1].to_numpy(), 1)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""Query plans and row estimates of the database's query planner
+
+Row estimates are taken from the table statistics of the planner without executing the query:
+
+- PostgreSQL: ``Plan Rows`` of ``EXPLAIN (FORMAT JSON)``
+- MySQL/MariaDB: ``rows`` × ``filtered`` of the driving (first) table in ``EXPLAIN``
+- SQLite: the table statistics of ``ANALYZE`` (``sqlite_stat1``) of the driving (first) table in ``EXPLAIN QUERY
+  PLAN``: all rows of a scan, the average rows per key of the index columns of a search (divided by 4 for every range
+  constraint as in the planner of SQLite)
+
+Other dialects or SQLite databases without statistics have no row estimates; :func:`estimate_rows` returns None for
+them.
+"""
+
+import json
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+_sqlite_loop = re.compile(r'^(SCAN|SEARCH) (\S+)(?: AS \S+)?(?: USING (?:COVERING )?INDEX (\S+))?'
+                          r'(?: USING INTEGER PRIMARY KEY)?(?: \((.*)\))?')
+"""matches the loops (SCAN or SEARCH with table, index and constraints) in ``EXPLAIN QUERY PLAN`` of SQLite"""
+_equality = re.compile(r'^[^<>]+=\?$')
+_alias_suffix = re.compile(r'_\d+$')
+
+_explain_prefixes = {
+    'postgresql': 'EXPLAIN (FORMAT JSON) ',
+    'mysql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+def _compile(statement, dialect):
+    """returns the SQL string and the parameters of a statement in the paramstyle of the driver (with expanded IN
+    parameters)"""
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+
+    if dialect.paramstyle in ('named', 'pyformat'):
+        return str(compiled), compiled.params
+
+    return str(compiled), tuple(compiled.params[name] for name in compiled.positiontup)
+
+
+def explain(engine, statement):
+    """returns the query plan of a statement as list of rows (as dictionaries)
+
+    :param sqlalchemy.engine.Engine engine: engine
+    :param statement: SQL Alchemy statement, e.g. ``query.statement``
+    :rtype: list[dict]
+    """
+    sql, parameters = _compile(statement, engine.dialect)
+    return explain_sql(engine, sql, parameters)
+
+
+def explain_sql(engine, sql, parameters=()):
+    """returns the query plan of an SQL string with parameters in the paramstyle of the driver
+
+    :param sqlalchemy.engine.Engine engine: engine
+    :param str sql: SQL string as sent to the database
+    :param parameters: parameters as sent to the database
+    :rtype: list[dict]
+    """
+    prefix = _explain_prefixes.get(engine.dialect.name)
+
+    if prefix is None:
+        raise ValueError('EXPLAIN is not supported for {}'.format(engine.dialect.name))
+
+    with engine.connect() as connection:
+        result = connection.exec_driver_sql(prefix + sql, parameters)
+        return [dict(row._mapping) for row in result]
+
+
+def estimate_rows(engine, statement):
+    """returns the number of rows of a statement estimated by the query planner or None if not available
+
+    :param sqlalchemy.engine.Engine engine: engine
+    :param statement: SQL Alchemy statement, e.g. ``query.statement``
+    :rtype: int or None
+    """
+    if engine.dialect.name == 'postgresql':
+        plan = explain(engine, statement)[0]
+        plan = next(iter(plan.values()))
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    if engine.dialect.name == 'mysql':
+        row = explain(engine, statement)[0]
+        return int(round((row.get('rows') or 0) * float(row.get('filtered') or 100) / 100))
+
+    if engine.dialect.name == 'sqlite':
+        return _estimate_sqlite_rows(engine, statement)
+
+    return None
+
+
+def _get_sqlite_stats(engine):
+    """returns the statistics of ``sqlite_stat1`` as dictionary of table or index name and list of numbers (rows
+    and average rows per key of the first 1, 2, … index columns) or None if the database is not analyzed"""
+    with engine.connect() as connection:
+        if not connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").first():
+            return None
+        rows = connection.exec_driver_sql('SELECT tbl, idx, stat FROM sqlite_stat1').all()
+
+    stats = {}
+    for table, index, stat in rows:
+        numbers = [int(number) for number in stat.split() if number.isdigit()]
+        stats[index or table] = numbers
+        stats.setdefault(table, numbers[:1])
+    return stats
+
+
+def _estimate_sqlite_rows(engine, statement):
+    """returns the rows of the driving table of a statement estimated from ``sqlite_stat1``"""
+    stats = _get_sqlite_stats(engine)
+
+    if stats is None:
+        return None
+
+    for row in explain(engine, statement):
+        match = _sqlite_loop.match(row['detail'])
+        if row['parent'] or not match:
+            continue
+
+        operation, table, index, constraints = match.groups()
+        table = table if table in stats else _alias_suffix.sub('', table)
+        if table not in stats:
+            return None
+
+        rows = stats[table][0] if stats[table] else 0
+        constraints = constraints.split(' AND ') if operation == 'SEARCH' and constraints else []
+        equalities = sum(bool(_equality.match(constraint)) for constraint in constraints)
+        ranges = len(constraints) - equalities
+
+        if index is None and equalities:
+            rows = 1
+        elif index in stats and equalities:
+            rows = stats[index][min(equalities, len(stats[index]) - 1)]
+
+        return int(rows / 4 ** ranges)
+
+    return None
@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+
+"""Streaming export of tables and ``get_*`` results to TSV, JSON Lines, Parquet and neo4j-admin import files
+
+Rows are fetched in chunks from a server-side cursor (``stream_results``) and written chunk by chunk, so the memory
+needed does not grow with the size of a table. One-to-many child tables (e.g. the synonyms of
+:class:`pyctd.manager.models.Chemical`) are streamed in the order of their foreign key beside their parent table and
+merged into list columns chunk by chunk. Tables are exported by parallel workers, each with its own connection.
+
+Parquet files are written with one row group per chunk and need ``pip install pyctd[export]``.
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> query = pyctd.query()
+    >>> query.export('get_chemical_diseases', 'aspirin.jsonl', chemical_name='Aspirin')
+    >>> query.export_tables('ctd', file_format='parquet', children=True, workers=4)
+    >>> query.export_neo4j('neo4j')
+"""
+
+import base64
+import gzip
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import sqltypes
+
+from . import models
+from . import table_conf
+from .defaults import TABLE_PREFIX
+from .graph import EDGE_TYPES, NODE_TYPES
+from .packed import unpack
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('tsv', 'jsonl', 'parquet')
+"""file formats of :func:`export_statement` and :func:`export_tables`"""
+
+CHUNKSIZE = 50000
+"""default number of rows fetched and written at once"""
+
+LIST_SEPARATOR = '|'
+"""separator of list values in TSV files (as in the CTD files)"""
+
+_extensions = {
+    'tsv': '.tsv',
+    'jsonl': '.jsonl',
+    'parquet': '.parquet',
+}
+
+_neo4j_types = (
+    (sqltypes.Integer, 'long'),
+    (sqltypes.Float, 'double'),
+    (sqltypes.Numeric, 'double'),
+    (sqltypes.Boolean, 'boolean'),
+)
+
+_entity_models = {model.table_suffix: model for model in table_conf.models_to_map}
+
+
+def get_format(path):
+    """returns the file format of a path by its extension (``.tsv``, ``.jsonl`` or ``.parquet``, optionally
+    followed by ``.gz`` for TSV and JSON Lines)
+
+    :param str path: path to file
+    :rtype: str
+    """
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+
+    for file_format, extension in _extensions.items():
+        if name.endswith(extension) and (name == path or file_format != 'parquet'):
+            return file_format
+
+    raise ValueError('unknown file format of {}, use one of {}'.format(path, FORMATS))
+
+
+def iter_chunks(engine, statement, chunksize=CHUNKSIZE):
+    """yields the results of a statement as DataFrames from a server-side cursor
+
+    An empty DataFrame with the columns of the statement is yielded if there are no results.
+
+    :param sqlalchemy.engine.Engine engine: engine of the database
+    :param statement: SQLAlchemy select statement
+    :param int chunksize: number of rows per DataFrame
+    :rtype: iter[pandas.DataFrame]
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(statement)
+        columns = list(result.keys())
+        empty = True
+
+        for rows in result.partitions(chunksize):
+            empty = False
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
+        if empty:
+            yield pd.DataFrame(columns=columns)
+
+
+def get_children(table):
+    """returns the one-to-many child tables of a table with their foreign key and the name of their list column
+
+    Child tables are named after their parent table (e.g. ``pyctd_chemical__synonym``); association tables to
+    another table (e.g. ``pyctd_chemical__disease``) are no children.
+
+    :param sqlalchemy.Table table: parent table
+    :return: list of (child table, foreign key column, list column name)
+    :rtype: list[tuple]
+    """
+    table_names = set(models.Base.metadata.tables)
+    suffix = table.name[len(TABLE_PREFIX):]
+    children = []
+
+    for child in models.Base.metadata.sorted_tables:
+        if not child.name.startswith(table.name + '__'):
+            continue
+
+        name = child.name[len(table.name) + 2:]
+        foreign_key = child.columns.get(suffix + '__id')
+
+        if foreign_key is None or '__' in name or TABLE_PREFIX + name in table_names:
+            continue
+
+        children.append((child, foreign_key, name + 's'))
+
+    return children
+
+
+class _ChildStream(object):
+    """streams a child table ordered by its foreign key and hands out the rows of consecutive parents"""
+
+    def __init__(self, engine, child, foreign_key, chunksize):
+        self.value_columns = [column for column in child.columns if column.name not in ('id', foreign_key.name)]
+        statement = select(foreign_key, *self.value_columns).order_by(foreign_key, child.c.id)
+        self.foreign_key = foreign_key.name
+        self.chunks = iter_chunks(engine, statement, chunksize=chunksize)
+        self.buffer = None
+        self.exhausted = False
+
+    def _take_rows(self, last_parent_id):
+        """returns the buffered rows of all parents up to a primary key"""
+        while not self.exhausted and (self.buffer is None or self.buffer.empty or
+                                      self.buffer[self.foreign_key].iloc[-1] <= last_parent_id):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+            else:
+                self.buffer = chunk if self.buffer is None else pd.concat([self.buffer, chunk], ignore_index=True)
+
+        if self.buffer is None or self.buffer.empty:
+            return None
+
+        done = self.buffer[self.buffer[self.foreign_key] <= last_parent_id]
+        self.buffer = self.buffer[self.buffer[self.foreign_key] > last_parent_id]
+        return done
+
+    def take(self, last_parent_id):
+        """returns the values of all parents up to a primary key as Series of lists indexed by parent key"""
+        done = self._take_rows(last_parent_id)
+
+        if done is None:
+            return pd.Series(dtype=object)
+
+        names = [column.name for column in self.value_columns]
+        if len(names) == 1:
+            return done.groupby(self.foreign_key)[names[0]].agg(list)
+
+        records = pd.Series(done[names].to_dict('records'), index=done[self.foreign_key].to_numpy())
+        return records.groupby(level=0).agg(list)
+
+    def close(self):
+        self.chunks.close()
+
+
+class _PackedChildStream(_ChildStream):
+    """streams the packed ID lists of a child table (compact storage mode, see :mod:`pyctd.manager.packed`)"""
+
+    def __init__(self, engine, code, foreign_key, chunksize):
+        model = models.PackedIdList
+        statement = select(model.parent__id.label(foreign_key.name), model.ids).where(model.child == code) \
+            .order_by(model.parent__id)
+        self.foreign_key = foreign_key.name
+        self.chunks = iter_chunks(engine, statement, chunksize=chunksize)
+        self.buffer = None
+        self.exhausted = False
+
+    def take(self, last_parent_id):
+        done = self._take_rows(last_parent_id)
+
+        if done is None:
+            return pd.Series(dtype=object)
+
+        return pd.Series([unpack(ids) for ids in done['ids']], index=done[self.foreign_key].to_numpy(), dtype=object)
+
+
+def _get_child_stream(engine, child, foreign_key, chunksize):
+    """returns the stream of a child table or of its packed ID lists if they are stored packed"""
+    name = child.name[len(TABLE_PREFIX):]
+
+    if name in models.PACKED_ID_LISTS and inspect(engine).has_table(models.PackedIdList.__tablename__):
+        code = models.PACKED_ID_LISTS.index(name)
+        statement = select(models.PackedIdList.parent__id).where(models.PackedIdList.child == code).limit(1)
+
+        with engine.connect() as connection:
+            if connection.execute(statement).first() is not None:
+                return _PackedChildStream(engine, code, foreign_key, chunksize)
+
+    return _ChildStream(engine, child, foreign_key, chunksize)
+
+
+def _add_children(chunk, streams):
+    """adds the list columns of the child tables to a chunk of parents ordered by primary key"""
+    if not streams:
+        return chunk
+
+    if chunk.empty:
+        for _, name in streams:
+            chunk[name] = pd.Series(dtype=object)
+        return chunk
+
+    last_parent_id = chunk['id'].iloc[-1]
+
+    for stream, name in streams:
+        values = chunk['id'].map(stream.take(last_parent_id))
+        chunk[name] = [value if isinstance(value, list) else [] for value in values]
+
+    return chunk
+
+
+class _TsvWriter(object):
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') else \
+            open(path, 'w', encoding='utf-8', newline='')
+        self.header = True
+
+    def write(self, chunk):
+        for name in chunk.columns:
+            if chunk[name].dtype == object and chunk[name].map(lambda value: isinstance(value, list)).any():
+                chunk[name] = chunk[name].map(_join)
+        chunk.to_csv(self.file, sep='\t', index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+def _join(values):
+    if not isinstance(values, list):
+        return values
+    return LIST_SEPARATOR.join(json.dumps(value, sort_keys=True) if isinstance(value, dict) else str(value)
+                               for value in values)
+
+
+class _JsonlWriter(object):
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') else \
+            open(path, 'w', encoding='utf-8')
+
+    def write(self, chunk):
+        if not chunk.empty:
+            lines = chunk.to_json(orient='records', lines=True, force_ascii=False)
+            self.file.write(lines if lines.endswith('\n') else lines + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter(object):
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet export needs pyarrow, install it with "pip install pyctd[export]"')
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(name, self._get_type(column_type)) for name, column_type in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+
+    def _get_type(self, column_type):
+        pyarrow = self.pyarrow
+
+        if isinstance(column_type, list):
+            if len(column_type) == 1:
+                return pyarrow.list_(self._get_type(column_type[0][1]))
+            return pyarrow.list_(pyarrow.struct([(name, self._get_type(t)) for name, t in column_type]))
+        if isinstance(column_type, sqltypes.Integer):
+            return pyarrow.int64()
+        if isinstance(column_type, (sqltypes.Float, sqltypes.Numeric)):
+            return pyarrow.float64()
+        if isinstance(column_type, sqltypes.Boolean):
+            return pyarrow.bool_()
+        if isinstance(column_type, sqltypes.LargeBinary):
+            return pyarrow.binary()
+        return pyarrow.string()
+
+    def write(self, chunk):
+        self.writer.write_table(self.pyarrow.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.writer.close()
+
+
+_writers = {
+    'tsv': _TsvWriter,
+    'jsonl': _JsonlWriter,
+    'parquet': _ParquetWriter,
+}
+
+
+def export_statement(engine, statement, path, file_format=None, chunksize=CHUNKSIZE, children=(), unique=False):
+    """streams the results of a select statement into a file
+
+    The file is written under a temporary name and renamed when all rows are written; the temporary file is removed
+    if the export fails.
+
+    :param sqlalchemy.engine.Engine engine: engine of the database
+    :param statement: SQLAlchemy select statement (ordered by the primary key ``id`` if children are given)
+    :param str path: path to file
+    :param str file_format: 'tsv', 'jsonl' or 'parquet' (default: by extension of path)
+    :param int chunksize: number of rows fetched and written at once
+    :param iter[tuple] children: child tables merged as list columns, see :func:`get_children`
+    :param bool unique: if True rows with the same primary key ``id`` as the row before are skipped (the statement
+        must be ordered so that duplicates are adjacent, e.g. by the primary key)
+    :return: number of exported rows
+    :rtype: int
+    """
+    file_format = file_format or get_format(path)
+
+    if file_format not in _writers:
+        raise ValueError('file format {} not in {}'.format(file_format, FORMATS))
+
+    columns = [(column.key, column.type) for column in statement.selected_columns]
+    columns += [(name, [(column.name, column.type) for column in child.columns
+                        if column.name not in ('id', foreign_key.name)])
+                for child, foreign_key, name in children]
+
+    temporary_path = os.path.join(os.path.dirname(path), '.tmp.' + os.path.basename(path))
+    integer_columns = [name for name, column_type in columns if isinstance(column_type, sqltypes.Integer)]
+    binary_columns = [name for name, column_type in columns if isinstance(column_type, sqltypes.LargeBinary)] \
+        if file_format != 'parquet' else []
+
+    streams, writer = [], None
+    number_of_rows = 0
+    last_id = None
+    exported = False
+
+    try:
+        streams = [(_get_child_stream(engine, child, foreign_key, chunksize), name)
+                   for child, foreign_key, name in children]
+        writer = _writers[file_format](temporary_path, columns)
+
+        for chunk in iter_chunks(engine, statement, chunksize=chunksize):
+            if unique and not chunk.empty:
+                chunk = chunk[chunk['id'].ne(chunk['id'].shift(fill_value=last_id))].reset_index(drop=True)
+                last_id = chunk['id'].iloc[-1] if not chunk.empty else last_id
+            for name in integer_columns:
+                chunk[name] = chunk[name].astype('Int64')
+            for name in binary_columns:
+                chunk[name] = chunk[name].map(lambda value: None if value is None else base64.b64encode(value).decode())
+            writer.write(_add_children(chunk, streams))
+            number_of_rows += len(chunk)
+
+        writer.close()
+        os.replace(temporary_path, path)
+        exported = True
+    finally:
+        if not exported:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        for stream, _ in streams:
+            stream.close()
+
+    log.info('exported %s rows to %s', number_of_rows, path)
+    return number_of_rows
+
+
+def export_table(engine, table, path, file_format=None, chunksize=CHUNKSIZE, children=False):
+    """streams a table ordered by primary key into a file
+
+    :param sqlalchemy.engine.Engine engine: engine of the database
+    :param table: table name (with or without prefix), :class:`sqlalchemy.Table` or model
+    :param str path: path to file
+    :param str file_format: 'tsv', 'jsonl' or 'parquet' (default: by extension of path)
+    :param int chunksize: number of rows fetched and written at once
+    :param bool children: if True the one-to-many child tables are added as list columns
+    :return: number of exported rows
+    :rtype: int
+    """
+    table = get_table(table)
+    statement = select(table).order_by(*table.primary_key.columns)
+    return export_statement(engine, statement, path, file_format=file_format, chunksize=chunksize,
+                            children=get_children(table) if children else ())
+
+
+def get_table(table):
+    """returns the :class:`sqlalchemy.Table` of a table name (with or without prefix) or model
+
+    :param table: table name, table or model
+    :rtype: sqlalchemy.Table
+    """
+    if hasattr(table, '__table__'):
+        return table.__table__
+
+    if isinstance(table, str):
+        tables = models.Base.metadata.tables
+        name = table if table in tables else TABLE_PREFIX + table
+        if name not in tables:
+            raise ValueError('unknown table {}'.format(table))
+        return tables[name]
+
+    return table
+
+
+def export_tables(engine, directory, tables=None, file_format='tsv', chunksize=CHUNKSIZE, children=False,
+                  workers=4):
+    """streams tables into one file per table (named by the table without prefix), exported by parallel workers
+
+    :param sqlalchemy.engine.Engine engine: engine of the database
+    :param str directory: directory of the files
+    :param iter tables: names of tables, tables or models (default: all tables in the database)
+    :param str file_format: 'tsv', 'jsonl' or 'parquet'
+    :param int chunksize: number of rows fetched and written at once
+    :param bool children: if True child tables are added as list columns to their parents and not exported on
+        their own
+    :param int workers: number of tables exported at the same time
+    :return: number of exported rows per file
+    :rtype: dict[str,int]
+    """
+    if file_format not in _writers:
+        raise ValueError('file format {} not in {}'.format(file_format, FORMATS))
+
+    if tables is None:
+        existing = set(inspect(engine).get_table_names())
+        tables = [table for table in models.Base.metadata.sorted_tables if table.name in existing]
+    else:
+        tables = [get_table(table) for table in tables]
+
+    if children:
+        child_tables = {child for table in tables for child, _, _ in get_children(table)}
+        child_tables |= {models.PackedIdList.__table__, models.PackedIdIndex.__table__}
+        tables = [table for table in tables if table not in child_tables]
+
+    os.makedirs(directory, exist_ok=True)
+
+    def export(table):
+        path = os.path.join(directory, table.name[len(TABLE_PREFIX):] + _extensions[file_format])
+        return path, export_table(engine, table, path, file_format=file_format, chunksize=chunksize,
+                                  children=children)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(export, tables))
+
+
+def _get_neo4j_header(column):
+    for sqlalchemy_type, neo4j_type in _neo4j_types:
+        if isinstance(column.type, sqlalchemy_type):
+            return '{}:{}'.format(column.name, neo4j_type)
+    return column.name
+
+
+def _get_label(node_type):
+    return node_type.capitalize()
+
+
+def export_neo4j(engine, directory, chunksize=CHUNKSIZE, workers=4):
+    """streams chemicals, genes, diseases and pathways and their associations into CSV files for
+    ``neo4j-admin database import``
+
+    Nodes are identified by their CTD identifier (e.g. MeSH identifier) in one ID space per label; relationships
+    (one file per association table, see :data:`pyctd.manager.graph.EDGE_TYPES`) keep their scalar columns as
+    properties.
+
+    .. code-block:: sh
+
+        neo4j-admin database import full --nodes=chemical.csv --nodes=gene.csv ... \\
+            --relationships=chem_gene_ixn.csv ...
+
+    :param sqlalchemy.engine.Engine engine: engine of the database
+    :param str directory: directory of the CSV files
+    :param int chunksize: number of rows fetched and written at once
+    :param int workers: number of files exported at the same time
+    :return: number of exported rows per file
+    :rtype: dict[str,int]
+    """
+    os.makedirs(directory, exist_ok=True)
+    jobs = []
+
+    for node_type in NODE_TYPES:
+        model = _entity_models[node_type]
+        id_column = getattr(model, table_conf.tables[model].domain_id_column[1])
+        columns = [id_column.label('{}:ID({})'.format(id_column.key, _get_label(node_type)))]
+        columns += [column.label(_get_neo4j_header(column)) for column in model.__table__.columns
+                    if column.name not in ('id', id_column.key)]
+        statement = select(*columns).where(id_column.isnot(None)).order_by(model.id)
+        jobs.append((node_type, statement, _get_label(node_type)))
+
+    for model, source_type, target_type in EDGE_TYPES:
+        source_model, target_model = aliased(_entity_models[source_type]), aliased(_entity_models[target_type])
+        source_id = getattr(source_model, table_conf.tables[_entity_models[source_type]].domain_id_column[1])
+        target_id = getattr(target_model, table_conf.tables[_entity_models[target_type]].domain_id_column[1])
+        columns = [
+            source_id.label(':START_ID({})'.format(_get_label(source_type))),
+            target_id.label(':END_ID({})'.format(_get_label(target_type))),
+        ]
+        columns += [column.label(_get_neo4j_header(column)) for column in model.__table__.columns
+                    if column.name != 'id' and not column.foreign_keys]
+        statement = select(*columns).select_from(model) \
+            .join(source_model, source_model.id == getattr(model, source_type + '__id')) \
+            .join(target_model, target_model.id == getattr(model, target_type + '__id')) \
+            .where(source_id.isnot(None), target_id.isnot(None)).order_by(model.id)
+        jobs.append((model.table_suffix, statement, model.table_suffix.upper()))
+
+    def export(job):
+        name, statement, label = job
+        path = os.path.join(directory, name + '.csv')
+        number_of_rows = 0
+
+        with open(path + '.tmp', 'w', encoding='utf-8', newline='') as file:
+            header = True
+            for chunk in iter_chunks(engine, statement, chunksize=chunksize):
+                chunk[':TYPE' if name not in NODE_TYPES else ':LABEL'] = label
+                for column in chunk.columns:
+                    if column.endswith(':long') or column.startswith('gene_id:ID'):
+                        chunk[column] = chunk[column].astype('Int64')
+                chunk.to_csv(file, index=False, header=header)
+                header = False
+                number_of_rows += len(chunk)
+
+        os.replace(path + '.tmp', path)
+        log.info('exported %s rows to %s', number_of_rows, path)
+        return path, number_of_rows
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(export, jobs))
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""In-memory graph of chemicals, genes, diseases and pathways for multi-hop traversals
+
+The association tables (:class:`pyctd.manager.models.ChemGeneIxn`, :class:`pyctd.manager.models.ChemicalDisease`,
+:class:`pyctd.manager.models.GeneDisease`, :class:`pyctd.manager.models.GenePathway` and
+:class:`pyctd.manager.models.DiseasePathway`) are loaded once into an undirected graph in compressed sparse row
+(CSR) format with integer node identifiers. The graph is cached as ``.npz`` file per database and data version
+(see :mod:`pyctd.manager.cache`).
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> graph = pyctd.query().get_graph()
+    >>> chemical = graph.node('chemical', 'D000082')
+    >>> diseases = graph.expand([chemical], path=('gene', 'disease'))
+    >>> [graph.identifier(node) for node in diseases[:5]]
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from . import cache
+from . import models
+from . import table_conf
+from ..constants import PYCTD_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+NODE_TYPES = ('chemical', 'gene', 'disease', 'pathway')
+
+EDGE_TYPES = (
+    (models.ChemGeneIxn, 'chemical', 'gene'),
+    (models.ChemicalDisease, 'chemical', 'disease'),
+    (models.GeneDisease, 'gene', 'disease'),
+    (models.GenePathway, 'gene', 'pathway'),
+    (models.DiseasePathway, 'disease', 'pathway'),
+)
+"""(model, source node type, target node type) of all edges in the graph"""
+
+_node_models = {model.table_suffix: model for model in table_conf.models_to_map}
+
+
+def _gather(indptr, indices, nodes):
+    """returns the concatenated neighbors of nodes (vectorized slicing of a CSR structure)"""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = lengths.sum()
+
+    if not total:
+        return np.empty(0, dtype=indices.dtype)
+
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return indices[offsets + np.arange(total)]
+
+
+class Graph(object):
+    """Undirected graph in CSR format; nodes of one type have consecutive integer identifiers"""
+
+    def __init__(self, indptr, indices, edge_types, node_offsets, identifiers):
+        """
+        :param numpy.ndarray indptr: CSR index pointer (length: number of nodes + 1)
+        :param numpy.ndarray indices: CSR neighbors
+        :param numpy.ndarray edge_types: index in :data:`EDGE_TYPES` for every entry in indices
+        :param numpy.ndarray node_offsets: first node of every type in :data:`NODE_TYPES` and the number of nodes
+        :param numpy.ndarray identifiers: identifier (e.g. MeSH identifier) of every node
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_types = edge_types
+        self.node_offsets = node_offsets
+        self.identifiers = identifiers
+        self._node_index = None
+
+    def __repr__(self):
+        return 'Graph(nodes={}, edges={})'.format(self.number_of_nodes, self.number_of_edges)
+
+    @property
+    def number_of_nodes(self):
+        """:rtype: int"""
+        return len(self.indptr) - 1
+
+    @property
+    def number_of_edges(self):
+        """number of undirected edges
+
+        :rtype: int
+        """
+        return len(self.indices) // 2
+
+    @classmethod
+    def from_manager(cls, manager):
+        """builds the graph from the association tables in the database
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :rtype: Graph
+        """
+        node_offsets = [0]
+        identifiers = []
+        primary_keys = {}
+
+        for node_type in NODE_TYPES:
+            model = _node_models[node_type]
+            id_column = table_conf.tables[model].domain_id_column[1]
+            df = pd.read_sql(select(model.id, getattr(model, id_column)).order_by(model.id), manager.engine)
+            primary_keys[node_type] = df['id'].to_numpy()
+            identifiers.append(df[id_column].astype(str).to_numpy(dtype=str))
+            node_offsets.append(node_offsets[-1] + len(df))
+
+        sources, targets, edge_types = [], [], []
+
+        for edge_type, (model, source_type, target_type) in enumerate(EDGE_TYPES):
+            source_column, target_column = source_type + '__id', target_type + '__id'
+            df = pd.read_sql(
+                select(getattr(model, source_column), getattr(model, target_column)).distinct(),
+                manager.engine
+            ).dropna()
+
+            source = cls._to_nodes(df[source_column], primary_keys[source_type],
+                                   node_offsets[NODE_TYPES.index(source_type)])
+            target = cls._to_nodes(df[target_column], primary_keys[target_type],
+                                   node_offsets[NODE_TYPES.index(target_type)])
+
+            sources.extend([source, target])
+            targets.extend([target, source])
+            edge_types.extend([np.full(len(df), edge_type, dtype=np.int8)] * 2)
+            log.info('%s edges from %s', len(df), model.__tablename__)
+
+        sources, targets = np.concatenate(sources), np.concatenate(targets)
+        edge_types = np.concatenate(edge_types)
+
+        order = np.lexsort((targets, sources))
+        number_of_nodes = node_offsets[-1]
+        indptr = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=number_of_nodes), out=indptr[1:])
+
+        index_dtype = np.int32 if number_of_nodes < np.iinfo(np.int32).max else np.int64
+
+        return cls(
+            indptr=indptr,
+            indices=targets[order].astype(index_dtype),
+            edge_types=edge_types[order],
+            node_offsets=np.array(node_offsets, dtype=np.int64),
+            identifiers=np.concatenate(identifiers),
+        )
+
+    @staticmethod
+    def _to_nodes(foreign_keys, primary_keys, offset):
+        """maps foreign keys of a vocabulary table to node identifiers"""
+        return np.searchsorted(primary_keys, foreign_keys.to_numpy().astype(np.int64)) + offset
+
+    @classmethod
+    def load(cls, path):
+        """loads a graph from a ``.npz`` file
+
+        :param str path: path to file
+        :rtype: Graph
+        """
+        with np.load(path) as data:
+            return cls(**{key: data[key] for key in data.files})
+
+    def save(self, path):
+        """saves the graph in a ``.npz`` file
+
+        :param str path: path to file
+        """
+        np.savez(
+            path,
+            indptr=self.indptr,
+            indices=self.indices,
+            edge_types=self.edge_types,
+            node_offsets=self.node_offsets,
+            identifiers=self.identifiers,
+        )
+
+    @classmethod
+    def from_cache(cls, manager, cache_dir=PYCTD_DATA_DIR):
+        """loads the graph of the current data version from disk or builds and caches it
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :param str cache_dir: directory of cached graphs
+        :rtype: Graph
+        """
+        return cache.load_or_build(manager, 'graph', lambda: cls.from_manager(manager), cls.load, cls.save,
+                                   cache_dir=cache_dir)
+
+    def node(self, node_type, identifier):
+        """returns the integer node identifier of a chemical, gene, disease or pathway
+
+        :param str node_type: one of :data:`NODE_TYPES`
+        :param identifier: identifier, e.g. MeSH identifier of a chemical or NCBI Gene identifier of a gene
+        :rtype: int
+        """
+        if self._node_index is None:
+            self._node_index = {
+                (self.node_type(node), identifier): node for node, identifier in enumerate(self.identifiers)
+            }
+        return self._node_index[(node_type, str(identifier))]
+
+    def node_type(self, node):
+        """returns the type of a node
+
+        :param int node: node
+        :rtype: str
+        """
+        return NODE_TYPES[self.node_types(np.asarray([node]))[0]]
+
+    def node_types(self, nodes):
+        """returns the index in :data:`NODE_TYPES` of nodes
+
+        :param numpy.ndarray nodes: nodes
+        :rtype: numpy.ndarray
+        """
+        return np.searchsorted(self.node_offsets, nodes, side='right') - 1
+
+    def identifier(self, node):
+        """returns the identifier (e.g. MeSH identifier) of a node
+
+        :param int node: node
+        :rtype: str
+        """
+        return str(self.identifiers[node])
+
+    def _filter(self, nodes, node_type):
+        if node_type is None:
+            return nodes
+        type_index = NODE_TYPES.index(node_type)
+        return nodes[(nodes >= self.node_offsets[type_index]) & (nodes < self.node_offsets[type_index + 1])]
+
+    def neighbors(self, nodes, node_type=None):
+        """returns the neighbors of one or more nodes
+
+        :param nodes: node or iterable of nodes
+        :param str node_type: only neighbors of this type
+        :rtype: numpy.ndarray
+        """
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=np.int64))
+        return self._filter(np.unique(_gather(self.indptr, self.indices, nodes)), node_type)
+
+    def expand(self, nodes, path):
+        """follows a path of node types from the start nodes, e.g. from a chemical via genes to diseases
+
+        :param nodes: start node or iterable of start nodes
+        :param iter[str] path: node types of the hops, e.g. ('gene', 'disease')
+        :return: nodes at the end of the path
+        :rtype: numpy.ndarray
+        """
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=np.int64))
+        for node_type in path:
+            nodes = self.neighbors(nodes, node_type=node_type)
+        return nodes
+
+    def k_hop(self, nodes, k, node_type=None):
+        """returns all nodes reachable within k hops (including the start nodes)
+
+        :param nodes: start node or iterable of start nodes
+        :param int k: maximum number of hops
+        :param str node_type: only return nodes of this type (all types are traversed)
+        :rtype: numpy.ndarray
+        """
+        visited = np.zeros(self.number_of_nodes, dtype=bool)
+        frontier = np.unique(np.atleast_1d(np.asarray(nodes, dtype=np.int64)))
+        visited[frontier] = True
+
+        for _ in range(k):
+            if not len(frontier):
+                break
+            neighbors = np.unique(_gather(self.indptr, self.indices, frontier))
+            frontier = neighbors[~visited[neighbors]]
+            visited[frontier] = True
+
+        return self._filter(np.flatnonzero(visited), node_type)
+
+    def subgraph(self, nodes):
+        """returns the induced subgraph of nodes; nodes are renumbered in ascending order
+
+        :param nodes: iterable of nodes
+        :rtype: Graph
+        """
+        nodes = np.unique(np.asarray(nodes, dtype=np.int64))
+        mapping = np.full(self.number_of_nodes, -1, dtype=np.int64)
+        mapping[nodes] = np.arange(len(nodes))
+
+        lengths = self.indptr[nodes + 1] - self.indptr[nodes]
+        sources = np.repeat(np.arange(len(nodes)), lengths)
+        targets = mapping[_gather(self.indptr, self.indices, nodes)]
+        edge_types = _gather(self.indptr, self.edge_types, nodes)
+        keep = targets >= 0
+
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources[keep], minlength=len(nodes)), out=indptr[1:])
+
+        node_types = self.node_types(nodes)
+        node_offsets = np.searchsorted(node_types, np.arange(len(NODE_TYPES) + 1))
+
+        return Graph(
+            indptr=indptr,
+            indices=targets[keep].astype(self.indices.dtype),
+            edge_types=edge_types[keep],
+            node_offsets=node_offsets.astype(np.int64),
+            identifiers=self.identifiers[nodes],
+        )
+
+    def shortest_path(self, source, target, max_hops=None):
+        """returns a shortest path between two nodes (breadth-first search)
+
+        :param int source: start node
+        :param int target: end node
+        :param int max_hops: maximum length of the path
+        :return: nodes of the path including source and target or None if there is no path
+        :rtype: list[int]
+        """
+        parents = np.full(self.number_of_nodes, -1, dtype=np.int64)
+        parents[source] = source
+        frontier = np.array([source], dtype=np.int64)
+        hops = 0
+
+        while len(frontier) and parents[target] < 0:
+            if max_hops is not None and hops >= max_hops:
+                return None
+
+            lengths = self.indptr[frontier + 1] - self.indptr[frontier]
+            origins = np.repeat(frontier, lengths)
+            neighbors = _gather(self.indptr, self.indices, frontier)
+
+            new = parents[neighbors] < 0
+            neighbors, origins = neighbors[new], origins[new]
+            neighbors, first = np.unique(neighbors, return_index=True)
+            parents[neighbors] = origins[first]
+
+            frontier = neighbors
+            hops += 1
+
+        if parents[target] < 0:
+            return None
+
+        path = [target]
+        while path[-1] != source:
+            path.append(int(parents[path[-1]]))
+        return path[::-1]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""Hierarchy of the MeSH tree numbers of chemicals and diseases
+
+Tree numbers are materialized paths (e.g. ``C04.557.337``); the tree number of a parent is a prefix of the tree
+numbers of all its descendants followed by a separator (``.`` or ``/`` in MEDIC). With an index on the tree number
+columns (:class:`pyctd.manager.models.ChemicalTreenumber`, :class:`pyctd.manager.models.DiseaseTreenumber`) all
+descendants of a node are found with one range scan::
+
+    tree_number >= 'C04.' AND tree_number < 'C040'
+
+because ``.`` and ``/`` are the two characters directly before ``0``. The ancestors of a node are the prefixes of its
+tree numbers and are looked up by equality.
+"""
+
+from sqlalchemy import and_, or_
+
+SEPARATORS = ('.', '/')
+
+_LOWER_BOUND = '.'
+_UPPER_BOUND = '0'
+
+
+def get_ancestor_tree_numbers(tree_number):
+    """returns the tree numbers of all ancestors of a tree number, e.g. ['C04', 'C04.557'] for 'C04.557.337'
+
+    :param str tree_number: tree number
+    :rtype: list[str]
+    """
+    return [tree_number[:index] for index, character in enumerate(tree_number) if character in SEPARATORS]
+
+
+def is_descendant(column, tree_number, include_self=False):
+    """returns a range condition for all tree numbers in a column below a tree number
+
+    :param column: column with tree numbers
+    :param tree_number: tree number of the ancestor (str or column expression)
+    :param bool include_self: if True the tree number itself is included
+    :rtype: sqlalchemy.sql.elements.ClauseElement
+    """
+    condition = and_(column >= tree_number + _LOWER_BOUND, column < tree_number + _UPPER_BOUND)
+
+    if include_self:
+        return or_(column == tree_number, condition)
+
+    return condition
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""Instrumentation of :class:`pyctd.manager.query.QueryManager` methods
+
+Per method the number of calls, a latency histogram, the number of returned rows and the number of hydrated ORM
+instances (including eagerly loaded related objects) are recorded. SQL statements slower than a threshold are kept
+in a slow query log with their bound parameters and the query plan of the database (``EXPLAIN``).
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> query = pyctd.query()
+    >>> instrumentation = query.instrument(slow_query_threshold=0.1)
+    >>> query.get_chem_gene_interaction_actions(gene_symbol='APP')
+    >>> instrumentation.stats()['get_chem_gene_interaction_actions']
+    >>> instrumentation.slow_queries
+    >>> print(instrumentation.to_prometheus())
+"""
+
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from . import explain
+from . import models
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""upper bounds of the latency histogram buckets in seconds"""
+
+SlowQuery = namedtuple('SlowQuery', ['method', 'duration', 'statement', 'parameters', 'plan'])
+SlowQuery.__doc__ = """SQL statement slower than the threshold with its query plan (None if not available)"""
+
+_local = threading.local()
+
+
+def _current_calls():
+    if not hasattr(_local, 'calls'):
+        _local.calls = []
+    return _local.calls
+
+
+class _Call(object):
+    """measurements of one method call"""
+    __slots__ = ('instrumentation', 'method', 'rows_returned', 'rows_hydrated', 'statements')
+
+    def __init__(self, instrumentation, method):
+        self.instrumentation = instrumentation
+        self.method = method
+        self.rows_returned = 0
+        self.rows_hydrated = 0
+        self.statements = []
+
+
+class _MethodStats(object):
+    __slots__ = ('calls', 'seconds', 'buckets', 'rows_returned', 'rows_hydrated', 'slow_queries')
+
+    def __init__(self, number_of_buckets):
+        self.calls = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (number_of_buckets + 1)
+        self.rows_returned = 0
+        self.rows_hydrated = 0
+        self.slow_queries = 0
+
+
+class Instrumentation(object):
+    """Collects statistics of :class:`pyctd.manager.query.QueryManager` method calls and slow SQL statements"""
+
+    def __init__(self, slow_query_threshold=0.5, explain=True, buckets=DEFAULT_BUCKETS, max_slow_queries=100):
+        """
+        :param float slow_query_threshold: SQL statements running longer (in seconds) are logged
+        :param bool explain: if True the query plans of slow SELECT statements are captured
+        :param iter[float] buckets: upper bounds of the latency histogram buckets in seconds
+        :param int max_slow_queries: maximum number of slow queries kept (oldest are dropped first)
+        """
+        self.slow_query_threshold = slow_query_threshold
+        self.explain = explain
+        self.buckets = tuple(sorted(buckets))
+        self.slow_queries = deque(maxlen=max_slow_queries)
+        self._stats = OrderedDict()
+        self._engines = set()
+        self._start_key = 'pyctd_query_start_{}'.format(id(self))
+        self._listens_to_load = False
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        """listens to the SQL statements executed on an engine and to the ORM instances hydrated
+
+        :param sqlalchemy.engine.Engine engine: engine
+        """
+        if engine in self._engines:
+            return
+
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._engines.add(engine)
+
+        if not self._listens_to_load:
+            event.listen(models.Base, 'load', self._on_load, propagate=True)
+            self._listens_to_load = True
+
+    def detach(self):
+        """stops listening to the SQL statements of all engines and to the ORM instances hydrated"""
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._engines.clear()
+
+        if self._listens_to_load:
+            event.remove(models.Base, 'load', self._on_load)
+            self._listens_to_load = False
+
+    def _on_load(self, target, context):
+        """counts hydrated ORM instances for the calls of this instrumentation in progress in this thread"""
+        for call in _current_calls():
+            if call.instrumentation is self:
+                call.rows_hydrated += 1
+
+    def _before_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        connection.info[self._start_key] = time.perf_counter()
+
+    def _after_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        start = connection.info.pop(self._start_key, None)
+
+        if start is None:  # started before this instrumentation was attached
+            return
+
+        duration = time.perf_counter() - start
+        calls = _current_calls()
+
+        if calls and calls[-1].instrumentation is self and duration >= self.slow_query_threshold:
+            calls[-1].statements.append((duration, statement, parameters, connection.engine))
+
+    @contextmanager
+    def record(self, method):
+        """context manager which measures a method call
+
+        :param str method: name of the method
+        :rtype: _Call
+        """
+        call = _Call(self, method)
+        calls = _current_calls()
+        calls.append(call)
+        start = time.perf_counter()
+
+        try:
+            yield call
+        finally:
+            duration = time.perf_counter() - start
+            calls.remove(call)
+            self._add(call, duration)
+
+    def _add(self, call, duration):
+        slow_queries = [
+            SlowQuery(call.method, statement_duration, statement, parameters,
+                      self._explain(engine, statement, parameters))
+            for statement_duration, statement, parameters, engine in call.statements
+        ]
+
+        with self._lock:
+            stats = self._stats.get(call.method)
+            if stats is None:
+                stats = self._stats[call.method] = _MethodStats(len(self.buckets))
+
+            stats.calls += 1
+            stats.seconds += duration
+            stats.buckets[bisect.bisect_left(self.buckets, duration)] += 1
+            stats.rows_returned += call.rows_returned
+            stats.rows_hydrated += call.rows_hydrated
+            stats.slow_queries += len(slow_queries)
+            self.slow_queries.extend(slow_queries)
+
+        for slow_query in slow_queries:
+            log.warning('slow query in %s (%.3f s): %s %s', slow_query.method, slow_query.duration,
+                        slow_query.statement, slow_query.parameters)
+
+    def _explain(self, engine, statement, parameters):
+        if not self.explain or not statement.lstrip().upper().startswith('SELECT'):
+            return None
+
+        try:
+            return explain.explain_sql(engine, statement, parameters)
+        except Exception as e:
+            log.warning('no query plan for %s: %s', statement, e)
+            return None
+
+    def reset(self):
+        """removes all statistics and slow queries"""
+        with self._lock:
+            self._stats.clear()
+            self.slow_queries.clear()
+
+    def stats(self):
+        """returns the statistics per method
+
+        :return: method names as keys and dictionaries with calls, seconds (sum), mean_seconds, histogram (upper
+            bound: cumulative number of calls), rows_returned, rows_hydrated and slow_queries as values
+        :rtype: dict[str,dict]
+        """
+        result = OrderedDict()
+
+        with self._lock:
+            for method, stats in self._stats.items():
+                cumulative, histogram = 0, OrderedDict()
+                for bound, number in zip(self.buckets + (float('inf'),), stats.buckets):
+                    cumulative += number
+                    histogram[bound] = cumulative
+
+                result[method] = {
+                    'calls': stats.calls,
+                    'seconds': stats.seconds,
+                    'mean_seconds': stats.seconds / stats.calls,
+                    'histogram': histogram,
+                    'rows_returned': stats.rows_returned,
+                    'rows_hydrated': stats.rows_hydrated,
+                    'slow_queries': stats.slow_queries,
+                }
+
+        return result
+
+    def to_prometheus(self, prefix='pyctd_query'):
+        """returns the statistics in the Prometheus text exposition format
+
+        :param str prefix: prefix of the metric names
+        :rtype: str
+        """
+        stats = self.stats()
+        lines = [
+            '# HELP {}_duration_seconds Latency of QueryManager methods'.format(prefix),
+            '# TYPE {}_duration_seconds histogram'.format(prefix),
+        ]
+
+        for method, values in stats.items():
+            for bound, number in values['histogram'].items():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{}_duration_seconds_bucket{{method="{}",le="{}"}} {}'.format(prefix, method, le, number))
+            lines.append('{}_duration_seconds_sum{{method="{}"}} {!r}'.format(prefix, method, values['seconds']))
+            lines.append('{}_duration_seconds_count{{method="{}"}} {}'.format(prefix, method, values['calls']))
+
+        for name, key, description in (('rows_returned_total', 'rows_returned', 'Rows returned'),
+                                       ('rows_hydrated_total', 'rows_hydrated', 'ORM instances hydrated'),
+                                       ('slow_queries_total', 'slow_queries', 'SQL statements slower than the '
+                                                                              'threshold')):
+            lines.append('# HELP {}_{} {} by QueryManager methods'.format(prefix, name, description))
+            lines.append('# TYPE {}_{} counter'.format(prefix, name))
+            for method, values in stats.items():
+                lines.append('{}_{}{{method="{}"}} {}'.format(prefix, name, method, values[key]))
+
+        return '\n'.join(lines) + '\n'
+
+
+def count_rows(result):
+    """returns the number of rows of a method result (0 for results which are no collections)"""
+    try:
+        return len(result)
+    except TypeError:
+        return 0
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""Eager loading of relationships on query results and detection of lazy loads
+
+Relationships like :attr:`pyctd.manager.models.Chemical.synonyms` or
+:attr:`pyctd.manager.models.ChemGeneIxn.pubmed_ids` are loaded lazily by default, which issues one additional query
+per object. :func:`get_load_options` translates relationship names into SQLAlchemy loader options so that
+related objects are fetched together with the query results.
+"""
+
+import logging
+import warnings
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+from .packed import PackedIds
+
+log = logging.getLogger(__name__)
+
+
+class LazyLoadError(Exception):
+    """Raised by :class:`LazyLoadGuard` if a relationship is lazy loaded"""
+
+
+class LazyLoadWarning(UserWarning):
+    """Warning emitted by :class:`LazyLoadGuard` if a relationship is lazy loaded"""
+
+
+def get_load_options(model, load):
+    """returns loader options for relationships of a model
+
+    Collections (one-to-many) are loaded with :func:`sqlalchemy.orm.selectinload`, single objects
+    (many-to-one) with :func:`sqlalchemy.orm.joinedload`.
+
+    :param model: SQLAlchemy model class the relationships belong to
+    :param load: name of a relationship or a dotted path (e.g. 'chemical.synonyms') or an iterable of those
+    :type load: str or iter[str]
+    :return: list of SQLAlchemy loader options
+    :rtype: list
+    """
+    if isinstance(load, str):
+        load = [load]
+
+    options = []
+
+    for path in [expanded for path in load for expanded in _expand_packed_ids(model, path)]:
+        option = None
+        entity = model
+
+        for name in path.split('.'):
+            relationships = inspect(entity).relationships
+
+            if name not in relationships:
+                raise ValueError('{} has no relationship {}'.format(entity.__name__, name))
+
+            relationship = relationships[name]
+
+            if relationship.lazy == 'dynamic':
+                raise ValueError('{}.{} is a dynamic relationship and can not be loaded eagerly'.format(
+                    entity.__name__, name))
+
+            attribute = getattr(entity, name)
+
+            if option is None:
+                option = selectinload(attribute) if relationship.uselist else joinedload(attribute)
+            else:
+                option = option.selectinload(attribute) if relationship.uselist else option.joinedload(attribute)
+
+            entity = relationship.mapper.class_
+
+        options.append(option)
+
+    return options
+
+
+def _expand_packed_ids(model, path):
+    """replaces an accessor of ID lists (e.g. 'pubmed_ids' or 'pubmed_id_list', see
+    :class:`pyctd.manager.packed.PackedIds`) at the end of a path by its two relationships"""
+    names = path.split('.')
+    entity = model
+
+    for name in names[:-1]:
+        relationships = inspect(entity).relationships
+        if name not in relationships:
+            return [path]
+        entity = relationships[name].mapper.class_
+
+    synonyms = inspect(entity).synonyms
+    accessor = synonyms[names[-1]].descriptor if names[-1] in synonyms else getattr(entity, names[-1], None)
+
+    if not isinstance(accessor, PackedIds):
+        return [path]
+
+    return ['.'.join(names[:-1] + [name]) for name in accessor.relationships]
+
+
+class LazyLoadGuard(object):
+    """Context manager which detects lazy loads of relationships in a session
+
+    Every relationship which is not loaded with the query results (see ``load`` parameter of the
+    :class:`pyctd.manager.query.QueryManager` methods) issues an additional query on first access. Inside of the
+    guard these queries are counted and a :class:`LazyLoadWarning` is emitted or a :class:`LazyLoadError` is raised.
+
+    .. code-block:: python
+
+        >>> with query.lazy_load_guard(raise_on_lazy=True) as guard:
+        ...     ixns = query.get_chem_gene_interaction_actions(gene_symbol='APP', load='pubmed_ids')
+        ...     pubmed_ids = [[x.pubmed_id for x in ixn.pubmed_ids] for ixn in ixns]
+    """
+
+    def __init__(self, session, raise_on_lazy=False):
+        """
+        :param sqlalchemy.orm.Session session: session to observe
+        :param bool raise_on_lazy: if True a :class:`LazyLoadError` is raised, otherwise a warning is emitted
+        """
+        self.session = session
+        self.raise_on_lazy = raise_on_lazy
+        self.lazy_loads = []
+
+    @property
+    def count(self):
+        """number of lazy loads since the guard was entered
+
+        :rtype: int
+        """
+        return len(self.lazy_loads)
+
+    def _on_do_orm_execute(self, orm_execute_state):
+        state = orm_execute_state.lazy_loaded_from
+
+        if state is None:
+            return
+
+        description = '{} (id={})'.format(state.class_.__name__, state.identity[0] if state.identity else None)
+        self.lazy_loads.append(description)
+
+        message = 'lazy load of a relationship of {}; use the load parameter to load it eagerly'.format(description)
+
+        if self.raise_on_lazy:
+            raise LazyLoadError(message)
+
+        warnings.warn(message, LazyLoadWarning, stacklevel=2)
+
+    def __enter__(self):
+        event.listen(self.session, 'do_orm_execute', self._on_do_orm_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        event.remove(self.session, 'do_orm_execute', self._on_do_orm_execute)
+
+        if self.lazy_loads:
+            log.info('%s lazy loads detected', len(self.lazy_loads))
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""Sparse association matrices for machine learning pipelines
+
+The association tables are exported in one vectorized pass into :class:`scipy.sparse.csr_matrix` objects, e.g.
+chemical×disease weighted by ``inference_score``, chemical×gene interaction counts of an organism or gene×pathway
+incidence. Rows and columns are all chemicals, diseases, genes or pathways of the imported data ordered by their
+primary key, so matrices of one data version share their index maps whatever their weight or filters. Every matrix
+is cached as ``.npz`` file per database, data version, kind, weight and filters (see :mod:`pyctd.manager.cache`).
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> query = pyctd.query()
+    >>> matrix = query.get_matrix('chemical_disease', weight='inference_score')
+    >>> matrix.matrix[matrix.row_index['D000082']]
+    >>> query.get_matrix('chemical_gene', organism_id=9606).to_frame()
+"""
+
+import hashlib
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy import func, select
+
+from . import cache
+from . import models
+from . import table_conf
+from ..constants import PYCTD_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+MATRIX_TYPES = {
+    'chemical_disease': (models.ChemicalDisease, 'chemical', 'disease'),
+    'chemical_gene': (models.ChemGeneIxn, 'chemical', 'gene'),
+    'gene_disease': (models.GeneDisease, 'gene', 'disease'),
+    'gene_pathway': (models.GenePathway, 'gene', 'pathway'),
+    'disease_pathway': (models.DiseasePathway, 'disease', 'pathway'),
+}
+"""kind of matrix: (model, row type, column type)"""
+
+WEIGHTS = ('count', 'binary', 'inference_score', 'direct_evidence')
+"""weights of the entries: number of associations, 1 for every association, maximum inference score or 1 for
+associations with direct evidence"""
+
+FILTERS = {
+    'organism_id': (models.ChemGeneIxn,),
+    'direct_evidence': (models.ChemicalDisease, models.GeneDisease),
+}
+"""filters and the models they are available for"""
+
+_entity_models = {model.table_suffix: model for model in table_conf.models_to_map}
+
+
+def _get_entities(manager, entity_type):
+    """returns primary keys and identifiers of all entities of a type ordered by primary key"""
+    model = _entity_models[entity_type]
+    id_column = table_conf.tables[model].domain_id_column[1]
+    df = pd.read_sql(select(model.id, getattr(model, id_column)).order_by(model.id), manager.engine)
+    return df['id'].to_numpy(), df[id_column].astype(str).to_numpy(dtype=str)
+
+
+def _get_cache_name(kind, weight, filters):
+    """returns the file name of a matrix without data version"""
+    name = 'matrix_{}_{}'.format(kind, weight)
+    if filters:
+        name += '_' + hashlib.sha1(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return name
+
+
+class AssociationMatrix(object):
+    """Sparse matrix of associations with the identifiers of its rows and columns"""
+
+    def __init__(self, matrix, row_type, column_type, row_ids, column_ids):
+        """
+        :param scipy.sparse.csr_matrix matrix: weights of the associations
+        :param str row_type: 'chemical', 'disease', 'gene' or 'pathway'
+        :param str column_type: 'chemical', 'disease', 'gene' or 'pathway'
+        :param numpy.ndarray row_ids: identifier (e.g. MeSH identifier) of every row
+        :param numpy.ndarray column_ids: identifier of every column
+        """
+        self.matrix = matrix
+        self.row_type = row_type
+        self.column_type = column_type
+        self.row_ids = row_ids
+        self.column_ids = column_ids
+        self._row_index = None
+        self._column_index = None
+
+    def __repr__(self):
+        return 'AssociationMatrix({}×{}, shape={}, nnz={})'.format(
+            self.row_type, self.column_type, self.matrix.shape, self.matrix.nnz)
+
+    @property
+    def row_index(self):
+        """row of every identifier
+
+        :rtype: dict[str,int]
+        """
+        if self._row_index is None:
+            self._row_index = {identifier: row for row, identifier in enumerate(self.row_ids)}
+        return self._row_index
+
+    @property
+    def column_index(self):
+        """column of every identifier
+
+        :rtype: dict[str,int]
+        """
+        if self._column_index is None:
+            self._column_index = {identifier: column for column, identifier in enumerate(self.column_ids)}
+        return self._column_index
+
+    @classmethod
+    def from_manager(cls, manager, kind, weight='count', organism_id=None, direct_evidence=None):
+        """builds a matrix from an association table in the database
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :param str kind: kind of matrix in :data:`MATRIX_TYPES`
+        :param str weight: weight in :data:`WEIGHTS`
+        :param int organism_id: only interactions in an organism (NCBI Taxonomy identifier, 'chemical_gene')
+        :param str direct_evidence: only associations with a direct evidence, e.g. 'therapeutic' ('chemical_disease',
+            'gene_disease')
+        :rtype: AssociationMatrix
+        """
+        filters = {'organism_id': organism_id, 'direct_evidence': direct_evidence}
+        model, row_type, column_type = cls._check(kind, weight, filters)
+
+        row_keys, row_ids = _get_entities(manager, row_type)
+        column_keys, column_ids = _get_entities(manager, column_type)
+
+        row_column = getattr(model, row_type + '__id')
+        column_column = getattr(model, column_type + '__id')
+
+        if weight == 'inference_score':
+            value = func.max(model.inference_score)
+        elif weight == 'direct_evidence':
+            value = func.count(model.direct_evidence)
+        else:
+            value = func.count()
+
+        statement = select(row_column.label('row'), column_column.label('column'), value.label('value')).where(
+            row_column.isnot(None), column_column.isnot(None)).group_by(row_column, column_column)
+
+        for name, filter_value in filters.items():
+            if filter_value is not None:
+                statement = statement.where(getattr(model, name) == filter_value)
+
+        df = pd.read_sql(statement, manager.engine)
+        values = df['value'].fillna(0).to_numpy(dtype=np.float32)
+
+        if weight in ('binary', 'direct_evidence'):
+            values = (values > 0).astype(np.float32)
+
+        rows = np.searchsorted(row_keys, df['row'].to_numpy().astype(np.int64))
+        columns = np.searchsorted(column_keys, df['column'].to_numpy().astype(np.int64))
+        keep = values != 0
+
+        matrix = sparse.csr_matrix(
+            (values[keep], (rows[keep], columns[keep])),
+            shape=(len(row_keys), len(column_keys))
+        )
+        log.info('%s matrix with %s associations', kind, matrix.nnz)
+
+        return cls(matrix, row_type, column_type, row_ids, column_ids)
+
+    @staticmethod
+    def _check(kind, weight, filters):
+        """returns model, row and column type of a kind of matrix or raises a ValueError for unknown arguments"""
+        if kind not in MATRIX_TYPES:
+            raise ValueError('matrix {} not in {}'.format(kind, sorted(MATRIX_TYPES)))
+
+        if weight not in WEIGHTS:
+            raise ValueError('weight {} not in {}'.format(weight, WEIGHTS))
+
+        model = MATRIX_TYPES[kind][0]
+
+        if weight in ('inference_score', 'direct_evidence') and not hasattr(model, weight):
+            raise ValueError('weight {} not available for {}'.format(weight, kind))
+
+        for name, value in filters.items():
+            if value is not None and model not in FILTERS[name]:
+                raise ValueError('filter {} not available for {}'.format(name, kind))
+
+        return MATRIX_TYPES[kind]
+
+    @classmethod
+    def load(cls, path):
+        """loads a matrix from a ``.npz`` file
+
+        :param str path: path to file
+        :rtype: AssociationMatrix
+        """
+        with np.load(path) as data:
+            matrix = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+            return cls(matrix, str(data['row_type']), str(data['column_type']), data['row_ids'], data['column_ids'])
+
+    def save(self, path):
+        """saves the matrix in a ``.npz`` file
+
+        :param str path: path to file
+        """
+        np.savez(
+            path,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            row_type=np.array(self.row_type),
+            column_type=np.array(self.column_type),
+            row_ids=self.row_ids,
+            column_ids=self.column_ids,
+        )
+
+    @classmethod
+    def from_cache(cls, manager, kind, weight='count', cache_dir=PYCTD_DATA_DIR, **filters):
+        """loads a matrix of the current data version from disk or builds and caches it
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :param str kind: kind of matrix in :data:`MATRIX_TYPES`
+        :param str weight: weight in :data:`WEIGHTS`
+        :param str cache_dir: directory of cached matrices
+        :param filters: filters in :data:`FILTERS`
+        :rtype: AssociationMatrix
+        """
+        filters = {name: value for name, value in filters.items() if value is not None}
+        return cache.load_or_build(manager, _get_cache_name(kind, weight, filters),
+                                   lambda: cls.from_manager(manager, kind, weight=weight, **filters), cls.load,
+                                   cls.save, cache_dir=cache_dir)
+
+    def to_frame(self):
+        """returns all non-zero entries with the identifiers of their rows and columns
+
+        :return: columns ``<row type>_id``, ``<column type>_id`` and ``value``
+        :rtype: pandas.DataFrame
+        """
+        coo = self.matrix.tocoo()
+        return pd.DataFrame({
+            self.row_type + '_id': self.row_ids[coo.row],
+            self.column_type + '_id': self.column_ids[coo.col],
+            'value': coo.data,
+        })
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+interaction = ('affects', 'decreases', 'increases')
+"""degrees of interaction in InteractionActionType.interaction_action (e.g. 'increases^expression')"""
+
 parentcode = ('clv', 'deg', 'gly', 'lip', 'met', 'rib', 'sec', 'trt', 'upt')
 
 typename = (
@@ -7,14 +7,26 @@ fits the description in the table_conf module
     :target: _images/all.png
 """
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, REAL, BigInteger
+from sqlalchemy import Column, ForeignKey, Index, Integer, LargeBinary, SmallInteger, String, Text, REAL, BigInteger
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm import backref, relationship, synonym
 
 from .defaults import TABLE_PREFIX
+from .packed import PackedIds
 
 Base = declarative_base()
 
+PACKED_ID_LISTS = (
+    'chem_gene_ixn__pubmed_id',
+    'chemical__disease__omim_id',
+    'chemical__disease__pubmed_id',
+    'gene__disease__omim_id',
+    'gene__disease__pubmed_id',
+)
+"""child tables (without TABLE_PREFIX) stored in :class:`PackedIdList` in the compact storage mode; the code of a
+child table is its position"""
+
 
 def foreign_key_to(table_name):
     """Creates a standard foreign key to a table in the database
@@ -28,6 +40,22 @@ def foreign_key_to(table_name):
     return Column(Integer, ForeignKey(foreign_column))
 
 
+def packed_id_list(model_name, child_table_name):
+    """Creates the relationship of a model to the packed ID list of one of its child tables
+
+    :param str model_name: name of the parent model
+    :param str child_table_name: name of the child table without TABLE_PREFIX (see :data:`PACKED_ID_LISTS`)
+    :rtype: sqlalchemy.orm.RelationshipProperty
+    """
+    return relationship(
+        'PackedIdList',
+        primaryjoin='and_(foreign(PackedIdList.parent__id) == {}.id, PackedIdList.child == {})'.format(
+            model_name, PACKED_ID_LISTS.index(child_table_name)),
+        uselist=False,
+        viewonly=True
+    )
+
+
 class Pathway(Base):
     """Pathway vocabulary
     
@@ -59,6 +87,26 @@ class Action(Base):
         return self.type_name
 
 
+class InteractionActionType(Base):
+    """Interaction actions of chemical–gene interactions (e.g. 'increases^expression') with degree of interaction and
+    action; lookup table of :class:`ChemGeneIxnInteractionAction`
+    """
+    table_suffix = "interaction_action_type"
+    __tablename__ = TABLE_PREFIX + table_suffix
+    id = Column(Integer, primary_key=True)
+
+    interaction_action = Column(String(255), unique=True)
+    interaction = Column(String(255), doc='degree of interaction, see '
+                                          ':data:`pyctd.manager.model_types.action.interaction` (None if the '
+                                          'interaction action is not in the form degree^action)')
+    action__id = foreign_key_to('action')
+
+    action = relationship(Action)
+
+    def __repr__(self):
+        return self.interaction_action
+
+
 class Chemical(Base):
     """Chemical vocabulary
 
@@ -112,7 +160,7 @@ class ChemicalTreenumber(Base):
     id = Column(Integer, primary_key=True)
 
     chemical__id = foreign_key_to('chemical')
-    tree_number = Column(String(255))
+    tree_number = Column(String(255), index=True)
 
     chemical = relationship(Chemical, back_populates="tree_numbers")
 
@@ -254,6 +302,26 @@ class DiseaseSlimmapping(Base):
         return self.slim_mapping
 
 
+class DiseaseTreenumber(Base):
+    """Tree numbers of Disease vocabulary (MEDIC), indexed for descendant queries
+
+    .. seealso::
+
+        :mod:`pyctd.manager.hierarchy`
+    """
+    table_suffix = "disease__tree_number"
+    __tablename__ = TABLE_PREFIX + table_suffix
+    id = Column(Integer, primary_key=True)
+
+    disease__id = foreign_key_to('disease')
+    tree_number = Column(String(255), index=True)
+
+    disease = relationship(Disease)
+
+    def __repr__(self):
+        return self.tree_number
+
+
 class Gene(Base):
     """Gene vocabulary
 
@@ -404,8 +472,15 @@ class ChemicalDisease(Base):
     chemical = relationship('Chemical')
     disease = relationship('Disease')
 
-    omim_ids = relationship('ChemicalDiseaseOmim')
-    pubmed_ids = relationship('ChemicalDiseasePubmedid')
+    omim_id_rows = relationship('ChemicalDiseaseOmim')
+    omim_ids_packed = packed_id_list('ChemicalDisease', 'chemical__disease__omim_id')
+    omim_ids = synonym('omim_id_rows', descriptor=PackedIds('omim_id_rows', 'omim_ids_packed', 'omim_id'))
+    omim_id_list = PackedIds('omim_id_rows', 'omim_ids_packed', 'omim_id', values=True)
+
+    pubmed_id_rows = relationship('ChemicalDiseasePubmedid')
+    pubmed_ids_packed = packed_id_list('ChemicalDisease', 'chemical__disease__pubmed_id')
+    pubmed_ids = synonym('pubmed_id_rows', descriptor=PackedIds('pubmed_id_rows', 'pubmed_ids_packed', 'pubmed_id'))
+    pubmed_id_list = PackedIds('pubmed_id_rows', 'pubmed_ids_packed', 'pubmed_id', values=True)
 
     def __repr__(self):
         return '{} : {} [gene: {}, score: {}]'.format(
@@ -497,7 +572,10 @@ class ChemGeneIxn(Base):
 
     gene_forms = relationship('ChemGeneIxnGeneForm')
     interaction_actions = relationship('ChemGeneIxnInteractionAction')
-    pubmed_ids = relationship('ChemGeneIxnPubmed')
+    pubmed_id_rows = relationship('ChemGeneIxnPubmed')
+    pubmed_ids_packed = packed_id_list('ChemGeneIxn', 'chem_gene_ixn__pubmed_id')
+    pubmed_ids = synonym('pubmed_id_rows', descriptor=PackedIds('pubmed_id_rows', 'pubmed_ids_packed', 'pubmed_id'))
+    pubmed_id_list = PackedIds('pubmed_id_rows', 'pubmed_ids_packed', 'pubmed_id', values=True)
 
     def __repr__(self):
         return '{} -> {}; interaction: {}'.format(
@@ -535,7 +613,14 @@ class ChemGeneIxnInteractionAction(Base):
     id = Column(Integer, primary_key=True)
 
     chem_gene_ixn__id = foreign_key_to('chem_gene_ixn')
-    interaction_action = Column(String(255), index=True)
+    interaction_action_type__id = foreign_key_to('interaction_action_type')
+
+    interaction_action_type = relationship(InteractionActionType, lazy='joined')
+    interaction_action = association_proxy('interaction_action_type', 'interaction_action')
+
+    __table_args__ = (
+        Index('ix_' + TABLE_PREFIX + table_suffix, 'interaction_action_type__id', 'chem_gene_ixn__id'),
+    )
 
     def __repr__(self):
         return self.interaction_action
@@ -697,8 +782,15 @@ class GeneDisease(Base):
     gene = relationship('Gene')
     disease = relationship('Disease')
 
-    omim_ids = relationship('GeneDiseaseOmim')
-    pubmed_ids = relationship('GeneDiseasePubmed')
+    omim_id_rows = relationship('GeneDiseaseOmim')
+    omim_ids_packed = packed_id_list('GeneDisease', 'gene__disease__omim_id')
+    omim_ids = synonym('omim_id_rows', descriptor=PackedIds('omim_id_rows', 'omim_ids_packed', 'omim_id'))
+    omim_id_list = PackedIds('omim_id_rows', 'omim_ids_packed', 'omim_id', values=True)
+
+    pubmed_id_rows = relationship('GeneDiseasePubmed')
+    pubmed_ids_packed = packed_id_list('GeneDisease', 'gene__disease__pubmed_id')
+    pubmed_ids = synonym('pubmed_id_rows', descriptor=PackedIds('pubmed_id_rows', 'pubmed_ids_packed', 'pubmed_id'))
+    pubmed_id_list = PackedIds('pubmed_id_rows', 'pubmed_ids_packed', 'pubmed_id', values=True)
 
     def __repr__(self):
         return 'gene:{}; disease:{}; chemical:{}; evidence:{}'.format(
@@ -758,3 +850,135 @@ class GenePathway(Base):
 
     def __repr__(self):
         return 'gene:{}; pathway:{}'.format(self.gene, self.pathway)
+
+
+class Meta(Base):
+    """Information about the imported data as key–value pairs (e.g. data version or size of top-k tables)"""
+    table_suffix = "meta"
+    __tablename__ = TABLE_PREFIX + table_suffix
+    id = Column(Integer, primary_key=True)
+
+    key = Column(String(255), unique=True)
+    value = Column(Text)
+
+    def __repr__(self):
+        return '{}: {}'.format(self.key, self.value)
+
+
+class TopChemicalDisease(Base):
+    """Top-k chemical–disease associations per disease ranked by inference score
+
+    Built by :meth:`pyctd.manager.database.DbManager.build_top_k`
+    """
+    table_suffix = "top__chemical__disease"
+    __tablename__ = TABLE_PREFIX + table_suffix
+    id = Column(Integer, primary_key=True)
+
+    disease__id = foreign_key_to('disease')
+    rank = Column(Integer)
+    inference_score = Column(REAL)
+    chemical__disease__id = foreign_key_to('chemical__disease')
+
+    chemical_disease = relationship('ChemicalDisease')
+
+    __table_args__ = (
+        Index('ix_' + TABLE_PREFIX + table_suffix, 'disease__id', 'rank', 'inference_score', 'chemical__disease__id'),
+    )
+
+
+class TopChemGoEnriched(Base):
+    """Top-k Chemical–GO enriched associations per chemical ranked by highest GO level and corrected p-value
+
+    Built by :meth:`pyctd.manager.database.DbManager.build_top_k`
+    """
+    table_suffix = "top__chem__go_enriched"
+    __tablename__ = TABLE_PREFIX + table_suffix
+    id = Column(Integer, primary_key=True)
+
+    chemical__id = foreign_key_to('chemical')
+    rank = Column(Integer)
+    highest_go_level = Column(Integer)
+    corrected_p_value = Column(REAL)
+    chem__go_enriched__id = foreign_key_to('chem__go_enriched')
+
+    chem_go_enriched = relationship('ChemGoEnriched')
+
+    __table_args__ = (
+        Index('ix_' + TABLE_PREFIX + table_suffix, 'chemical__id', 'rank', 'highest_go_level', 'corrected_p_value',
+              'chem__go_enriched__id'),
+    )
+
+
+class TopChemPathwayEnriched(Base):
+    """Top-k Chemical–pathway enriched associations per chemical ranked by corrected p-value
+
+    Built by :meth:`pyctd.manager.database.DbManager.build_top_k`
+    """
+    table_suffix = "top__chem__pathway_enriched"
+    __tablename__ = TABLE_PREFIX + table_suffix
+    id = Column(Integer, primary_key=True)
+
+    chemical__id = foreign_key_to('chemical')
+    rank = Column(Integer)
+    corrected_p_value = Column(REAL)
+    chem__pathway_enriched__id = foreign_key_to('chem__pathway_enriched')
+
+    chem_pathway_enriched = relationship('ChemPathwayEnriched')
+
+    __table_args__ = (
+        Index('ix_' + TABLE_PREFIX + table_suffix, 'chemical__id', 'rank', 'corrected_p_value',
+              'chem__pathway_enriched__id'),
+    )
+
+
+class Vocabulary(Base):
+    """Distinct values of vocabulary columns (e.g. gene forms) with their number of occurrences
+
+    Built by :meth:`pyctd.manager.database.DbManager.build_vocabularies`
+    """
+    table_suffix = "vocabulary"
+    __tablename__ = TABLE_PREFIX + table_suffix
+    id = Column(Integer, primary_key=True)
+
+    name = Column(String(255))
+    value = Column(String(255))
+    count = Column(Integer)
+
+    __table_args__ = (
+        Index('ix_' + TABLE_PREFIX + table_suffix, 'name', 'value'),
+    )
+
+    def __repr__(self):
+        return '{}: {} ({})'.format(self.name, self.value, self.count)
+
+
+class PackedIdList(Base):
+    """Delta-encoded ID lists of the child tables in :data:`PACKED_ID_LISTS` (compact storage mode)
+
+    Built by :meth:`pyctd.manager.database.DbManager.import_packed_id_list`, see :mod:`pyctd.manager.packed`
+    """
+    table_suffix = "packed_id_list"
+    __tablename__ = TABLE_PREFIX + table_suffix
+
+    child = Column(SmallInteger, primary_key=True, doc='code of the child table, see :data:`PACKED_ID_LISTS`')
+    parent__id = Column(Integer, primary_key=True, doc='primary key of the parent (e.g. chemical–gene interaction)')
+    ids = Column(LargeBinary)
+
+    # clustered by the primary key, so a list needs neither a row id nor a separate index entry
+    __table_args__ = {'sqlite_with_rowid': False}
+
+
+class PackedIdIndex(Base):
+    """Inverted index of the PubMed and OMIM identifiers of associations (stored in :class:`PackedIdList` or in the
+    child tables): delta-encoded primary keys of the parents of every identifier
+
+    Built by :meth:`pyctd.manager.database.DbManager.build_packed_id_index`
+    """
+    table_suffix = "packed_id_index"
+    __tablename__ = TABLE_PREFIX + table_suffix
+
+    child = Column(SmallInteger, primary_key=True, doc='code of the child table, see :data:`PACKED_ID_LISTS`')
+    value = Column(Integer, primary_key=True, doc='identifier, e.g. PubMed identifier')
+    parent_ids = Column(LargeBinary)
+
+    __table_args__ = {'sqlite_with_rowid': False}
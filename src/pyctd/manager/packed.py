@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""Packed storage of the high-volume ID lists (PubMed and OMIM identifiers) of associations
+
+In the compact storage mode (``pyctd update --packed``) the PubMed and OMIM identifiers of chemical–gene
+interactions, chemical–disease and gene–disease associations are not stored as one row per identifier in their child
+tables (e.g. :class:`pyctd.manager.models.ChemGeneIxnPubmed`) but as one row per association in
+:class:`pyctd.manager.models.PackedIdList`. The sorted identifiers are delta-encoded and written as variable length
+integers (7 bits per byte, the highest bit marks following bytes), so most identifiers need one or two bytes instead of
+a row with primary key, foreign key and index entries.
+
+The accessors of the associations (e.g. :attr:`pyctd.manager.models.ChemGeneIxn.pubmed_ids`) decode the packed lists
+transparently; in SQL (e.g. ``ChemGeneIxn.pubmed_ids.any(...)``) they stand for the child rows, which are empty in the
+compact storage mode, so ORM statements on these child tables raise a :class:`PackedStorageError` there.
+:class:`pyctd.manager.models.PackedIdIndex` is the inverted index of the identifiers: the associations of every
+identifier, packed the same way (built by :meth:`pyctd.manager.database.DbManager.build_packed_id_index` from the
+packed lists or the child rows).
+"""
+
+import threading
+
+import numpy as np
+from sqlalchemy import event, exc, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+_storage_modes = {}
+_storage_modes_lock = threading.Lock()
+
+
+class PackedStorageError(ValueError):
+    """Raised for ORM statements on child tables which are stored as packed ID lists (compact storage mode)"""
+
+
+def pack(ids):
+    """returns sorted integers delta-encoded as variable length integers
+
+    :param iter[int] ids: non-negative integers
+    :rtype: bytes
+    """
+    packed = bytearray()
+    previous = 0
+
+    for value in sorted(ids):
+        delta = value - previous
+        previous = value
+
+        while delta >= 0x80:
+            packed.append(delta & 0x7f | 0x80)
+            delta >>= 7
+        packed.append(delta)
+
+    return bytes(packed)
+
+
+def unpack(packed):
+    """returns the sorted integers of a packed list (see :func:`pack`)
+
+    :param bytes packed: packed integers
+    :rtype: list[int]
+    """
+    ids = []
+    value = 0
+    delta = 0
+    shift = 0
+
+    for byte in packed or b'':
+        delta |= (byte & 0x7f) << shift
+
+        if byte & 0x80:
+            shift += 7
+        else:
+            value += delta
+            ids.append(value)
+            delta = 0
+            shift = 0
+
+    return ids
+
+
+def unpack_many(packed_lists):
+    """decodes many packed lists at once
+
+    :param list[bytes] packed_lists: packed lists
+    :return: all integers (in the order of the lists) and the number of integers of every list
+    :rtype: tuple[numpy.ndarray,numpy.ndarray]
+    """
+    data = np.frombuffer(b''.join(packed_lists), dtype=np.uint8)
+    last = data < 0x80
+
+    value_index = np.cumsum(last) - last
+    starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    shifts = 7 * (np.arange(len(data)) - starts[value_index])
+
+    deltas = np.zeros(int(last.sum()), dtype=np.int64)
+    np.add.at(deltas, value_index, (data & 0x7f).astype(np.int64) << shifts)
+
+    ends = np.cumsum([len(packed) for packed in packed_lists], dtype=np.int64)
+    counts = np.diff(np.concatenate(([0], np.cumsum(last)))[ends], prepend=0)
+    ids = np.cumsum(deltas)
+
+    # the deltas of every list start at 0, subtract the sum of all previous lists
+    list_starts = np.cumsum(counts) - counts
+    offsets = np.concatenate(([0], ids))[list_starts]
+    return ids - np.repeat(offsets, counts), counts
+
+
+class PackedIds(object):
+    """Accessor of an ID list which is stored as child rows or as packed list (compact storage mode)
+
+    Returns the child rows if there are any, otherwise the packed identifiers as (transient) objects of the child
+    model, so both storage modes look the same; with ``values=True`` the sorted identifiers are returned instead. A
+    relationship which is not loaded yet is loaded lazily, the packed list first (one lookup by primary key); the
+    ``load`` parameter of the ``get_*`` methods loads both relationships eagerly (see
+    :func:`pyctd.manager.loading.get_load_options`).
+    """
+
+    def __init__(self, rows, packed, column, values=False):
+        """
+        :param str rows: name of the relationship to the child rows
+        :param str packed: name of the relationship to the :class:`pyctd.manager.models.PackedIdList`
+        :param str column: column of the identifier in the child model, e.g. 'pubmed_id'
+        :param bool values: if True the identifiers are returned instead of objects of the child model
+        """
+        self.rows = rows
+        self.packed = packed
+        self.column = column
+        self.values = values
+        self.relationships = (rows, packed)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        if self.rows not in inspect(instance).unloaded:
+            rows = getattr(instance, self.rows)
+            if rows:
+                return self._from_rows(rows)
+
+        packed = getattr(instance, self.packed)
+        if packed is None:
+            return self._from_rows(getattr(instance, self.rows))
+
+        ids = unpack(packed.ids)
+        if self.values:
+            return ids
+
+        model = getattr(owner, self.rows).property.mapper.class_
+        return [model(**{self.column: value}) for value in ids]
+
+    def _from_rows(self, rows):
+        return sorted(getattr(row, self.column) for row in rows) if self.values else rows
+
+
+def set_storage_mode(engine, id_lists):
+    """sets the storage of the ID lists of a database (e.g. after an import)
+
+    :param sqlalchemy.engine.Engine engine: engine of the database
+    :param str id_lists: 'rows' or 'packed'
+    """
+    with _storage_modes_lock:
+        _storage_modes[str(engine.url)] = id_lists
+
+
+def get_storage_mode(engine):
+    """returns the storage of the ID lists of a database: 'rows' or 'packed' (read once from the meta table)
+
+    :param sqlalchemy.engine.Engine engine: engine of the database
+    :rtype: str
+    """
+    key = str(engine.url)
+    id_lists = _storage_modes.get(key)
+
+    if id_lists is None:
+        from .models import Meta
+
+        try:
+            with engine.connect() as connection:
+                id_lists = connection.execute(select(Meta.value).where(Meta.key == 'id_lists')).scalar()
+        except exc.SQLAlchemyError:
+            # no meta table yet, an import sets the storage mode (see set_storage_mode)
+            id_lists = None
+
+        id_lists = id_lists or 'rows'
+        set_storage_mode(engine, id_lists)
+
+    return id_lists
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _check_packed_child_tables(orm_execute_state):
+    """raises :class:`PackedStorageError` for ORM statements on empty child tables of a database in the compact
+    storage mode (loading the relationships of the accessors is allowed)"""
+    if orm_execute_state.is_relationship_load:
+        return
+
+    bind = orm_execute_state.session.get_bind()
+
+    if bind is None or get_storage_mode(bind) != 'packed':
+        return
+
+    from .models import PACKED_ID_LISTS, TABLE_PREFIX
+
+    for table in find_tables(orm_execute_state.statement, include_aliases=True, include_joins=True):
+        if table.name[len(TABLE_PREFIX):] in PACKED_ID_LISTS:
+            raise PackedStorageError('{} is stored as packed ID lists (compact storage mode), use the ID list '
+                                     'accessors or QueryManager.get_parent_ids'.format(table.name))
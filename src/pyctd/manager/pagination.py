@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""Keyset pagination of query results
+
+Pages are not selected by an offset but by the sort key of the last row of the previous page (e.g.
+``WHERE id > :last_id ORDER BY id LIMIT :page_size``), so every page costs the same as the first one. Queries
+without an order are sorted by primary key; ordered queries (e.g. ranked by inference score) keep their order with
+the primary key as tie-breaker.
+
+The position is returned as an opaque cursor string which can be passed through e.g. a REST API.
+"""
+
+import base64
+import json
+from collections import namedtuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import operators
+
+Page = namedtuple('Page', ['items', 'cursor'])
+Page.__doc__ = """A page of results and the cursor of the next page (None if it is the last page)"""
+
+
+def encode_cursor(method, values):
+    """returns an opaque cursor for the sort key values of the last row of a page
+
+    :param str method: name of the paginated method
+    :param list values: sort key values
+    :rtype: str
+    """
+    values = [value.item() if hasattr(value, 'item') else value for value in values]
+    data = json.dumps([method, values], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(method, cursor):
+    """returns the sort key values of a cursor
+
+    :param str method: name of the paginated method
+    :param str cursor: cursor created by :func:`encode_cursor`
+    :rtype: list
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_method, values = json.loads(data.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor {}'.format(cursor))
+
+    if cursor_method != method:
+        raise ValueError('cursor of {} can not be used for {}'.format(cursor_method, method))
+
+    return values
+
+
+def get_sort_keys(query):
+    """returns the sort keys of a query as list of (column, descending); the primary key is added as tie-breaker
+
+    :param sqlalchemy.orm.query.Query query: SQL Alchemy query of one model
+    :rtype: list[tuple]
+    """
+    model = query.column_descriptions[0]['entity']
+    sort_keys = []
+
+    for clause in query._order_by_clauses:
+        modifier = getattr(clause, 'modifier', None)
+        if modifier in (operators.desc_op, operators.asc_op):
+            sort_keys.append((clause.element, modifier is operators.desc_op))
+        else:
+            sort_keys.append((clause, False))
+
+    if not any(column.key == 'id' and column.table is model.__table__ for column, _ in sort_keys):
+        sort_keys.append((model.__table__.c.id, False))
+
+    return sort_keys
+
+
+def order_by(query, sort_keys):
+    """orders a query by the sort keys; NULL values of nullable sort keys are always sorted last
+
+    :param sqlalchemy.orm.query.Query query: SQL Alchemy query
+    :param list[tuple] sort_keys: sort keys as returned by :func:`get_sort_keys`
+    :rtype: sqlalchemy.orm.query.Query
+    """
+    clauses = []
+    for column, descending in sort_keys:
+        if column.nullable:
+            clauses.append(column.is_(None))
+        clauses.append(column.desc() if descending else column)
+
+    return query.order_by(None).order_by(*clauses)
+
+
+def after(sort_keys, values):
+    """returns the condition for all rows after the row with the sort key values (in the order of :func:`order_by`)
+
+    :param list[tuple] sort_keys: sort keys as returned by :func:`get_sort_keys`
+    :param list values: sort key values of the last row of the previous page
+    :rtype: sqlalchemy.sql.elements.ClauseElement
+    """
+    conditions = []
+    equal = []
+
+    for (column, descending), value in zip(sort_keys, values):
+        if value is not None:
+            beyond = column < value if descending else column > value
+            if column.nullable:
+                beyond = or_(beyond, column.is_(None))
+            conditions.append(and_(*equal, beyond))
+            equal.append(column == value)
+        else:
+            equal.append(column.is_(None))
+
+    return or_(*conditions)
+
+
+def paginate(query, method, page_size, cursor=None):
+    """returns the ordered and filtered query of one page (without limit) and its sort keys
+
+    :param sqlalchemy.orm.query.Query query: SQL Alchemy query of one model
+    :param str method: name of the paginated method (is part of the cursor)
+    :param int page_size: number of results per page
+    :param str cursor: cursor of the page (None for the first page)
+    :rtype: tuple[sqlalchemy.orm.query.Query,list[tuple]]
+    """
+    if page_size < 1:
+        raise ValueError('page_size has to be a positive integer')
+
+    sort_keys = get_sort_keys(query)
+    query = order_by(query, sort_keys)
+
+    if cursor:
+        query = query.filter(after(sort_keys, decode_cursor(method, cursor)))
+
+    return query, sort_keys
+
+
+def get_values(item, sort_keys):
+    """returns the sort key values of a result row
+
+    :param item: model instance, named tuple, record, row of a :class:`numpy.ndarray` or :class:`pandas.Series`
+    :param list[tuple] sort_keys: sort keys as returned by :func:`get_sort_keys`
+    :rtype: list
+    """
+    if isinstance(item, tuple) or not hasattr(item, '__getitem__'):
+        return [getattr(item, column.key) for column, _ in sort_keys]
+
+    return [item[column.key] for column, _ in sort_keys]
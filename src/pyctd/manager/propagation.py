@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""Network propagation (random walk with restart, personalized PageRank) over the graph of CTD associations
+
+The column stochastic transition matrix of :class:`pyctd.manager.graph.Graph` is built once and kept in memory. A
+seed set is propagated by sparse matrix–vector iterations
+
+.. math::
+
+    p_{t+1} = (1 - r) W p_t + r p_0
+
+until the L1 norm of the change is below the tolerance. All seed sets of a batch are propagated together as columns
+of one matrix; probability reaching nodes without edges is returned to the seeds.
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> query = pyctd.query()
+    >>> query.propagate(['D000082'], node_type='gene', limit=20)
+    >>> query.propagate_batch({'aspirin': ['D001241'], 'paracetamol': ['D000082']}, node_type='disease')
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .graph import EDGE_TYPES, NODE_TYPES
+
+log = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ['seed_set', 'rank', 'node_type', 'identifier', 'score']
+"""columns of the results of :meth:`Propagator.propagate`"""
+
+
+class PropagationError(Exception):
+    """Raised if a propagation does not converge"""
+
+
+class Propagator(object):
+    """Random walk with restart on a :class:`pyctd.manager.graph.Graph` with a cached transition matrix"""
+
+    def __init__(self, graph, edge_types=None):
+        """
+        :param pyctd.manager.graph.Graph graph: graph of CTD associations
+        :param iter[str] edge_types: only walk on edges of these tables, e.g. ['chem_gene_ixn', 'gene_disease']
+            (default: all edges of the graph)
+        """
+        self.graph = graph
+        self.matrix = self._get_transition_matrix(graph, edge_types)
+        self.dangling = np.asarray(self.matrix.sum(axis=0)).ravel() == 0
+
+    def __repr__(self):
+        return 'Propagator(nodes={}, edges={})'.format(self.matrix.shape[0], self.matrix.nnz)
+
+    @staticmethod
+    def _get_transition_matrix(graph, edge_types):
+        """returns the column stochastic transition matrix of the graph"""
+        number_of_nodes = graph.number_of_nodes
+        indices = graph.indices
+        indptr = graph.indptr
+
+        if edge_types is not None:
+            table_names = [model.table_suffix for model, _, _ in EDGE_TYPES]
+            unknown = set(edge_types) - set(table_names)
+            if unknown:
+                raise ValueError('edge types {} not in {}'.format(sorted(unknown), table_names))
+
+            keep = np.isin(graph.edge_types, [table_names.index(name) for name in edge_types])
+            sources = np.repeat(np.arange(number_of_nodes), np.diff(indptr))[keep]
+            adjacency = sparse.csr_matrix(
+                (np.ones(keep.sum()), (sources, indices[keep])), shape=(number_of_nodes, number_of_nodes))
+        else:
+            adjacency = sparse.csr_matrix(
+                (np.ones(len(indices)), indices, indptr), shape=(number_of_nodes, number_of_nodes))
+
+        degrees = np.asarray(adjacency.sum(axis=0)).ravel()
+        inverse = np.divide(1.0, degrees, out=np.zeros(number_of_nodes), where=degrees > 0)
+
+        # the adjacency matrix is symmetric, so scaling its columns by the inverse degree gives W D^-1
+        return (adjacency @ sparse.diags(inverse)).tocsr()
+
+    def _get_seeds(self, seeds, seed_type):
+        """returns the nodes of seeds given as identifiers of one type or as (node type, identifier) tuples"""
+        nodes = []
+
+        for seed in seeds:
+            node_type, identifier = seed if isinstance(seed, tuple) else (seed_type, seed)
+            try:
+                nodes.append(self.graph.node(node_type, identifier))
+            except KeyError:
+                log.warning('seed %s %s not in graph', node_type, identifier)
+
+        return np.unique(np.asarray(nodes, dtype=np.int64))
+
+    def scores(self, seed_sets, seed_type='chemical', restart_probability=0.3, tolerance=1e-6, max_iterations=100):
+        """returns the stationary probabilities of random walks with restart at the seed sets
+
+        :param list seed_sets: seed sets; a seed set is a list of identifiers of ``seed_type`` or
+            (node type, identifier) tuples
+        :param str seed_type: type of seeds given as identifiers
+        :param float restart_probability: probability to jump back to the seeds in every step
+        :param float tolerance: maximum L1 norm of the change of every column at convergence
+        :param int max_iterations: maximum number of iterations
+        :return: array with one column of probabilities per seed set (zero for seed sets not in the graph)
+        :rtype: numpy.ndarray
+        """
+        if not 0 < restart_probability <= 1:
+            raise ValueError('restart probability {} not in (0, 1]'.format(restart_probability))
+
+        restart = np.zeros((self.matrix.shape[0], len(seed_sets)))
+
+        for column, seeds in enumerate(seed_sets):
+            nodes = self._get_seeds(seeds, seed_type)
+            if len(nodes):
+                restart[nodes, column] = 1.0 / len(nodes)
+
+        probabilities = restart.copy()
+
+        for iteration in range(max_iterations):
+            walked = self.matrix @ probabilities
+            lost = probabilities[self.dangling].sum(axis=0)
+            updated = (1 - restart_probability) * (walked + restart * lost) + restart_probability * restart
+            change = np.abs(updated - probabilities).sum(axis=0)
+            probabilities = updated
+
+            if change.max(initial=0) < tolerance:
+                log.debug('propagation converged after %s iterations', iteration + 1)
+                return probabilities
+
+        raise PropagationError('propagation did not converge in {} iterations (change {:.2e})'.format(
+            max_iterations, change.max()))
+
+    def propagate(self, seed_sets, seed_type='chemical', node_type=None, restart_probability=0.3, limit=100,
+                  exclude_seeds=True, tolerance=1e-6, max_iterations=100):
+        """ranks the nodes by their probability in random walks with restart at the seed sets
+
+        :param dict seed_sets: names of seed sets as keys and seeds (identifiers of ``seed_type`` or
+            (node type, identifier) tuples) as values
+        :param str seed_type: type of seeds given as identifiers
+        :param str node_type: only rank nodes of this type
+        :param float restart_probability: probability to jump back to the seeds in every step
+        :param int limit: maximum number of nodes per seed set (None: all nodes with a score)
+        :param bool exclude_seeds: if True the seeds are not ranked
+        :param float tolerance: maximum L1 norm of the change of every column at convergence
+        :param int max_iterations: maximum number of iterations
+        :return: results ordered by seed set and rank with :data:`RESULT_COLUMNS`
+        :rtype: pandas.DataFrame
+        """
+        if node_type is not None and node_type not in NODE_TYPES:
+            raise ValueError('node type {} not in {}'.format(node_type, NODE_TYPES))
+
+        names = list(seed_sets)
+        probabilities = self.scores([seed_sets[name] for name in names], seed_type=seed_type,
+                                    restart_probability=restart_probability, tolerance=tolerance,
+                                    max_iterations=max_iterations)
+
+        candidates = np.arange(self.matrix.shape[0])
+        if node_type is not None:
+            type_index = NODE_TYPES.index(node_type)
+            candidates = candidates[self.graph.node_offsets[type_index]:self.graph.node_offsets[type_index + 1]]
+
+        frames = []
+
+        for column, name in enumerate(names):
+            scores = probabilities[candidates, column]
+            keep = scores > 0
+
+            if exclude_seeds:
+                keep &= ~np.isin(candidates, self._get_seeds(seed_sets[name], seed_type))
+
+            nodes, scores = candidates[keep], scores[keep]
+            order = np.lexsort((nodes, -scores))[:limit]
+            nodes = nodes[order]
+
+            if not len(nodes):
+                continue
+
+            frames.append(pd.DataFrame({
+                'seed_set': name,
+                'rank': np.arange(1, len(nodes) + 1),
+                'node_type': np.asarray(NODE_TYPES)[self.graph.node_types(nodes)],
+                'identifier': self.graph.identifiers[nodes],
+                'score': scores[order],
+            }, columns=RESULT_COLUMNS))
+
+        if not frames:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        return pd.concat(frames, ignore_index=True)
@@ -1,33 +1,633 @@
 # -*- coding: utf-8 -*-
 
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
 from pandas import read_sql
-from sqlalchemy import distinct
+from sqlalchemy import distinct, exc, func, select
+from sqlalchemy.orm import Query, aliased, make_transient_to_detached
 
+from . import explain
+from . import hierarchy
+from . import model_types
 from . import models
-from .database import BaseDbManager
+from . import pagination
+from . import records
+from . import statements
+from .database import BaseDbManager, vocabulary_columns
+from .defaults import TABLE_PREFIX
+from .enrichment import IncidenceMatrix
+from .export import CHUNKSIZE, export_neo4j, export_statement, export_tables, get_children
+from .graph import Graph
+from .instrumentation import Instrumentation, count_rows
+from .loading import LazyLoadGuard, get_load_options
+from .records import RESULT_TYPES
+from .matrices import AssociationMatrix
+from .packed import unpack
+from .propagation import Propagator
+from .resolver import EntityResolver
+from .similarity import SimilarityIndex
+
+_graphs = {}
+_incidence_matrices = {}
+_propagators = {}
+_resolvers = {}
+_similarity_indices = {}
+_vocabularies = {}
+_cache_lock = threading.RLock()
+"""guards the process-wide caches above; reentrant because cached values are built from other cached values"""
+
+_pubmed_id_tables = (
+    ('chem_gene_ixn__pubmed_id', models.ChemGeneIxn),
+    ('chemical__disease__pubmed_id', models.ChemicalDisease),
+    ('gene__disease__pubmed_id', models.GeneDisease),
+)
+"""child tables with PubMed identifiers and the models of their parents, see :meth:`QueryManager.get_by_pubmed`"""
 
 
 class QueryManager(BaseDbManager):
     """Query interface to database."""
 
-    def _limit_and_df(self, query, limit, as_df=False):
+    vocabulary_cache_ttl = 60
+    """seconds after which the data version is checked again before cached vocabularies are used"""
+
+    statement_cache_size = 500
+    """maximum number of cached statement templates of the ``get_*`` methods per connection (0 disables the cache),
+    see :mod:`pyctd.manager.statements`"""
+
+    instrumentation = None
+    """:class:`pyctd.manager.instrumentation.Instrumentation` recording the method calls (None if not instrumented)"""
+
+    def _limit_and_df(self, query, limit, as_df=False, load=None, result_type=None):
         """adds a limit (limit==None := no limit) to any query and allow a return as pandas.DataFrame
 
         :param bool as_df: if is set to True results return as pandas.DataFrame
         :param `sqlalchemy.orm.query.Query` query: SQL Alchemy query 
         :param int limit: maximum number of results
+        :param load: relationship name(s) to load eagerly with the results,
+            see :func:`pyctd.manager.loading.get_load_options`
+        :param str result_type: 'orm' (default) returns model instances; 'tuple', 'record' or 'array' return
+            lightweight rows, see :mod:`pyctd.manager.records`
         :return: query result of pyctd.manager.models.XY objects
         """
+        if result_type not in (None,) + RESULT_TYPES:
+            raise ValueError('result_type {} not in {}'.format(result_type, RESULT_TYPES))
+
+        if load and (as_df or result_type not in (None, 'orm')):
+            raise ValueError('load can only be used with model instances (result_type orm)')
+
+        if result_type not in (None, 'orm') and not as_df:
+            return records.fetch(query, result_type, limit=limit)
+
         if limit:
             query = query.limit(limit)
 
         if as_df:
             results = read_sql(query.statement, self.engine)
         else:
+            if load:
+                model = query.column_descriptions[0]['entity']
+                query = query.options(*get_load_options(model, load))
             results = query.all()
 
         return results
 
+    def _query(self, *entities):
+        """returns a query of entities in the session of the manager
+
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        return self.session.query(*entities)
+
+    def _get_query(self, method, *args, **kwargs):
+        """returns the query of a ``get_*`` method (with limit and loader options) instead of its results
+
+        :param str method: name of a ``get_*`` method
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        return getattr(_QueryBuilder.from_session(self.session), method)(*args, **kwargs)
+
+    def paginate(self, method, *args, page_size=1000, cursor=None, **kwargs):
+        """returns one page of the results of a ``get_*`` method (keyset pagination)
+
+        Results are sorted by the order of the method (e.g. by inference score) or by primary key. Every page is
+        selected by the sort key of the last row of the previous page, so all pages are equally fast.
+
+        .. code-block:: python
+
+            >>> page = query.paginate('get_chem_gene_interaction_actions', chemical_name='Aspirin', page_size=100)
+            >>> while page.cursor:
+            ...     page = query.paginate('get_chem_gene_interaction_actions', chemical_name='Aspirin',
+            ...                           page_size=100, cursor=page.cursor)
+
+        :param str method: name of a ``get_*`` method, e.g. 'get_chem_gene_interaction_actions'
+        :param int page_size: maximum number of results per page
+        :param str cursor: cursor of the page to return (None for the first page)
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method (except of limit)
+        :return: results and cursor of the next page (None if this is the last page)
+        :rtype: pyctd.manager.pagination.Page
+        """
+        as_df = kwargs.pop('as_df', False)
+        load = kwargs.pop('load', None)
+        result_type = kwargs.pop('result_type', None)
+
+        query, sort_keys = pagination.paginate(self._get_query(method, *args, **kwargs), method, page_size, cursor)
+        results = self._limit_and_df(query, page_size + 1, as_df, load=load, result_type=result_type)
+
+        if len(results) <= page_size:
+            return pagination.Page(results, None)
+
+        results = results.iloc[:page_size] if as_df else results[:page_size]
+        last = results.iloc[-1] if as_df else results[-1]
+
+        return pagination.Page(results, pagination.encode_cursor(method, pagination.get_values(last, sort_keys)))
+
+    def _get_filter_query(self, method, args, kwargs):
+        """returns the unordered query of a ``get_*`` method without limit and output options
+
+        Loader options are dropped, so only the joins of the filters remain (filters on child tables are semi joins,
+        see :meth:`_filter_child`).
+        """
+        for name in ('limit', 'as_df', 'load', 'result_type'):
+            kwargs.pop(name, None)
+        return self._get_query(method, *args, **kwargs).order_by(None)
+
+    def count(self, method, *args, **kwargs):
+        """returns the number of results of a ``get_*`` method with ``SELECT COUNT(DISTINCT id)`` instead of
+        fetching them
+
+        .. code-block:: python
+
+            >>> query.count('get_chem_gene_interaction_actions', chemical_name='Aspirin')
+
+        :param str method: name of a ``get_*`` method, e.g. 'get_chem_gene_interaction_actions'
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method; with ``limit`` at most limit rows are counted
+        :rtype: int
+        """
+        limit = kwargs.get('limit')
+        query = self._get_filter_query(method, args, kwargs)
+        model = query.column_descriptions[0]['entity']
+
+        if limit:
+            ids = query.with_entities(model.id).distinct().limit(limit).subquery()
+            return self.session.query(func.count()).select_from(ids).scalar()
+
+        return query.with_entities(func.count(distinct(model.id))).scalar()
+
+    def exists(self, method, *args, **kwargs):
+        """returns True if a ``get_*`` method has at least one result (``SELECT EXISTS``)
+
+        :param str method: name of a ``get_*`` method, e.g. 'get_chem_gene_interaction_actions'
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method (a limit does not change whether there are results)
+        :rtype: bool
+        """
+        query = self._get_filter_query(method, args, kwargs)
+        return self.session.query(query.exists()).scalar()
+
+    def estimate(self, method, *args, **kwargs):
+        """returns the number of results of a ``get_*`` method estimated from the table statistics of the database
+
+        The query is not executed. Falls back to :meth:`count` if the database has no row estimates (e.g. SQLite
+        without statistics, see :meth:`pyctd.manager.database.DbManager.analyze`).
+
+        .. seealso::
+
+            :func:`pyctd.manager.explain.estimate_rows`
+
+        :param str method: name of a ``get_*`` method, e.g. 'get_chem_gene_interaction_actions'
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method; with ``limit`` the estimate is at most limit
+        :rtype: int
+        """
+        limit = kwargs.get('limit')
+        query = self._get_filter_query(method, args, dict(kwargs))
+        estimate = explain.estimate_rows(self.engine, query.statement)
+
+        if estimate is None:
+            return self.count(method, *args, **kwargs)
+
+        return min(estimate, limit) if limit else estimate
+
+    def export(self, method, path, *args, file_format=None, chunksize=CHUNKSIZE, children=False, **kwargs):
+        """streams the results of a ``get_*`` method into a TSV, JSON Lines or Parquet file without loading them
+        into memory
+
+        .. code-block:: python
+
+            >>> query.export('get_chemical_diseases', 'aspirin.tsv.gz', chemical_name='Aspirin')
+            >>> query.export('get_genes', 'genes.jsonl', children=True)
+
+        :param str method: name of a ``get_*`` method, e.g. 'get_chemical_diseases'
+        :param str path: path to file
+        :param str file_format: 'tsv', 'jsonl' or 'parquet' (default: by extension of path, TSV and JSON Lines can
+            be compressed with ``.gz``)
+        :param int chunksize: number of rows fetched and written at once
+        :param bool children: if True the one-to-many child tables (e.g. synonyms) are added as list columns and
+            the results are ordered by primary key
+        :param args: positional arguments of the method
+        :param kwargs: keyword arguments of the method
+        :return: number of exported rows (each row once)
+        :rtype: int
+        """
+        for name in ('as_df', 'load', 'result_type'):
+            kwargs.pop(name, None)
+
+        query = self._get_query(method, *args, **kwargs)
+        table = query.column_descriptions[0]['entity'].__table__
+
+        if children:
+            query = query.order_by(None)
+
+        # duplicates of a row (e.g. by a join of a child table) are adjacent if ordered by primary key last
+        query = query.order_by(*table.primary_key.columns)
+
+        return export_statement(self.engine, query.statement, path, file_format=file_format, chunksize=chunksize,
+                                children=get_children(table) if children else (), unique=True)
+
+    def export_tables(self, directory, tables=None, file_format='tsv', chunksize=CHUNKSIZE, children=False,
+                      workers=4):
+        """streams tables into one file per table, exported by parallel workers
+
+        .. seealso::
+
+            :func:`pyctd.manager.export.export_tables`
+
+        :param str directory: directory of the files
+        :param iter tables: names of tables (without prefix, e.g. 'chemical'), tables or models (default: all)
+        :param str file_format: 'tsv', 'jsonl' or 'parquet'
+        :param int chunksize: number of rows fetched and written at once
+        :param bool children: if True child tables are added as list columns to their parents
+        :param int workers: number of tables exported at the same time
+        :return: number of exported rows per file
+        :rtype: dict[str,int]
+        """
+        return export_tables(self.engine, directory, tables=tables, file_format=file_format, chunksize=chunksize,
+                             children=children, workers=workers)
+
+    def export_neo4j(self, directory, chunksize=CHUNKSIZE, workers=4):
+        """streams chemicals, genes, diseases, pathways and their associations into node and relationship CSV
+        files for ``neo4j-admin database import``
+
+        .. seealso::
+
+            :func:`pyctd.manager.export.export_neo4j`
+
+        :param str directory: directory of the CSV files
+        :param int chunksize: number of rows fetched and written at once
+        :param int workers: number of files exported at the same time
+        :return: number of exported rows per file
+        :rtype: dict[str,int]
+        """
+        return export_neo4j(self.engine, directory, chunksize=chunksize, workers=workers)
+
+    def _get_cached(self, name, load):
+        """returns a value cached per connection and data version; load is called on a cache miss"""
+        with _cache_lock:
+            cache = _vocabularies.setdefault(self.connection, {'data_version': None, 'checked': None, 'values': {}})
+
+            if cache['checked'] is None or time.monotonic() - cache['checked'] > self.vocabulary_cache_ttl:
+                data_version = self.data_version
+                if data_version != cache['data_version']:
+                    cache['values'] = {}
+                    cache['data_version'] = data_version
+                cache['checked'] = time.monotonic()
+
+            if name not in cache['values']:
+                cache['values'][name] = load()
+
+            return cache['values'][name]
+
+    def _load_vocabulary(self, name):
+        column = vocabulary_columns[name]
+
+        try:
+            rows = self.session.query(models.Vocabulary.value, models.Vocabulary.count) \
+                .filter(models.Vocabulary.name == name).order_by(models.Vocabulary.value).all()
+        except exc.SQLAlchemyError:
+            self.session.rollback()
+            rows = None
+
+        if not rows:
+            rows = self.session.query(column, func.count()).filter(column.isnot(None)).group_by(column) \
+                .order_by(column).all()
+
+        return OrderedDict(tuple(row) for row in rows)
+
+    def vocabulary(self, name):
+        """returns the distinct values of a vocabulary with their number of occurrences
+
+        Values are read from :class:`pyctd.manager.models.Vocabulary` (built during the import) and cached in
+        memory until the data version changes.
+
+        :param str name: 'gene_form', 'interaction_action' or 'direct_evidence'
+        :return: values as keys and numbers of occurrences as values, ordered by value
+        :rtype: collections.OrderedDict
+        """
+        if name not in vocabulary_columns:
+            raise ValueError('vocabulary {} not in {}'.format(name, list(vocabulary_columns)))
+
+        return self._get_cached(name, lambda: self._load_vocabulary(name))
+
+    def lazy_load_guard(self, raise_on_lazy=False):
+        """returns a context manager which warns about (or raises on) lazy loads of relationships
+
+        Relationships which are not loaded with the ``load`` parameter of the ``get_*`` methods issue
+        one query per object on first access.
+
+        :param bool raise_on_lazy: if True :class:`pyctd.manager.loading.LazyLoadError` is raised instead of
+            emitting a :class:`pyctd.manager.loading.LazyLoadWarning`
+        :rtype: pyctd.manager.loading.LazyLoadGuard
+        """
+        return LazyLoadGuard(self.session, raise_on_lazy=raise_on_lazy)
+
+    def instrument(self, slow_query_threshold=0.5, explain=True, **kwargs):
+        """records latency, returned and hydrated rows of all query methods (``get_*`` methods with results,
+        ``paginate``, ``count``, ``resolve``, …) and logs slow SQL statements
+
+        .. code-block:: python
+
+            >>> instrumentation = query.instrument(slow_query_threshold=0.1)
+            >>> query.get_gene_disease(direct_evidence='marker/mechanism', limit=100)
+            >>> instrumentation.stats()['get_gene_disease']['rows_returned']
+            100
+            >>> print(instrumentation.to_prometheus())
+
+        :param float slow_query_threshold: SQL statements running longer (in seconds) are logged
+        :param bool explain: if True the query plans of slow SELECT statements are captured
+        :param kwargs: further arguments of :class:`pyctd.manager.instrumentation.Instrumentation`
+        :rtype: pyctd.manager.instrumentation.Instrumentation
+        """
+        if self.instrumentation is not None:
+            self.instrumentation.detach()
+
+        self.instrumentation = Instrumentation(slow_query_threshold=slow_query_threshold, explain=explain, **kwargs)
+        self.instrumentation.attach(self.engine)
+        return self.instrumentation
+
+    def uninstrument(self):
+        """stops recording the method calls and removes the event listeners of the instrumentation"""
+        if self.instrumentation is not None:
+            self.instrumentation.detach()
+            self.instrumentation = None
+
+    def get_graph(self, cache=True):
+        """returns the chemical–gene–disease–pathway graph for multi-hop traversals
+
+        The graph is built once per data version and kept in memory and on disk (in the pyctd data folder).
+
+        :param bool cache: if False the graph is always built from the database
+        :rtype: pyctd.manager.graph.Graph
+        """
+        if not cache:
+            return Graph.from_manager(self)
+
+        key = (self.connection, self.data_version)
+        with _cache_lock:
+            if key not in _graphs:
+                _graphs.clear()
+                _graphs[key] = Graph.from_cache(self)
+            return _graphs[key]
+
+    def get_propagator(self, edge_types=None, cache=True):
+        """returns the random walk with restart engine on the graph (see :meth:`get_graph`)
+
+        The transition matrix is built once per data version and set of edge types and kept in memory.
+
+        :param iter[str] edge_types: only walk on edges of these tables, e.g. ['chem_gene_ixn', 'gene_disease']
+            (default: all edges of the graph)
+        :param bool cache: if False the graph and the transition matrix are always built from the database
+        :rtype: pyctd.manager.propagation.Propagator
+        """
+        if not cache:
+            return Propagator(self.get_graph(cache=False), edge_types=edge_types)
+
+        key = (self.connection, self.data_version, tuple(sorted(edge_types)) if edge_types is not None else None)
+        with _cache_lock:
+            if key not in _propagators:
+                if any(cached_key[:2] != key[:2] for cached_key in _propagators):
+                    _propagators.clear()
+                _propagators[key] = Propagator(self.get_graph(), edge_types=edge_types)
+            return _propagators[key]
+
+    def propagate(self, seeds, seed_type='chemical', node_type=None, restart_probability=0.3, limit=100,
+                  exclude_seeds=True, edge_types=None):
+        """Prioritizes chemicals, genes, diseases or pathways for a seed set by random walk with restart
+        (personalized PageRank)
+
+        .. code-block:: python
+
+            >>> query.propagate(['D000082'], node_type='gene', limit=20)
+            >>> query.propagate([('gene', '348'), ('gene', '351')], node_type='disease')
+
+        :param iter seeds: identifiers of ``seed_type`` or (node type, identifier) tuples
+        :param str seed_type: type of seeds given as identifiers
+        :param str node_type: only rank 'chemical', 'gene', 'disease' or 'pathway'
+        :param float restart_probability: probability to jump back to the seeds in every step
+        :param int limit: maximum number of nodes (None: all nodes with a score)
+        :param bool exclude_seeds: if True the seeds are not ranked
+        :param iter[str] edge_types: only walk on edges of these tables (default: all edges of the graph)
+        :return: ranked nodes with columns rank, node_type, identifier and score
+        :rtype: pandas.DataFrame
+        """
+        results = self.propagate_batch({None: list(seeds)}, seed_type=seed_type, node_type=node_type,
+                                       restart_probability=restart_probability, limit=limit,
+                                       exclude_seeds=exclude_seeds, edge_types=edge_types)
+        return results.drop(columns='seed_set')
+
+    def propagate_batch(self, seed_sets, seed_type='chemical', node_type=None, restart_probability=0.3, limit=100,
+                        exclude_seeds=True, edge_types=None):
+        """Prioritizes nodes for many seed sets, propagated together in one sparse matrix iteration
+
+        .. seealso::
+
+            :meth:`pyctd.manager.propagation.Propagator.propagate`
+
+        :param dict seed_sets: names of seed sets as keys and seeds as values
+        :param str seed_type: type of seeds given as identifiers
+        :param str node_type: only rank 'chemical', 'gene', 'disease' or 'pathway'
+        :param float restart_probability: probability to jump back to the seeds in every step
+        :param int limit: maximum number of nodes per seed set (None: all nodes with a score)
+        :param bool exclude_seeds: if True the seeds are not ranked
+        :param iter[str] edge_types: only walk on edges of these tables (default: all edges of the graph)
+        :return: ranked nodes with :data:`pyctd.manager.propagation.RESULT_COLUMNS`
+        :rtype: pandas.DataFrame
+        """
+        return self.get_propagator(edge_types=edge_types).propagate(
+            seed_sets, seed_type=seed_type, node_type=node_type, restart_probability=restart_probability,
+            limit=limit, exclude_seeds=exclude_seeds)
+
+    def get_resolver(self, cache=True):
+        """returns the trigram index over the names and synonyms of chemicals, diseases and genes
+
+        The index is built once per data version and memory mapped from disk (in the pyctd data folder).
+
+        :param bool cache: if False the index is always built from the database
+        :rtype: pyctd.manager.resolver.EntityResolver
+        """
+        if not cache:
+            return EntityResolver.from_manager(self)
+
+        key = (self.connection, self.data_version)
+        with _cache_lock:
+            if key not in _resolvers:
+                _resolvers.clear()
+                _resolvers[key] = EntityResolver.from_cache(self)
+            return _resolvers[key]
+
+    def get_matrix(self, kind, weight='count', organism_id=None, direct_evidence=None, cache=True):
+        """returns associations as sparse matrix, e.g. chemical×disease weighted by inference score
+
+        Rows and columns are all entities of their type ordered by primary key, so all matrices of a data version
+        share their index maps. Matrices are cached in the pyctd data folder per data version, weight and filters.
+
+        .. code-block:: python
+
+            >>> query.get_matrix('chemical_disease', weight='inference_score')
+            >>> query.get_matrix('chemical_gene', organism_id=9606)
+            >>> query.get_matrix('gene_pathway', weight='binary')
+
+        :param str kind: 'chemical_disease', 'chemical_gene', 'gene_disease', 'gene_pathway' or 'disease_pathway'
+        :param str weight: 'count' (number of associations), 'binary', 'inference_score' (maximum) or
+            'direct_evidence' (1 for associations with direct evidence)
+        :param int organism_id: only interactions in an organism (NCBI Taxonomy identifier, 'chemical_gene')
+        :param str direct_evidence: only associations with a direct evidence, e.g. 'therapeutic' ('chemical_disease',
+            'gene_disease')
+        :param bool cache: if False the matrix is always built from the database
+        :rtype: pyctd.manager.matrices.AssociationMatrix
+        """
+        if not cache:
+            return AssociationMatrix.from_manager(self, kind, weight=weight, organism_id=organism_id,
+                                                  direct_evidence=direct_evidence)
+
+        return AssociationMatrix.from_cache(self, kind, weight=weight, organism_id=organism_id,
+                                            direct_evidence=direct_evidence)
+
+    def get_similarity_index(self, entity_type='chemical', profile='gene', cache=True):
+        """returns the MinHash/LSH index of the profiles of all chemicals, genes or diseases
+
+        The index is built once per data version (during the import with ``pyctd update -s``) and kept in memory
+        and on disk (in the pyctd data folder).
+
+        :param str entity_type: 'chemical', 'gene', 'disease' or 'pathway'
+        :param str profile: type of the associated entities compared, e.g. 'gene' or 'disease' for chemicals
+        :param bool cache: if False the index is always built from the database
+        :rtype: pyctd.manager.similarity.SimilarityIndex
+        """
+        if not cache:
+            return SimilarityIndex.from_manager(self, entity_type=entity_type, profile=profile)
+
+        key = (self.connection, self.data_version, entity_type, profile)
+        with _cache_lock:
+            if key not in _similarity_indices:
+                if any(cached_key[:2] != key[:2] for cached_key in _similarity_indices):
+                    _similarity_indices.clear()
+                _similarity_indices[key] = SimilarityIndex.from_cache(self, entity_type=entity_type,
+                                                                      profile=profile)
+            return _similarity_indices[key]
+
+    def similar_chemicals(self, chemical_id, k=10, profile='gene', min_similarity=0.0):
+        """Finds chemicals with similar gene interaction or disease association profiles
+
+        Candidates are found with MinHash/LSH and ranked by the exact Jaccard similarity of the profiles.
+
+        .. code-block:: python
+
+            >>> query.similar_chemicals('D000082', k=5, profile='disease')
+
+        :param str chemical_id: MeSH identifier of the chemical
+        :param int k: maximum number of chemicals
+        :param str profile: 'gene' (interacting genes) or 'disease' (associated diseases)
+        :param float min_similarity: minimum Jaccard similarity between 0 and 1
+        :return: chemicals ordered by similarity
+        :rtype: list[pyctd.manager.similarity.SimilarEntity]
+        """
+        return self.get_similarity_index('chemical', profile=profile).similar(
+            chemical_id, k=k, min_similarity=min_similarity)
+
+    def resolve(self, name, entity_types=None, limit=10, min_score=0.3):
+        """Finds chemicals, diseases and genes by an approximate name (tolerates typos and word order)
+
+        .. code-block:: python
+
+            >>> query.resolve('asprin', entity_types=['chemical'], limit=3)
+
+        :param str name: (approximate) name or synonym
+        :param iter[str] entity_types: only return 'chemical', 'disease' and/or 'gene'
+        :param int limit: maximum number of candidates
+        :param float min_score: minimum similarity between 0 and 1
+        :return: candidates ordered by similarity
+        :rtype: list[pyctd.manager.resolver.Candidate]
+        """
+        return self.get_resolver().resolve(name, entity_types=entity_types, limit=limit, min_score=min_score)
+
+    def resolve_batch(self, names, entity_types=None, limit=1, min_score=0.3):
+        """Finds chemicals, diseases and genes for many approximate names, e.g. a column of a spreadsheet
+
+        .. seealso::
+
+            :meth:`pyctd.manager.resolver.EntityResolver.resolve_batch`
+
+        :param iter[str] names: (approximate) names or synonyms
+        :param iter[str] entity_types: only return 'chemical', 'disease' and/or 'gene'
+        :param int limit: maximum number of candidates per name
+        :param float min_score: minimum similarity between 0 and 1
+        :rtype: pandas.DataFrame
+        """
+        return self.get_resolver().resolve_batch(names, entity_types=entity_types, limit=limit, min_score=min_score)
+
+    def _get_incidence_matrix(self, against):
+        """returns the cached gene set incidence matrix of the current data version"""
+        if against != 'pathway':
+            raise ValueError("enrichment against {} not available; CTD provides gene annotations only for "
+                             "'pathway' (GO terms are only enriched per chemical in ChemGoEnriched)".format(against))
+
+        key = (self.connection, self.data_version)
+        with _cache_lock:
+            if key not in _incidence_matrices:
+                _incidence_matrices.clear()
+                _incidence_matrices[key] = IncidenceMatrix.from_cache(self)
+            return _incidence_matrices[key]
+
+    def enrich(self, gene_ids, against='pathway', correction='bonferroni', max_p_value=None):
+        """Tests a gene set for over-representation in pathways (hypergeometric test)
+
+        :param iter[int] gene_ids: NCBI Gene identifiers
+        :param str against: gene set collection, only 'pathway' is available
+        :param str correction: 'bonferroni' (as in CTD) or 'fdr_bh' (Benjamini–Hochberg)
+        :param float max_p_value: only return results with a corrected p-value less or equal
+        :return: enriched pathways ordered by p-value
+        :rtype: pandas.DataFrame
+        """
+        results = self.enrich_batch({0: gene_ids}, against=against, correction=correction, max_p_value=max_p_value)
+        return results.drop(columns='gene_set')
+
+    def enrich_batch(self, gene_sets, against='pathway', correction='bonferroni', max_p_value=None):
+        """Tests many gene sets at once for over-representation in pathways (hypergeometric test)
+
+        .. seealso::
+
+            :meth:`pyctd.manager.enrichment.IncidenceMatrix.enrich`
+
+        :param gene_sets: names of gene sets as keys and NCBI Gene identifiers as values or list of gene sets
+        :type gene_sets: dict or list
+        :param str against: gene set collection, only 'pathway' is available
+        :param str correction: 'bonferroni' (as in CTD) or 'fdr_bh' (Benjamini–Hochberg)
+        :param float max_p_value: only return results with a corrected p-value less or equal
+        :return: enriched pathways ordered by gene set (name or position in list) and p-value
+        :rtype: pandas.DataFrame
+        """
+        if not isinstance(gene_sets, dict):
+            gene_sets = dict(enumerate(gene_sets))
+
+        incidence_matrix = self._get_incidence_matrix(against)
+        return incidence_matrix.enrich(gene_sets, correction=correction, max_p_value=max_p_value)
+
     @staticmethod
     def _join_gene(query, gene_name, gene_symbol, gene_id):
         """helper function to add a query join to Gene model
@@ -48,7 +648,7 @@ class QueryManager(BaseDbManager):
                 query = query.filter(models.Gene.gene_name.like(gene_name))
 
             if gene_id:
-                query = query.filter(models.Gene.gene_id.like(gene_id))
+                query = query.filter(models.Gene.gene_id == gene_id)
 
         return query
 
@@ -104,6 +704,36 @@ class QueryManager(BaseDbManager):
 
         return query
 
+    @staticmethod
+    def _filter_child(query, model, child_model, criterion):
+        """helper function to restrict a query to rows with a matching row in a one-to-many child table (e.g.
+        synonyms); filtered as semi join, so every row is returned once (a join would repeat it per matching child)
+
+        :param sqlalchemy.orm.query.Query query: SQL Alchemy query
+        :param model: queried model
+        :param child_model: child model with a foreign key to the model, e.g. :class:`models.ChemicalSynonym`
+        :param criterion: condition on the child model
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        foreign_key = getattr(child_model, model.table_suffix + '__id')
+        return query.filter(model.id.in_(select(foreign_key).where(criterion)))
+
+    @staticmethod
+    def _filter_disease_branch(query, model, disease_branch):
+        """helper function to restrict a query to associations with diseases in a branch of the disease hierarchy
+
+        :param sqlalchemy.orm.query.Query query: SQL Alchemy query
+        :param model: association model with a disease__id column
+        :param str disease_branch: tree number of the branch, e.g. 'C04' for neoplasms
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        if disease_branch:
+            diseases = select(models.DiseaseTreenumber.disease__id).where(
+                hierarchy.is_descendant(models.DiseaseTreenumber.tree_number, disease_branch, include_self=True))
+            query = query.filter(model.disease__id.in_(diseases))
+
+        return query
+
     @staticmethod
     def _join_pathway(query, pathway_id, pathway_name):
         """helper function to add a query join to Pathway model
@@ -123,11 +753,13 @@ class QueryManager(BaseDbManager):
 
     def get_disease(self, disease_name=None, disease_id=None, definition=None, parent_ids=None, tree_numbers=None,
                     parent_tree_numbers=None, slim_mapping=None, synonym=None, alt_disease_id=None, limit=None,
-                    as_df=False):
+                    as_df=False, load=None, result_type=None):
         """
         Get diseases
 
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'synonyms' or 'slim_mappings'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param int limit: maximum number of results
         :param str disease_name: disease name
         :param str disease_id: disease identifier
@@ -149,7 +781,7 @@ class QueryManager(BaseDbManager):
         .. todo::
             normalize parent_ids, tree_numbers and parent_tree_numbers in :class:`pyctd.manager.models.Disease`
         """
-        q = self.session.query(models.Disease)
+        q = self._query(models.Disease)
 
         if disease_name:
             q = q.filter(models.Disease.disease_name.like(disease_name))
@@ -170,21 +802,143 @@ class QueryManager(BaseDbManager):
             q = q.filter(models.Disease.parent_tree_numbers.like(parent_tree_numbers))
 
         if slim_mapping:
-            q = q.join(models.DiseaseSlimmapping).filter(models.DiseaseSlimmapping.slim_mapping.like(slim_mapping))
+            q = self._filter_child(q, models.Disease, models.DiseaseSlimmapping,
+                                   models.DiseaseSlimmapping.slim_mapping.like(slim_mapping))
 
         if synonym:
-            q = q.join(models.DiseaseSynonym).filter(models.DiseaseSynonym.synonym.like(synonym))
+            q = self._filter_child(q, models.Disease, models.DiseaseSynonym,
+                                   models.DiseaseSynonym.synonym.like(synonym))
 
         if alt_disease_id:
-            q = q.join(models.DiseaseAltdiseaseid).filter(models.DiseaseAltdiseaseid.alt_disease_id == alt_disease_id)
+            q = self._filter_child(q, models.Disease, models.DiseaseAltdiseaseid,
+                                   models.DiseaseAltdiseaseid.alt_disease_id == alt_disease_id)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
+
+    def _get_descendants(self, model, tree_model, identifier_column, identifier, tree_number, include_self):
+        """returns a query of all chemicals or diseases below a chemical or disease or a tree number"""
+        if not (identifier or tree_number):
+            raise ValueError('{} or tree_number is required'.format(identifier_column))
+
+        foreign_key = model.table_suffix + '__id'
+        root, node = aliased(tree_model), aliased(tree_model)
+
+        q = self._query(model).join(node, getattr(node, foreign_key) == model.id) \
+            .join(root, hierarchy.is_descendant(node.tree_number, root.tree_number, include_self=include_self))
+
+        if tree_number:
+            q = q.filter(root.tree_number == tree_number)
+
+        if identifier:
+            root_entity = aliased(model)
+            q = q.join(root_entity, getattr(root, foreign_key) == root_entity.id) \
+                .filter(getattr(root_entity, identifier_column) == identifier)
+
+        return q.distinct()
+
+    def _get_ancestors(self, model, tree_model, identifier_column, identifier, tree_number, include_self):
+        """returns a query of all chemicals or diseases above a chemical or disease or a tree number"""
+        if not (identifier or tree_number):
+            raise ValueError('{} or tree_number is required'.format(identifier_column))
+
+        if tree_number:
+            tree_numbers = [tree_number]
+        else:
+            tree_numbers = [
+                x for x, in self.session.query(tree_model.tree_number).join(model).filter(
+                    getattr(model, identifier_column) == identifier)
+            ]
+
+        ancestors = {ancestor for x in tree_numbers for ancestor in hierarchy.get_ancestor_tree_numbers(x)}
+        if include_self:
+            ancestors.update(tree_numbers)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._query(model).join(tree_model).filter(tree_model.tree_number.in_(sorted(ancestors))).distinct()
+
+    def get_disease_descendants(self, disease_id=None, tree_number=None, include_self=False, limit=None,
+                                as_df=False, load=None, result_type=None):
+        """Get all diseases below a disease (or a tree number) in the MeSH/MEDIC hierarchy
+
+        :param str disease_id: disease identifier
+        :param str tree_number: tree number, e.g. 'C04' for neoplasms
+        :param bool include_self: if True the disease itself is included
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'synonyms'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :return: list of :class:`pyctd.manager.models.Disease` objects
+
+        .. seealso::
+
+            :mod:`pyctd.manager.hierarchy`
+        """
+        q = self._get_descendants(models.Disease, models.DiseaseTreenumber, 'disease_id', disease_id, tree_number,
+                                  include_self)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
+
+    def get_disease_ancestors(self, disease_id=None, tree_number=None, include_self=False, limit=None,
+                              as_df=False, load=None, result_type=None):
+        """Get all diseases above a disease (or a tree number) in the MeSH/MEDIC hierarchy
+
+        :param str disease_id: disease identifier
+        :param str tree_number: tree number
+        :param bool include_self: if True the disease itself is included
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'synonyms'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :return: list of :class:`pyctd.manager.models.Disease` objects
+        """
+        q = self._get_ancestors(models.Disease, models.DiseaseTreenumber, 'disease_id', disease_id, tree_number,
+                                include_self)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
+
+    def get_chemical_descendants(self, chemical_id=None, tree_number=None, include_self=False, limit=None,
+                                 as_df=False, load=None, result_type=None):
+        """Get all chemicals below a chemical (or a tree number) in the MeSH hierarchy
+
+        :param str chemical_id: chemical identifier
+        :param str tree_number: tree number, e.g. 'D02.455' for hydrocarbons
+        :param bool include_self: if True the chemical itself is included
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'synonyms' or 'tree_numbers'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :return: list of :class:`pyctd.manager.models.Chemical` objects
+        """
+        q = self._get_descendants(models.Chemical, models.ChemicalTreenumber, 'chemical_id', chemical_id,
+                                  tree_number, include_self)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
+
+    def get_chemical_ancestors(self, chemical_id=None, tree_number=None, include_self=False, limit=None,
+                               as_df=False, load=None, result_type=None):
+        """Get all chemicals above a chemical (or a tree number) in the MeSH hierarchy
+
+        :param str chemical_id: chemical identifier
+        :param str tree_number: tree number
+        :param bool include_self: if True the chemical itself is included
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'synonyms' or 'tree_numbers'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :return: list of :class:`pyctd.manager.models.Chemical` objects
+        """
+        q = self._get_ancestors(models.Chemical, models.ChemicalTreenumber, 'chemical_id', chemical_id, tree_number,
+                                include_self)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     def get_gene(self, gene_name=None, gene_symbol=None, gene_id=None, synonym=None, uniprot_id=None,
-                 pharmgkb_id=None, biogrid_id=None, alt_gene_id=None, limit=None, as_df=False):
+                 pharmgkb_id=None, biogrid_id=None, alt_gene_id=None, limit=None, as_df=False, load=None,
+                 result_type=None):
         """Get genes
 
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'synonyms' or 'uniprot_ids'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param alt_gene_id: 
         :param str gene_name: gene name
         :param str gene_symbol: HGNC gene symbol
@@ -196,7 +950,7 @@ class QueryManager(BaseDbManager):
         :param int limit: maximum of results 
         :rtype: list[models.Gene]
         """
-        q = self.session.query(models.Gene)
+        q = self._query(models.Gene)
 
         if gene_symbol:
             q = q.filter(models.Gene.gene_symbol.like(gene_symbol))
@@ -205,32 +959,35 @@ class QueryManager(BaseDbManager):
             q = q.filter(models.Gene.gene_name.like(gene_name))
 
         if gene_id:
-            q = q.filter(models.Gene.gene_id.like(gene_id))
+            q = q.filter(models.Gene.gene_id == gene_id)
 
         if synonym:
-            q = q.join(models.GeneSynonym).filter(models.GeneSynonym.synonym == synonym)
+            q = self._filter_child(q, models.Gene, models.GeneSynonym, models.GeneSynonym.synonym == synonym)
 
         if uniprot_id:
-            q = q.join(models.GeneUniprot).filter(models.GeneUniprot.uniprot_id == uniprot_id)
+            q = self._filter_child(q, models.Gene, models.GeneUniprot, models.GeneUniprot.uniprot_id == uniprot_id)
 
         if pharmgkb_id:
-            q = q.join(models.GenePharmgkb).filter(models.GenePharmgkb.pharmgkb_id == pharmgkb_id)
+            q = self._filter_child(q, models.Gene, models.GenePharmgkb, models.GenePharmgkb.pharmgkb_id == pharmgkb_id)
 
         if biogrid_id:
-            q = q.join(models.GeneBiogrid).filter(models.GeneBiogrid.biogrid_id == biogrid_id)
+            q = self._filter_child(q, models.Gene, models.GeneBiogrid, models.GeneBiogrid.biogrid_id == biogrid_id)
 
         if alt_gene_id:
-            q = q.join(models.GeneAltGeneId.alt_gene_id == alt_gene_id)
+            q = self._filter_child(q, models.Gene, models.GeneAltGeneId,
+                                   models.GeneAltGeneId.alt_gene_id == alt_gene_id)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
-    def get_pathway(self, pathway_name=None, pathway_id=None, limit=None, as_df=False):
+    def get_pathway(self, pathway_name=None, pathway_id=None, limit=None, as_df=False, load=None, result_type=None):
         """Get pathway
 
         .. note::
             Format of pathway_id is KEGG:X* or REACTOME:X* . X* stands for a sequence of digits
 
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results (pathways have none)
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param str pathway_name: pathway name
         :param str pathway_id: KEGG or REACTOME identifier
         :param int limit: maximum number of results
@@ -240,7 +997,7 @@ class QueryManager(BaseDbManager):
 
             :class:`pyctd.manager.models.Pathway`
         """
-        q = self.session.query(models.Pathway)
+        q = self._query(models.Pathway)
 
         if pathway_name:
             q = q.filter(models.Pathway.pathway_name.like(pathway_name))
@@ -248,13 +1005,16 @@ class QueryManager(BaseDbManager):
         if pathway_id:
             q = q.filter(models.Pathway.pathway_id.like(pathway_id))
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     def get_chemical(self, chemical_name=None, chemical_id=None, cas_rn=None, drugbank_id=None, parent_id=None,
-                     parent_tree_number=None, tree_number=None, synonym=None, limit=None, as_df=False):
+                     parent_tree_number=None, tree_number=None, synonym=None, limit=None, as_df=False, load=None,
+                     result_type=None):
         """Get chemical
 
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'synonyms' or 'drugbank_ids'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param str chemical_name: chemical name
         :param str chemical_id: cehmical identifier 
         :param str cas_rn: CAS registry number
@@ -271,7 +1031,7 @@ class QueryManager(BaseDbManager):
 
             :class:`pyctd.manager.models.Chemical`
         """
-        q = self.session.query(models.Chemical)
+        q = self._query(models.Chemical)
 
         if chemical_name:
             q = q.filter(models.Chemical.chemical_name.like(chemical_name))
@@ -283,28 +1043,32 @@ class QueryManager(BaseDbManager):
             q = q.filter(models.Chemical.cas_rn == cas_rn)
 
         if drugbank_id:
-            q = q.join(models.ChemicalDrugbank).filter(models.ChemicalDrugbank.drugbank_id == drugbank_id)
+            q = self._filter_child(q, models.Chemical, models.ChemicalDrugbank,
+                                   models.ChemicalDrugbank.drugbank_id == drugbank_id)
 
         if parent_id:
-            q = q.join(models.ChemicalParentid).filter(models.ChemicalParentid.parent_id == parent_id)
+            q = self._filter_child(q, models.Chemical, models.ChemicalParentid,
+                                   models.ChemicalParentid.parent_id == parent_id)
 
         if tree_number:
-            q = q.join(models.ChemicalTreenumber) \
-                .filter(models.ChemicalTreenumber.tree_number == tree_number)
+            q = self._filter_child(q, models.Chemical, models.ChemicalTreenumber,
+                                   models.ChemicalTreenumber.tree_number == tree_number)
 
         if parent_tree_number:
-            q = q.join(models.ChemicalParenttreenumber) \
-                .filter(models.ChemicalParenttreenumber.parent_tree_number == parent_tree_number)
+            q = self._filter_child(q, models.Chemical, models.ChemicalParenttreenumber,
+                                   models.ChemicalParenttreenumber.parent_tree_number == parent_tree_number)
 
         if synonym:
-            q = q.join(models.ChemicalSynonym).filter(models.ChemicalSynonym.synonym.like(synonym))
+            q = self._filter_child(q, models.Chemical, models.ChemicalSynonym,
+                                   models.ChemicalSynonym.synonym.like(synonym))
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     def get_chem_gene_interaction_actions(self, gene_name=None, gene_symbol=None, gene_id=None, limit=None,
                                           cas_rn=None, chemical_id=None, chemical_name=None, organism_id=None,
                                           interaction_sentence=None, chemical_definition=None,
-                                          gene_form=None, interaction_action=None, as_df=False):
+                                          gene_form=None, interaction_action=None, interaction=None, action=None,
+                                          as_df=False, load=None, result_type=None):
         """Get all interactions for chemicals on a gene or biological entity (linked to this gene).
 
         Chemicals can interact on different types of biological entities linked to a gene. A list of allowed
@@ -315,6 +1079,8 @@ class QueryManager(BaseDbManager):
         interaction_actions can be retrieved via the attribute :attr:`~.interaction_actions`.
 
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'pubmed_ids' or 'chemical.synonyms'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param str interaction_sentence: sentence describing the interactions 
         :param int organism_id: NCBI TaxTree identifier. Example: 9606 for Human.
         :param str chemical_name: chemical name
@@ -326,6 +1092,8 @@ class QueryManager(BaseDbManager):
         :param int gene_id: NCBI Entrez Gene identifier
         :param str gene_form: gene form
         :param str interaction_action: combination of interaction and actions
+        :param str interaction: degree of interaction ('affects', 'decreases' or 'increases')
+        :param str action: type name (e.g. 'expression') or code (e.g. 'exp') of an action, see :attr:`~.actions`
         :param int limit: maximum number of results
         :rtype: list[models.ChemGeneIxn]
 
@@ -344,7 +1112,7 @@ class QueryManager(BaseDbManager):
             :func:`pyctd.manager.database.Query.gene_forms`
 
         """
-        q = self.session.query(models.ChemGeneIxn)
+        q = self._query(models.ChemGeneIxn)
 
         if organism_id:
             q = q.filter(models.ChemGeneIxn.organism_id == organism_id)
@@ -353,18 +1121,48 @@ class QueryManager(BaseDbManager):
             q = q.filter(models.ChemGeneIxn.interaction == interaction_sentence)
 
         if gene_form:
-            q = q.join(models.ChemGeneIxnGeneForm).filter(models.ChemGeneIxnGeneForm.gene_form == gene_form)
+            q = self._filter_child(q, models.ChemGeneIxn, models.ChemGeneIxnGeneForm,
+                                   models.ChemGeneIxnGeneForm.gene_form == gene_form)
 
         if interaction_action:
-            q = q.join(models.ChemGeneIxnInteractionAction) \
-                .filter(models.ChemGeneIxnInteractionAction.interaction_action.like(interaction_action))
+            interaction_action_types = select(models.InteractionActionType.id).where(
+                models.InteractionActionType.interaction_action.like(interaction_action))
+            q = self._filter_child(q, models.ChemGeneIxn, models.ChemGeneIxnInteractionAction,
+                                   models.ChemGeneIxnInteractionAction.interaction_action_type__id.in_(
+                                       interaction_action_types))
+
+        if interaction or action:
+            q = q.filter(models.ChemGeneIxn.id.in_(self._select_interaction_action_codes(interaction, action)))
 
         q = self._join_gene(query=q, gene_name=gene_name, gene_symbol=gene_symbol, gene_id=gene_id)
 
         q = self._join_chemical(query=q, cas_rn=cas_rn, chemical_id=chemical_id, chemical_name=chemical_name,
                                 chemical_definition=chemical_definition)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
+
+    def _select_interaction_action_codes(self, interaction, action):
+        """returns a select of interactions with a degree of interaction and/or an action (codes in
+        :class:`pyctd.manager.models.InteractionActionType`)"""
+        model = models.InteractionActionType
+        statement = select(model.id)
+
+        if interaction:
+            if interaction not in model_types.action.interaction:
+                raise ValueError('interaction {} not in {}'.format(interaction, model_types.action.interaction))
+            statement = statement.where(model.interaction == interaction)
+
+        if action:
+            action_ids = self._get_cached('action_id', lambda: dict(
+                [(x.type_name, x.id) for x in self.session.query(models.Action)] +
+                [(x.code, x.id) for x in self.session.query(models.Action)]
+            ))
+            if action not in action_ids:
+                raise ValueError('action {} not in {}'.format(action, self.actions))
+            statement = statement.where(model.action__id == action_ids[action])
+
+        child_model = models.ChemGeneIxnInteractionAction
+        return select(child_model.chem_gene_ixn__id).where(child_model.interaction_action_type__id.in_(statement))
 
     @property
     def gene_forms(self):
@@ -372,8 +1170,7 @@ class QueryManager(BaseDbManager):
         :return: List of strings for all available gene forms
         :rtype: list[str]
         """
-        q = self.session.query(distinct(models.ChemGeneIxnGeneForm.gene_form))
-        return [x[0] for x in q.all()]
+        return list(self.vocabulary('gene_form'))
 
     @property
     def interaction_actions(self):
@@ -381,8 +1178,7 @@ class QueryManager(BaseDbManager):
         :return: List of strings for allowed interaction/actions combinations
         :rtype: list[str]
         """
-        r = self.session.query(distinct(models.ChemGeneIxnInteractionAction.interaction_action)).all()
-        return [x[0] for x in r]
+        return list(self.vocabulary('interaction_action'))
 
     @property
     def actions(self):
@@ -390,8 +1186,141 @@ class QueryManager(BaseDbManager):
 
         :rtype: list[str]
         """
-        r = self.session.query(models.Action).all()
-        return [x.type_name for x in r]
+        return self._get_cached('action', lambda: [x.type_name for x in self.session.query(models.Action)])
+
+    @property
+    def top_k(self):
+        """number of ranked associations per disease or chemical in the top-k tables (None if not built), cached
+        per data version
+
+        .. seealso::
+
+            :meth:`pyctd.manager.database.DbManager.build_top_k`
+
+        :rtype: int
+        """
+        if self.session is None:
+            return None
+
+        return self._get_cached('top_k', self._load_top_k)
+
+    def _load_top_k(self):
+        top_k = self.get_meta('top_k')
+        return int(top_k) if top_k else None
+
+    def _use_top_k(self, limit):
+        """returns True if a ranked query with this limit can be answered from the top-k tables"""
+        if not limit:
+            return False
+
+        top_k = self.top_k
+        return top_k is not None and limit <= top_k
+
+    @property
+    def id_lists(self):
+        """storage of the PubMed and OMIM identifiers of associations: 'rows' (one row per identifier) or 'packed'
+        (compact storage mode, see :mod:`pyctd.manager.packed`)
+
+        :rtype: str
+        """
+        return self._get_cached('id_lists', lambda: self.get_meta('id_lists', 'rows'))
+
+    @property
+    def has_id_index(self):
+        """True if the inverted index of the PubMed and OMIM identifiers (:class:`pyctd.manager.models.PackedIdIndex`)
+        is built (see :meth:`pyctd.manager.database.DbManager.build_packed_id_index`)
+
+        :rtype: bool
+        """
+        return self._get_cached('id_index', lambda: self.get_meta('id_index') is not None or self.id_lists == 'packed')
+
+    def get_parent_ids(self, child_table_name, ids, batch_size=500):
+        """returns the primary keys of the associations which reference identifiers, e.g. the chemical–gene
+        interactions of PubMed identifiers
+
+        Uses the inverted index :class:`pyctd.manager.models.PackedIdIndex` if it is built, otherwise the child table.
+
+        .. code-block:: python
+
+            >>> query.get_parent_ids('chem_gene_ixn__pubmed_id', [22659286, 16120699])
+
+        :param str child_table_name: child table without prefix in :data:`pyctd.manager.models.PACKED_ID_LISTS`
+        :param iter[int] ids: identifiers, e.g. PubMed identifiers
+        :param int batch_size: number of identifiers queried at once
+        :return: identifiers with associations as keys and sorted primary keys of the associations as values
+        :rtype: dict[int,list[int]]
+        """
+        if child_table_name not in models.PACKED_ID_LISTS:
+            raise ValueError('child table {} not in {}'.format(child_table_name, models.PACKED_ID_LISTS))
+
+        ids = sorted({int(identifier) for identifier in ids})
+        parent_ids = {}
+
+        if self.has_id_index:
+            model = models.PackedIdIndex
+            code = models.PACKED_ID_LISTS.index(child_table_name)
+
+            for start in range(0, len(ids), batch_size):
+                statement = select(model.value, model.parent_ids).where(
+                    model.child == code, model.value.in_(ids[start:start + batch_size]))
+                for value, packed in self.session.execute(statement):
+                    parent_ids[value] = unpack(packed)
+        else:
+            table = models.Base.metadata.tables[TABLE_PREFIX + child_table_name]
+            parent_table_name, _, column_name = child_table_name.rpartition('__')
+            value_column, foreign_key = table.c[column_name], table.c[parent_table_name + '__id']
+
+            for start in range(0, len(ids), batch_size):
+                statement = select(value_column, foreign_key).where(
+                    value_column.in_(ids[start:start + batch_size])).order_by(value_column, foreign_key)
+                for value, parent_id in self.session.execute(statement):
+                    parent_ids.setdefault(value, []).append(parent_id)
+
+        return parent_ids
+
+    def get_by_pubmed(self, pmids, batch_size=500, load=None):
+        """returns all chemical–gene interactions, chemical–disease and gene–disease associations of PubMed
+        identifiers
+
+        The associations are found with the inverted index of the PubMed identifiers (see :meth:`get_parent_ids`) and
+        fetched in batches, so thousands of PubMed identifiers need only a few queries per table.
+
+        .. code-block:: python
+
+            >>> results = query.get_by_pubmed([22659286, 16120699])
+            >>> results[22659286]['chemical__disease']
+            [<ChemicalDisease ...>, ...]
+
+        :param iter[int] pmids: PubMed identifiers
+        :param int batch_size: number of identifiers or associations queried at once
+        :param load: relationship name(s) of all three models to load eagerly with the associations (e.g.
+            'pubmed_ids') or a dict of them by table, e.g. ``{'chemical__disease': ['chemical', 'disease']}``,
+            see :func:`pyctd.manager.loading.get_load_options`
+        :return: every PubMed identifier with the associations of 'chem_gene_ixn', 'chemical__disease' and
+            'gene__disease' (sorted by primary key, empty lists if there are none)
+        :rtype: dict[int,dict[str,list]]
+        """
+        pmids = sorted({int(pmid) for pmid in pmids})
+        results = {pmid: OrderedDict() for pmid in pmids}
+
+        for child_table_name, model in _pubmed_id_tables:
+            parent_table_name = child_table_name.rpartition('__')[0]
+            parent_ids = self.get_parent_ids(child_table_name, pmids, batch_size=batch_size)
+            table_load = load.get(parent_table_name) if isinstance(load, dict) else load
+
+            unique_parent_ids = sorted({parent_id for ids in parent_ids.values() for parent_id in ids})
+            parents = {}
+
+            for start in range(0, len(unique_parent_ids), batch_size):
+                query = self.session.query(model).filter(model.id.in_(unique_parent_ids[start:start + batch_size]))
+                if table_load:
+                    query = query.options(*get_load_options(model, table_load))
+                parents.update((parent.id, parent) for parent in query)
+
+            for pmid in pmids:
+                results[pmid][parent_table_name] = [parents[parent_id] for parent_id in parent_ids.get(pmid, ())]
+
+        return results
 
     @property
     def pathways(self):
@@ -399,14 +1328,27 @@ class QueryManager(BaseDbManager):
 
         :rtype: list[models.Pathway]
         """
-        return self.session.query(models.Pathway).all()
+        pathways = self._get_cached('pathway', self._load_detached_pathways)
+        return [self.session.merge(pathway, load=False) for pathway in pathways]
+
+    def _load_detached_pathways(self):
+        """returns all pathways as detached instances which can be merged into any session without a query"""
+        pathways = []
+        for row in self.session.query(*models.Pathway.__table__.columns).order_by(models.Pathway.id):
+            pathway = models.Pathway(**row._mapping)
+            make_transient_to_detached(pathway)
+            pathways.append(pathway)
+        return pathways
 
     def get_gene_disease(self, direct_evidence=None, inference_chemical_name=None, inference_score=None,
                          gene_name=None, gene_symbol=None, gene_id=None, disease_name=None, disease_id=None,
-                         disease_definition=None, limit=None, as_df=False):
+                         disease_definition=None, disease_branch=None, limit=None, as_df=False, load=None,
+                         result_type=None):
         """Get gene–disease associations
 
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'gene' or 'disease.synonyms'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param int gene_id: gene identifier
         :param str gene_symbol: gene symbol
         :param str gene_name:  gene name
@@ -417,6 +1359,7 @@ class QueryManager(BaseDbManager):
         :param disease_name: disease name
         :param disease_id: disease identifier 
         :param disease_definition: disease definition 
+        :param str disease_branch: tree number of a disease branch, e.g. 'C04' for all neoplasms
         :param int limit: maximum number of results
         :return: list of :class:`pyctd.manager.database.models.GeneDisease` objects
 
@@ -428,7 +1371,7 @@ class QueryManager(BaseDbManager):
             :class:`pyctd.manager.models.Chemical`
             :class:`pyctd.manager.models.Gene`
         """
-        q = self.session.query(models.GeneDisease)
+        q = self._query(models.GeneDisease)
 
         if direct_evidence:
             q = q.filter(models.GeneDisease.direct_evidence == direct_evidence)
@@ -444,23 +1387,25 @@ class QueryManager(BaseDbManager):
 
         q = self._join_gene(q, gene_name=gene_name, gene_symbol=gene_symbol, gene_id=gene_id)
 
-        return self._limit_and_df(q, limit, as_df)
+        q = self._filter_disease_branch(q, models.GeneDisease, disease_branch)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     @property
     def direct_evidences(self):
         """
         :return: All available direct evidences for gene disease correlations
-        :rtype: list
+        :rtype: list[str]
         """
-        q = self.session.query(distinct(models.GeneDisease.direct_evidence))
-
-        return q.all()
+        return list(self.vocabulary('direct_evidence'))
 
     def get_disease_pathways(self, disease_id=None, disease_name=None, pathway_id=None, pathway_name=None,
-                             disease_definition=None, limit=None, as_df=False):
+                             disease_definition=None, limit=None, as_df=False, load=None, result_type=None):
         """Get disease pathway link
         
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'pathway' or 'disease.synonyms'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param disease_id: 
         :param disease_name: 
         :param pathway_id: 
@@ -477,19 +1422,20 @@ class QueryManager(BaseDbManager):
             :class:`pyctd.manager.models.Disease`
             :class:`pyctd.manager.models.Pathway`
         """
-        q = self.session.query(models.DiseasePathway)
+        q = self._query(models.DiseasePathway)
 
         q = self._join_disease(query=q, disease_id=disease_id, disease_name=disease_name,
                                disease_definition=disease_definition)
 
         q = self._join_pathway(query=q, pathway_id=pathway_id, pathway_name=pathway_name)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     def get_chemical_diseases(self, direct_evidence=None, inference_gene_symbol=None, inference_score=None,
                               inference_score_operator=None, cas_rn=None, chemical_name=None,
                               chemical_id=None, chemical_definition=None, disease_definition=None,
-                              disease_id=None, disease_name=None, limit=None, as_df=False):
+                              disease_id=None, disease_name=None, disease_branch=None, limit=None, as_df=False,
+                              load=None, result_type=None):
         """Get chemical–disease associations with inference gene
         
         :param direct_evidence: direct evidence
@@ -503,8 +1449,11 @@ class QueryManager(BaseDbManager):
         :param disease_definition:
         :param disease_id:
         :param disease_name: disease name
+        :param str disease_branch: tree number of a disease branch, e.g. 'C04' for all neoplasms
         :param int limit: maximum number of results
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'chemical' or 'pubmed_ids'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :return: list of :class:`pyctd.manager.database.models.ChemicalDisease` objects
 
         .. seealso::
@@ -515,7 +1464,7 @@ class QueryManager(BaseDbManager):
             :class:`pyctd.manager.models.Disease`
             :class:`pyctd.manager.models.Chemical`
         """
-        q = self.session.query(models.ChemicalDisease)
+        q = self._query(models.ChemicalDisease)
 
         if direct_evidence:
             q = q.filter(models.ChemicalDisease.direct_evidence.like(direct_evidence))
@@ -535,13 +1484,17 @@ class QueryManager(BaseDbManager):
         q = self._join_disease(q, disease_definition=disease_definition, disease_id=disease_id,
                                disease_name=disease_name)
 
-        return self._limit_and_df(q, limit, as_df)
+        q = self._filter_disease_branch(q, models.ChemicalDisease, disease_branch)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     def get_gene_pathways(self, gene_name=None, gene_symbol=None, gene_id=None, pathway_id=None,
-                          pathway_name=None, limit=None, as_df=False):
+                          pathway_name=None, limit=None, as_df=False, load=None, result_type=None):
         """Get gene pathway link
         
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'pathway' or 'gene.synonyms'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param str gene_name: gene name 
         :param str gene_symbol: gene symbol
         :param int gene_id: NCBI Gene identifier
@@ -558,105 +1511,313 @@ class QueryManager(BaseDbManager):
             :class:`pyctd.manager.models.Gene`
             :class:`pyctd.manager.models.Pathway`
         """
-        q = self.session.query(models.GenePathway)
+        q = self._query(models.GenePathway)
         q = self._join_gene(q, gene_name=gene_name, gene_symbol=gene_symbol, gene_id=gene_id)
         q = self._join_pathway(q, pathway_id=pathway_id, pathway_name=pathway_name)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
-    # TODO documentation of get_go_enriched__by__chemical_name
-    def get_go_enriched__by__chemical_name(self, chemical_name, limit=None, as_df=False):
-        """
+    def get_go_enriched__by__chemical_name(self, chemical_name, limit=None, as_df=False, load=None, result_type=None):
+        """Get enriched GO terms of a chemical ordered by highest GO level (descending) and corrected p-value
 
-        :param chemical_name:
-        :param limit:
-        :param as_df:
-        :return:
+        If the top-k tables are built (see :attr:`top_k`) and limit <= k, only the top-k GO terms are sorted.
+
+        :param str chemical_name: chemical name
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'chemical'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :rtype: list[models.ChemGoEnriched]
         """
-        q = self.session.query(models.ChemGoEnriched) \
-            .join(models.Chemical) \
-            .filter(models.Chemical.chemical_name == chemical_name) \
-            .order_by(models.ChemGoEnriched.highest_go_level.desc(), models.ChemGoEnriched.corrected_p_value)
+        if self._use_top_k(limit):
+            top = models.TopChemGoEnriched
+            q = self._query(models.ChemGoEnriched) \
+                .join(top, top.chem__go_enriched__id == models.ChemGoEnriched.id) \
+                .join(models.Chemical, models.Chemical.id == top.chemical__id) \
+                .filter(models.Chemical.chemical_name == chemical_name) \
+                .order_by(top.highest_go_level.desc(), top.corrected_p_value, top.chem__go_enriched__id)
+        else:
+            q = self._query(models.ChemGoEnriched) \
+                .join(models.Chemical) \
+                .filter(models.Chemical.chemical_name == chemical_name) \
+                .order_by(models.ChemGoEnriched.highest_go_level.desc(), models.ChemGoEnriched.corrected_p_value,
+                          models.ChemGoEnriched.id)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
-    # TODO documentation of get_pathway_enriched__by__chemical_name
-    def get_pathway_enriched__by__chemical_name(self, chemical_name, limit=None, as_df=False):
-        """
+    def get_pathway_enriched__by__chemical_name(self, chemical_name, limit=None, as_df=False, load=None,
+                                                result_type=None):
+        """Get enriched pathways of a chemical ordered by corrected p-value
 
-        :param chemical_name:
-        :param limit:
-        :param as_df:
-        :return:
+        If the top-k tables are built (see :attr:`top_k`) and limit <= k, only the top-k pathways are sorted.
+
+        :param str chemical_name: chemical name
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'pathway'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :rtype: list[models.ChemPathwayEnriched]
         """
-        q = self.session.query(models.ChemPathwayEnriched) \
-            .join(models.Chemical) \
-            .filter(models.Chemical.chemical_name == chemical_name) \
-            .order_by(models.ChemPathwayEnriched.corrected_p_value)
+        if self._use_top_k(limit):
+            top = models.TopChemPathwayEnriched
+            q = self._query(models.ChemPathwayEnriched) \
+                .join(top, top.chem__pathway_enriched__id == models.ChemPathwayEnriched.id) \
+                .join(models.Chemical, models.Chemical.id == top.chemical__id) \
+                .filter(models.Chemical.chemical_name == chemical_name) \
+                .order_by(top.corrected_p_value, top.chem__pathway_enriched__id)
+        else:
+            q = self._query(models.ChemPathwayEnriched) \
+                .join(models.Chemical) \
+                .filter(models.Chemical.chemical_name == chemical_name) \
+                .order_by(models.ChemPathwayEnriched.corrected_p_value, models.ChemPathwayEnriched.id)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
-    def get_therapeutic_chemical__by__disease_name(self, disease_name, limit=None, as_df=False):
+    def get_therapeutic_chemical__by__disease_name(self, disease_name, limit=None, as_df=False, load=None,
+                                                   result_type=None):
         """
         Get therapeutic chemical by disease name
         
         :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'chemical.synonyms'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
         :param int limit: maximum number of results
         :param str disease_name: disease name
         :return: therapeutic chemical
         :rtype: list[models.ChemicalDisease]
         """
-        q = self.session.query(models.ChemicalDisease) \
+        q = self._query(models.ChemicalDisease) \
             .join(models.Disease) \
             .filter(models.Disease.disease_name == disease_name,
                     models.ChemicalDisease.direct_evidence == 'therapeutic')
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     # TODO documentation of get_marker_chemical__by__disease_name
-    def get_marker_chemical__by__disease_name(self, disease_name, limit=None, as_df=False):
+    def get_marker_chemical__by__disease_name(self, disease_name, limit=None, as_df=False, load=None, result_type=None):
         """
 
         :param disease_name:
         :param limit:
         :param as_df:
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'chemical'
+        :param result_type:
         :return:
         """
-        q = self.session.query(models.ChemicalDisease) \
+        q = self._query(models.ChemicalDisease) \
             .join(models.Disease) \
             .filter(models.Disease.disease_name == disease_name,
                     models.ChemicalDisease.direct_evidence == 'marker/mechanism')
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
-    # TODO documentation of get_chemical__by__disease
-    def get_chemical__by__disease(self, disease_name, limit=None, as_df=False):
-        """
+    def get_chemical__by__disease(self, disease_name, limit=None, as_df=False, load=None, result_type=None):
+        """Get chemical–disease associations of a disease ordered by inference score (descending)
 
-        :param disease_name:
-        :param limit:
-        :param as_df:
-        :return:
+        If the top-k tables are built (see :attr:`top_k`) and limit <= k, only the top-k associations are sorted.
+
+        :param str disease_name: disease name
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'chemical'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :rtype: list[models.ChemicalDisease]
         """
-        q = self.session.query(models.ChemicalDisease) \
-            .join(models.Disease) \
-            .filter(models.Disease.disease_name == disease_name) \
-            .order_by(models.ChemicalDisease.inference_score.desc())
+        if self._use_top_k(limit):
+            top = models.TopChemicalDisease
+            q = self._query(models.ChemicalDisease) \
+                .join(top, top.chemical__disease__id == models.ChemicalDisease.id) \
+                .join(models.Disease, models.Disease.id == top.disease__id) \
+                .filter(models.Disease.disease_name == disease_name) \
+                .order_by(top.inference_score.desc(), top.chemical__disease__id)
+        else:
+            q = self._query(models.ChemicalDisease) \
+                .join(models.Disease) \
+                .filter(models.Disease.disease_name == disease_name) \
+                .order_by(models.ChemicalDisease.inference_score.desc(), models.ChemicalDisease.id)
 
-        return self._limit_and_df(q, limit, as_df)
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
 
     # TODO documentation of get_action
-    def get_action(self, limit=None, as_df=False):
+    def get_action(self, limit=None, as_df=False, load=None, result_type=None):
         """
 
         :param limit:
         :param as_df:
+        :param load: relationship name(s) to load eagerly with the results (actions have none)
+        :param result_type:
         :return:
         """
-        q = self.session.query(models.Action)
+        q = self._query(models.Action)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
+
+    def get_exposure_event(self, limit=None, as_df=False, load=None, result_type=None):
+        """Get exposure–event associations
+
+        :param int limit: maximum number of results
+        :param bool as_df: if set to True result returns as `pandas.DataFrame`
+        :param load: relationship name(s) to load eagerly with the results, e.g. 'chemical' or 'disease'
+        :param str result_type: 'orm' (default), 'tuple', 'record' or 'array', see :mod:`pyctd.manager.records`
+        :rtype: list[models.ExposureEvent]
+        """
+        q = self._query(models.ExposureEvent)
+
+        return self._limit_and_df(q, limit, as_df, load=load, result_type=result_type)
+
+
+_missing = object()
+
+
+def _get_template(manager, method, arguments):
+    """returns the cached template of a call or None if the call can not be answered from a template
+
+    The statement of a shape is built once with placeholders for all candidates of bind parameters by a
+    :class:`_TemplateBuilder` (nothing is executed); if the build reads data the shape is not cached. If a value cached
+    per data version is not loaded yet, the call is answered without template (and loads the value).
+    """
+    shape, names = statements.get_shape(method, arguments)
+
+    if shape is None:
+        return None
+
+    templates = manager._get_cached('statements', lambda: statements.TemplateCache(manager.statement_cache_size))
+    parameters = templates.get(shape, _missing)
+    placeholders = {name: statements.get_placeholder(name) for name in names}
+    builder = _TemplateBuilder(manager)
+
+    if parameters is _missing:
+        try:
+            query = getattr(builder, method)(**dict(arguments, **placeholders))
+        except statements.NotCached:
+            return None
+        except statements.DataRead:
+            parameters = None
+        except ValueError:
+            parameters = frozenset()
+        else:
+            parameters = statements.find_parameters(query.statement, names) if isinstance(query, Query) \
+                else frozenset()
+        templates.set(shape, parameters)
+
+    if parameters is None:
+        return None
+
+    key = (shape, tuple((name, arguments[name]) for name in sorted(names - parameters)))
+    template = templates.get(key, _missing)
+
+    if template is _missing:
+        try:
+            query = getattr(builder, method)(**dict(arguments, **{name: placeholders[name] for name in parameters}))
+        except statements.NotCached:
+            return None
+        except statements.DataRead:
+            query = None
+        template = statements.make_template(query, parameters) if isinstance(query, Query) else None
+        templates.set(key, template)
+
+    return template
+
+
+def _cached(method):
+    names = list(inspect.signature(method).parameters)[1:]
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.statement_cache_size or self.session is None or len(args) > len(names) or \
+                kwargs.get('as_df') or kwargs.get('result_type') not in (None, 'orm'):
+            return method(self, *args, **kwargs)
+
+        arguments = dict(zip(names, args), **kwargs)
+        template = _get_template(self, method.__name__, arguments)
+
+        if template is None:
+            return method(self, *args, **kwargs)
+
+        return statements.execute(self.session, template, arguments)
+
+    return wrapper
+
+
+def _instrumented(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.instrumentation is None:
+            return method(self, *args, **kwargs)
+
+        with self.instrumentation.record(method.__name__) as call:
+            results = method(self, *args, **kwargs)
+            call.rows_returned = count_rows(results.items if isinstance(results, pagination.Page) else results)
+            return results
+
+    return wrapper
+
+
+for _name, _attribute in list(vars(QueryManager).items()):
+    if _name.startswith('get_') and 'result_type' in inspect.signature(_attribute).parameters:
+        setattr(QueryManager, _name, _cached(_attribute))
+
+_instrumented_methods = ('get_parent_ids', 'get_by_pubmed', 'paginate', 'count', 'exists', 'estimate', 'enrich',
+                         'enrich_batch', 'resolve', 'resolve_batch', 'similar_chemicals', 'propagate',
+                         'propagate_batch')
+"""query methods without ``result_type`` which are instrumented; ``get_graph``, ``get_matrix`` and the other
+accessors of cached data structures are not"""
+
+for _name, _attribute in list(vars(QueryManager).items()):
+    if _name.startswith('get_') and 'result_type' in inspect.signature(_attribute).parameters or \
+            _name in _instrumented_methods:
+        setattr(QueryManager, _name, _instrumented(_attribute))
+
+
+class _QueryBuilder(QueryManager):
+    """Builds the queries of the :class:`QueryManager` methods without executing them"""
+
+    statement_cache_size = 0
+
+    def _query(self, *entities):
+        if self.session is None:
+            return Query(entities)
+        return self.session.query(*entities)
+
+    def _limit_and_df(self, query, limit, as_df=False, load=None, result_type=None):
+        if limit:
+            query = query.limit(limit)
+
+        if load:
+            model = query.column_descriptions[0]['entity']
+            query = query.options(*get_load_options(model, load))
+
+        return query
+
+
+class _TemplateBuilder(_QueryBuilder):
+    """Builds the queries of the :class:`QueryManager` methods without session, so that building a template can not
+    execute a statement; values cached per data version are taken from the cache of the manager"""
+
+    def __init__(self, manager):
+        """
+        :param QueryManager manager: manager whose cached values are used
+        """
+        self._session = None
+        self.scoped_session = None
+        self.engine = None
+        self.connection = manager.connection
+        self.manager = manager
+
+    @property
+    def session(self):
+        raise statements.DataRead('session')
+
+    @property
+    def top_k(self):
+        return self._get_cached('top_k', None)
+
+    def _query(self, *entities):
+        return Query(entities)
+
+    def _get_cached(self, name, load):
+        return self.manager._get_cached(name, functools.partial(_raise_not_cached, name))
 
-        return self._limit_and_df(q, limit, as_df)
 
-    # TODO documentation of get_exposure_event
-    def get_exposure_event(self):
-        raise NotImplemented
+def _raise_not_cached(name):
+    raise statements.NotCached(name)
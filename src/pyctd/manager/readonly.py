@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""Read-only query mode for SQLite databases shared by many worker processes
+
+The database file is opened with an URI in read-only mode (``mode=ro``, optionally ``immutable=1`` for files which
+are not changed while the workers run) and read through a memory map (``PRAGMA mmap_size``). Memory mapped pages are
+shared by all processes through the page cache of the operating system, so the private page cache of every
+connection can be kept small (``cache_size``). Writes are rejected with :class:`ReadOnlyError` before they reach
+the database.
+
+.. code-block:: python
+
+    >>> from pyctd.manager.readonly import ReadOnlyQueryManager
+    >>> query = ReadOnlyQueryManager(immutable=True, prewarm=True)
+    >>> query.get_gene(gene_symbol='APP')
+"""
+
+import logging
+import os
+import re
+import threading
+from urllib.parse import quote, urlencode
+
+from sqlalchemy import event, pool
+from sqlalchemy.engine import make_url
+
+from .database import get_connection_string, get_engine, get_scoped_session
+from .query import QueryManager
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MMAP_SIZE = 8 * 1024 ** 3
+"""maximum number of bytes of the database file mapped into memory (SQLite limits it to its compile-time maximum)"""
+
+PREWARM_CHUNK_SIZE = 1024 ** 2
+
+READ_ONLY_PRAGMAS = frozenset([
+    'application_id', 'auto_vacuum', 'cache_size', 'collation_list', 'compile_options', 'data_version',
+    'database_list', 'encoding', 'foreign_keys', 'freelist_count', 'function_list', 'journal_mode', 'mmap_size',
+    'module_list', 'page_count', 'page_size', 'pragma_list', 'query_only', 'schema_version', 'table_list',
+    'user_version',
+])
+"""PRAGMAs allowed in read-only mode without argument (they only return their value)"""
+
+INTROSPECTION_PRAGMAS = frozenset([
+    'foreign_key_check', 'foreign_key_list', 'index_info', 'index_list', 'index_xinfo', 'integrity_check',
+    'quick_check', 'table_info', 'table_list', 'table_xinfo',
+])
+"""PRAGMAs allowed in read-only mode with or without argument (the argument is a table or index, not a value)"""
+
+_read_statement = re.compile(r'^\s*(SELECT|WITH|EXPLAIN)\b', re.IGNORECASE)
+_pragma = re.compile(r'^\s*PRAGMA\s+(?:[\w"`\[\]]+\.)?(\w+)\s*(\(.*\))?\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+_configured_engines = set()
+_lock = threading.Lock()
+
+
+class ReadOnlyError(Exception):
+    """Raised if a statement which could change the database is executed in read-only mode"""
+
+
+def is_read_statement(statement):
+    """returns True if a statement is allowed in read-only mode: SELECT, WITH, EXPLAIN and PRAGMAs which only read
+    (see :data:`READ_ONLY_PRAGMAS` and :data:`INTROSPECTION_PRAGMAS`), e.g. not ``PRAGMA query_only = OFF``
+
+    :param str statement: SQL statement
+    :rtype: bool
+    """
+    if _read_statement.match(statement):
+        return True
+
+    match = _pragma.match(statement)
+    if not match:
+        return False
+
+    name, argument = match.group(1).lower(), match.group(2)
+    return name in INTROSPECTION_PRAGMAS or (argument is None and name in READ_ONLY_PRAGMAS)
+
+
+def get_database_path(connection=None):
+    """returns the absolute path of the file of a SQLite connection string
+
+    :param str connection: SQLAlchemy connection string (default: configured connection string)
+    :rtype: str
+    """
+    url = make_url(get_connection_string(connection))
+
+    if url.get_backend_name() != 'sqlite':
+        raise ValueError('read-only mode is only available for SQLite, not for {}'.format(url.get_backend_name()))
+
+    database = url.database or ''
+    if database.startswith('file:'):
+        database = database[len('file:'):]
+
+    if not database or database == ':memory:':
+        raise ValueError('read-only mode needs a SQLite database file')
+
+    return os.path.abspath(database)
+
+
+def get_read_only_connection_string(connection=None, immutable=False):
+    """returns the SQLAlchemy connection string which opens a SQLite database file read-only
+
+    e.g. ``sqlite:////data/pyctd.db`` becomes ``sqlite:///file:/data/pyctd.db?mode=ro&uri=true``
+
+    :param str connection: SQLAlchemy connection string (default: configured connection string)
+    :param bool immutable: if True SQLite assumes the file is never changed and does not lock it
+    :rtype: str
+    """
+    url = make_url(get_connection_string(connection))
+    parameters = [('mode', 'ro')]
+
+    if immutable:
+        parameters.append(('immutable', '1'))
+
+    parameters.append(('uri', 'true'))
+
+    return '{}:///file:{}?{}'.format(url.drivername, quote(get_database_path(connection)), urlencode(parameters))
+
+
+def prewarm_file(path, chunk_size=PREWARM_CHUNK_SIZE):
+    """reads a file once so that its pages are in the page cache of the operating system (shared by all processes)
+
+    :param str path: path to file
+    :param int chunk_size: number of bytes read at once
+    :return: number of bytes read
+    :rtype: int
+    """
+    size = 0
+
+    with open(path, 'rb') as file:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            size += len(chunk)
+
+    log.info('prewarmed %s (%d bytes)', path, size)
+    return size
+
+
+def configure_engine(engine, mmap_size=DEFAULT_MMAP_SIZE, cache_size=None):
+    """sets the memory map and the write guard on all connections of an engine (only once per engine)
+
+    :param sqlalchemy.engine.Engine engine: engine of a read-only connection string
+    :param int mmap_size: maximum number of bytes of the database file mapped into memory
+    :param int cache_size: size of the private page cache of every connection in KiB (None: SQLite default)
+    """
+    with _lock:
+        if engine in _configured_engines:
+            return
+
+        @event.listens_for(engine, 'connect')
+        def connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA query_only = ON')
+            cursor.execute('PRAGMA mmap_size = {:d}'.format(mmap_size))
+            if cache_size is not None:
+                cursor.execute('PRAGMA cache_size = -{:d}'.format(cache_size))
+            cursor.close()
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            if not is_read_statement(statement):
+                raise ReadOnlyError('read-only mode does not allow: {}'.format(statement))
+
+        _configured_engines.add(engine)
+
+
+class ReadOnlyQueryManager(QueryManager):
+    """Query interface to a SQLite database file opened read-only with a memory map
+
+    Connections are kept in a pool and can be used by all threads, so the memory map of a connection is reused.
+    Statements other than SELECT (and EXPLAIN or PRAGMAs which only read, see :func:`is_read_statement`) raise
+    :class:`ReadOnlyError`.
+    """
+
+    def __init__(self, connection=None, immutable=False, mmap_size=DEFAULT_MMAP_SIZE, cache_size=None,
+                 prewarm=False, echo=False, scopefunc=None, **engine_kwargs):
+        """
+        :param str connection: SQLAlchemy connection string of a SQLite database file
+        :param bool immutable: if True SQLite assumes the file is never changed and does not lock it; only use it if
+            no process writes to the database while the workers run
+        :param int mmap_size: maximum number of bytes of the database file mapped into memory
+        :param int cache_size: size of the private page cache of every connection in KiB (None: SQLite default)
+        :param bool prewarm: if True the database file is read once to load it into the page cache of the operating
+            system
+        :param bool echo: True or False for SQL output of SQLAlchemy engine
+        :param scopefunc: function returning an identifier of the current scope (default: current thread)
+        :param engine_kwargs: further arguments for :func:`sqlalchemy.create_engine`, e.g. pool_size
+        """
+        engine_kwargs.setdefault('poolclass', pool.QueuePool)
+        engine_kwargs.setdefault('connect_args', {'check_same_thread': False})
+
+        self.connection = get_read_only_connection_string(connection, immutable=immutable)
+        self.engine = get_engine(self.connection, echo=echo, **engine_kwargs)
+        configure_engine(self.engine, mmap_size=mmap_size, cache_size=cache_size)
+        self.scoped_session = get_scoped_session(self.engine, scopefunc=scopefunc)
+
+        if prewarm:
+            prewarm_file(get_database_path(connection))
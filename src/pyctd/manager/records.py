@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""Lightweight read-only result rows as an alternative to SQLAlchemy ORM instances
+
+Rows are generated from the columns of a model in :mod:`pyctd.manager.models`. Foreign keys to the vocabularies
+(chemical, gene, disease and pathway) are resolved to their identifiers (e.g. ``chemical__id`` becomes
+``chemical_id`` with the MeSH identifier of the chemical) by an outer join in the same query.
+
+Available result types:
+
+- ``orm``: :mod:`pyctd.manager.models` instances (default)
+- ``tuple``: :func:`collections.namedtuple` instances
+- ``record``: instances of a generated class with ``__slots__``
+- ``array``: :class:`numpy.ndarray` with a structured dtype
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import inspect
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import sqltypes
+
+from . import table_conf
+
+RESULT_TYPES = ('orm', 'tuple', 'record', 'array')
+
+_tuple_classes = {}
+_record_classes = {}
+
+
+def get_domain_id_columns():
+    """returns a dictionary with foreign key column names as keys and (model, identifier column) as values
+
+    :rtype: dict[str,tuple]
+    """
+    return {
+        model.table_suffix + '__id': (model, table_conf.tables[model].domain_id_column[1])
+        for model in table_conf.models_to_map
+    }
+
+
+def get_columns(model):
+    """returns names and columns of a model with foreign keys to vocabularies resolved to identifiers
+
+    :param model: SQLAlchemy model
+    :return: list of column names, list of column expressions and list of (alias, on clause) for outer joins
+    :rtype: tuple[list,list,list]
+    """
+    domain_id_columns = get_domain_id_columns()
+    names, columns, joins = [], [], []
+
+    for column in inspect(model).columns:
+        if column.key in domain_id_columns:
+            domain_model, id_column_name = domain_id_columns[column.key]
+            alias = aliased(domain_model)
+            names.append(id_column_name)
+            columns.append(getattr(alias, id_column_name))
+            joins.append((alias, alias.id == getattr(model, column.key)))
+        else:
+            names.append(column.key)
+            columns.append(getattr(model, column.key))
+
+    return names, columns, joins
+
+
+def _get_tuple_class(model, names):
+    if model not in _tuple_classes:
+        _tuple_classes[model] = namedtuple(model.__name__ + 'Row', names)
+    return _tuple_classes[model]
+
+
+def _get_record_class(model, names):
+    if model not in _record_classes:
+        def __init__(self, *values):
+            for name, value in zip(self.__slots__, values):
+                setattr(self, name, value)
+
+        def __repr__(self):
+            return '{}({})'.format(type(self).__name__, ', '.join(
+                '{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+        def __eq__(self, other):
+            return type(self) is type(other) and all(
+                getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+        _record_classes[model] = type(model.__name__ + 'Record', (object,), {
+            '__slots__': tuple(names),
+            '__init__': __init__,
+            '__repr__': __repr__,
+            '__eq__': __eq__,
+            '__hash__': None,
+        })
+    return _record_classes[model]
+
+
+def _get_dtype(columns, names):
+    """returns a numpy structured dtype; numbers are float (NULL is NaN) except of the primary key"""
+    fields = []
+    for name, column in zip(names, columns):
+        if name == 'id':
+            fields.append((name, np.int64))
+        elif isinstance(column.type, (sqltypes.Integer, sqltypes.Float)):
+            fields.append((name, np.float64))
+        else:
+            fields.append((name, object))
+    return np.dtype(fields)
+
+
+def fetch(query, result_type, limit=None):
+    """executes a query and returns the rows of the queried model in a lightweight format
+
+    :param sqlalchemy.orm.query.Query query: SQL Alchemy query of one model
+    :param str result_type: one of 'tuple', 'record' or 'array'
+    :param int limit: maximum number of results
+    :return: list of named tuples, list of records or :class:`numpy.ndarray`
+    """
+    model = query.column_descriptions[0]['entity']
+    names, columns, joins = get_columns(model)
+
+    query = query.with_entities(*columns)
+    for alias, on_clause in joins:
+        query = query.outerjoin(alias, on_clause)
+
+    if limit:
+        query = query.limit(limit)
+
+    rows = query.all()
+
+    if result_type == 'tuple':
+        row_class = _get_tuple_class(model, names)
+        return [row_class._make(row) for row in rows]
+
+    if result_type == 'record':
+        record_class = _get_record_class(model, names)
+        return [record_class(*row) for row in rows]
+
+    if result_type == 'array':
+        array = np.empty(len(rows), dtype=_get_dtype(columns, names))
+        for index, name in enumerate(names):
+            array[name] = [row[index] for row in rows]
+        return array
+
+    raise ValueError('result_type {} not in {}'.format(result_type, RESULT_TYPES))
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""Fuzzy resolution of chemical, disease and gene names with a trigram index
+
+All names and synonyms of :class:`pyctd.manager.models.Chemical`, :class:`pyctd.manager.models.ChemicalSynonym`,
+:class:`pyctd.manager.models.Disease`, :class:`pyctd.manager.models.DiseaseSynonym`,
+:class:`pyctd.manager.models.Gene` (symbol and name) and :class:`pyctd.manager.models.GeneSynonym` are normalized
+(ASCII, lower case, words separated by one space) and split into trigrams as in PostgreSQL's ``pg_trgm``. Candidates
+are ranked by the Jaccard similarity of their trigram sets with the query, so typos and word order changes are
+tolerated.
+
+The index is an inverted list of names per trigram in compressed sparse row format. Only the rarest trigrams of a
+query are scanned for candidates (prefix filtering: a name with a similarity of at least ``min_score`` shares one of
+them), the other trigrams are only looked up for these candidates. The index is saved in one file per database and
+data version (see :mod:`pyctd.manager.cache`) and memory mapped, so processes share it through the page cache of the
+operating system.
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> query = pyctd.query()
+    >>> query.resolve('asprin')
+    [Candidate(entity_type='chemical', identifier='D001241', name='Aspirin', score=0.5), ...]
+    >>> query.resolve_batch(['acetaminophen', 'breast neoplasm'], entity_types=['chemical', 'disease'], limit=1)
+"""
+
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from . import cache
+from . import models
+from ..constants import PYCTD_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+ENTITY_TYPES = ('chemical', 'disease', 'gene')
+
+ENTITY_NAMES = (
+    ('chemical', models.Chemical, models.Chemical.chemical_id, models.Chemical.chemical_name),
+    ('chemical', models.Chemical, models.Chemical.chemical_id, models.ChemicalSynonym.synonym),
+    ('disease', models.Disease, models.Disease.disease_id, models.Disease.disease_name),
+    ('disease', models.Disease, models.Disease.disease_id, models.DiseaseSynonym.synonym),
+    ('gene', models.Gene, models.Gene.gene_id, models.Gene.gene_symbol),
+    ('gene', models.Gene, models.Gene.gene_id, models.Gene.gene_name),
+    ('gene', models.Gene, models.Gene.gene_id, models.GeneSynonym.synonym),
+)
+"""(entity type, model, identifier column, name column) of all indexed names"""
+
+RESULT_COLUMNS = ['query', 'rank', 'entity_type', 'identifier', 'name', 'score']
+"""columns of the results of :meth:`EntityResolver.resolve_batch`"""
+
+Candidate = namedtuple('Candidate', ['entity_type', 'identifier', 'name', 'score'])
+Candidate.__doc__ = """Chemical, disease or gene with the best matching name and its similarity (0 to 1)"""
+
+_ALPHABET = ' abcdefghijklmnopqrstuvwxyz0123456789'
+_NUMBER_OF_TRIGRAMS = len(_ALPHABET) ** 3
+_codes = np.zeros(256, dtype=np.int32)
+_codes[np.frombuffer(_ALPHABET.encode('ascii'), dtype=np.uint8)] = np.arange(len(_ALPHABET))
+
+_MAGIC = b'PYCTDIDX'
+_ALIGNMENT = 64
+_non_alphanumeric = re.compile('[^a-z0-9]+')
+
+
+def normalize(name):
+    """returns a name in ASCII and lower case with words separated by one space
+
+    :param str name: name
+    :rtype: str
+    """
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    return _non_alphanumeric.sub(' ', name).strip()
+
+
+def _pad(normalized):
+    return '  ' + normalized + ' '
+
+
+def get_trigrams(name):
+    """returns the sorted distinct trigram codes of a name
+
+    :param str name: name
+    :rtype: numpy.ndarray
+    """
+    normalized = normalize(name)
+    if not normalized:
+        return np.empty(0, dtype=np.int64)
+
+    codes = _codes[np.frombuffer(_pad(normalized).encode('ascii'), dtype=np.uint8)].astype(np.int64)
+    return np.unique(codes[:-2] * len(_ALPHABET) ** 2 + codes[1:-1] * len(_ALPHABET) + codes[2:])
+
+
+def _pack_strings(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(string) for string in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _write_arrays(path, arrays):
+    """writes arrays in one file (JSON header followed by the aligned raw arrays) which can be memory mapped"""
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    header = json.dumps(layout).encode('utf-8')
+    start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+    with open(path + '.tmp', 'wb') as file:
+        file.write(_MAGIC + np.uint64(len(header)).tobytes() + header)
+        for name, array in arrays.items():
+            file.seek(start + layout[name][2])
+            file.write(np.ascontiguousarray(array).tobytes())
+        file.truncate(start + offset)
+
+    os.replace(path + '.tmp', path)
+
+
+def _read_arrays(path):
+    """returns the memory mapped arrays of a file written by :func:`_write_arrays`"""
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+
+    if bytes(buffer[:len(_MAGIC)]) != _MAGIC:
+        raise ValueError('{} is no index file'.format(path))
+
+    header_length = int(buffer[len(_MAGIC):len(_MAGIC) + 8].view(np.uint64)[0])
+    header = bytes(buffer[len(_MAGIC) + 8:len(_MAGIC) + 8 + header_length])
+    start = -(-(len(_MAGIC) + 8 + header_length) // _ALIGNMENT) * _ALIGNMENT
+
+    arrays = {}
+    for name, (dtype, shape, offset) in json.loads(header.decode('utf-8')).items():
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        arrays[name] = buffer[start + offset:start + offset + size].view(dtype).reshape(shape)
+
+    return arrays
+
+
+class EntityResolver(object):
+    """Trigram index over the names and synonyms of chemicals, diseases and genes"""
+
+    def __init__(self, arrays):
+        """
+        :param dict arrays: arrays of the index as built by :meth:`from_manager` or loaded by :meth:`load`
+        """
+        self.arrays = arrays
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.name_lengths = arrays['name_lengths']
+        self.name_entities = arrays['name_entities']
+        self.entity_types = arrays['entity_types']
+
+    def __repr__(self):
+        return 'EntityResolver(entities={}, names={})'.format(len(self.entity_types), len(self.name_entities))
+
+    @classmethod
+    def from_manager(cls, manager):
+        """builds the index from the names and synonyms in the database
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :rtype: EntityResolver
+        """
+        entity_types, identifiers, name_entities, names = [], [], [], []
+        entity_index = {}
+
+        for entity_type, model, identifier_column, name_column in ENTITY_NAMES:
+            statement = select(identifier_column.label('identifier'), name_column.label('name'))
+            if name_column.class_ is not model:
+                statement = statement.join_from(name_column.class_, model)
+
+            for identifier, name in pd.read_sql(statement, manager.engine).dropna().itertuples(index=False):
+                if isinstance(identifier, float):
+                    identifier = int(identifier)
+                key = (entity_type, str(identifier))
+                if key not in entity_index:
+                    entity_index[key] = len(identifiers)
+                    entity_types.append(ENTITY_TYPES.index(entity_type))
+                    identifiers.append(key[1])
+                name_entities.append(entity_index[key])
+                names.append(name)
+
+        names = pd.DataFrame({'entity': name_entities, 'name': names})
+        names['normalized'] = names['name'].map(normalize)
+        names = names[names['normalized'] != ''].drop_duplicates(['entity', 'normalized']).reset_index(drop=True)
+
+        arrays = cls._build_index(names['normalized'])
+        arrays['name_entities'] = names['entity'].to_numpy(dtype=np.int32)
+        arrays['entity_types'] = np.array(entity_types, dtype=np.int8)
+        arrays['name_bytes'], arrays['name_offsets'] = _pack_strings(names['name'])
+        arrays['identifier_bytes'], arrays['identifier_offsets'] = _pack_strings(identifiers)
+
+        return cls(arrays)
+
+    @staticmethod
+    def _build_index(normalized):
+        """returns the inverted lists (names per trigram) and the number of trigrams per name"""
+        padded = [_pad(name) for name in normalized]
+
+        if not padded:
+            return {
+                'indptr': np.zeros(_NUMBER_OF_TRIGRAMS + 1, dtype=np.int64),
+                'indices': np.empty(0, dtype=np.int32),
+                'name_lengths': np.empty(0, dtype=np.int32),
+            }
+
+        lengths = np.array([len(name) for name in padded], dtype=np.int64)
+        codes = _codes[np.frombuffer(''.join(padded).encode('ascii'), dtype=np.uint8)].astype(np.int64)
+
+        starts = np.cumsum(lengths) - lengths
+        name_of_position = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)
+        position_in_name = np.arange(len(codes)) - np.repeat(starts, lengths)
+        valid = np.flatnonzero(position_in_name <= np.repeat(lengths, lengths) - 3)
+
+        trigrams = codes[valid] * len(_ALPHABET) ** 2 + codes[valid + 1] * len(_ALPHABET) + codes[valid + 2]
+        keys = np.unique(trigrams * len(padded) + name_of_position[valid])
+        trigrams, names = keys // len(padded), keys % len(padded)
+
+        indptr = np.zeros(_NUMBER_OF_TRIGRAMS + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(trigrams, minlength=_NUMBER_OF_TRIGRAMS))
+
+        return {
+            'indptr': indptr,
+            'indices': names.astype(np.int32),
+            'name_lengths': np.bincount(names, minlength=len(padded)).astype(np.int32),
+        }
+
+    @classmethod
+    def load(cls, path):
+        """loads (memory maps) an index file
+
+        :param str path: path to file
+        :rtype: EntityResolver
+        """
+        return cls(_read_arrays(path))
+
+    def save(self, path):
+        """saves the index in one file
+
+        :param str path: path to file
+        """
+        _write_arrays(path, self.arrays)
+
+    @classmethod
+    def from_cache(cls, manager, cache_dir=PYCTD_DATA_DIR):
+        """loads the index of the current data version from disk or builds and caches it
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :param str cache_dir: directory of cached indexes
+        :rtype: EntityResolver
+        """
+        return cache.load_or_build(manager, 'resolver', lambda: cls.from_manager(manager), cls.load, cls.save,
+                                   extension='idx', cache_dir=cache_dir, reload=True)
+
+    def _get_string(self, kind, index):
+        offsets = self.arrays[kind + '_offsets']
+        return bytes(self.arrays[kind + '_bytes'][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def _get_postings(self, trigram):
+        return self.indices[self.indptr[trigram]:self.indptr[trigram + 1]]
+
+    def resolve(self, name, entity_types=None, limit=10, min_score=0.3):
+        """returns the chemicals, diseases or genes with the most similar names
+
+        :param str name: (approximate) name
+        :param iter[str] entity_types: only return these entity types (see :data:`ENTITY_TYPES`)
+        :param int limit: maximum number of candidates
+        :param float min_score: minimum similarity (Jaccard index of the trigrams, between 0 and 1)
+        :return: candidates ordered by similarity, each entity only once with its best matching name
+        :rtype: list[Candidate]
+        """
+        trigrams = get_trigrams(name)
+        if not len(trigrams):
+            return []
+
+        trigrams = trigrams[np.argsort(self.indptr[trigrams + 1] - self.indptr[trigrams], kind='stable')]
+        required = max(int(np.ceil(min_score * len(trigrams) - 1e-9)), 1)
+        prefix = trigrams[:max(len(trigrams) - required + 1, 1)]
+
+        candidates = np.unique(np.concatenate([self._get_postings(trigram) for trigram in prefix]))
+
+        if entity_types is not None:
+            type_codes = [ENTITY_TYPES.index(entity_type) for entity_type in entity_types]
+            candidates = candidates[np.isin(self.entity_types[self.name_entities[candidates]], type_codes)]
+
+        shared = np.zeros(len(candidates), dtype=np.int64)
+        for trigram in trigrams:
+            postings = self._get_postings(trigram)
+            if len(postings):
+                positions = np.minimum(np.searchsorted(postings, candidates), len(postings) - 1)
+                shared += postings[positions] == candidates
+
+        scores = shared / (len(trigrams) + self.name_lengths[candidates] - shared)
+        selected = scores >= min_score
+        candidates, scores = candidates[selected], scores[selected]
+
+        results, entities = [], set()
+        for index in np.lexsort((candidates, -scores)):
+            entity = int(self.name_entities[candidates[index]])
+            if entity in entities:
+                continue
+            entities.add(entity)
+            results.append(Candidate(
+                entity_type=ENTITY_TYPES[self.entity_types[entity]],
+                identifier=self._get_string('identifier', entity),
+                name=self._get_string('name', candidates[index]),
+                score=float(scores[index]),
+            ))
+            if len(results) == limit:
+                break
+
+        return results
+
+    def resolve_batch(self, names, entity_types=None, limit=1, min_score=0.3):
+        """resolves many names, e.g. a column of a spreadsheet
+
+        :param iter[str] names: (approximate) names
+        :param iter[str] entity_types: only return these entity types (see :data:`ENTITY_TYPES`)
+        :param int limit: maximum number of candidates per name
+        :param float min_score: minimum similarity (Jaccard index of the trigrams, between 0 and 1)
+        :return: candidates with :data:`RESULT_COLUMNS`; names without candidate are not included
+        :rtype: pandas.DataFrame
+        """
+        rows = [
+            (name, rank) + tuple(candidate)
+            for name in names
+            for rank, candidate in enumerate(self.resolve(name, entity_types, limit, min_score), start=1)
+        ]
+        return pd.DataFrame(rows, columns=RESULT_COLUMNS)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+"""Similarity search of chemicals, genes and diseases by their association profiles with MinHash and LSH
+
+The profile of an entity is the set of its associated entities of another type, e.g. the genes a chemical interacts
+with (from :func:`pyctd.manager.matrices.AssociationMatrix.from_manager`). Every profile is summarized by a MinHash
+signature; the signatures are split into bands which are hashed into a locality sensitive hashing (LSH) index, so
+only entities sharing a band with the query are compared. These candidates are re-ranked by their exact Jaccard
+similarity, tested against the profile of the query as bitset. The index is cached as ``.npz`` file per database and
+data version (see :mod:`pyctd.manager.cache`).
+
+With the default of 32 bands of 4 hash values, pairs with a Jaccard similarity of 0.5 are found with a probability
+of 87%, pairs of 0.3 with 23%.
+
+.. code-block:: python
+
+    >>> import pyctd
+    >>> query = pyctd.query()
+    >>> query.similar_chemicals('D000082', k=5)
+    [SimilarEntity(identifier='D012459', similarity=0.61), ...]
+    >>> query.get_similarity_index('disease', profile='chemical').similar('MESH:D000544')
+"""
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from . import cache
+from .matrices import AssociationMatrix, MATRIX_TYPES
+from ..constants import PYCTD_DATA_DIR
+
+log = logging.getLogger(__name__)
+
+NUMBER_OF_HASHES = 128
+"""number of hash functions of a MinHash signature"""
+
+NUMBER_OF_BANDS = 32
+"""number of LSH bands (the signature length must be a multiple)"""
+
+PROFILES = (
+    ('chemical', 'gene'),
+    ('chemical', 'disease'),
+    ('gene', 'chemical'),
+    ('disease', 'chemical'),
+)
+"""(entity type, profile type) of the indices built during the import"""
+
+SimilarEntity = namedtuple('SimilarEntity', ['identifier', 'similarity'])
+SimilarEntity.__doc__ = """Entity with a similar profile and the Jaccard similarity of both profiles (0 to 1)"""
+
+_PRIME = (1 << 31) - 1
+_EMPTY = np.uint32(_PRIME)
+
+
+def get_kind(entity_type, profile):
+    """returns the kind of association matrix of an entity type and a profile type and whether it is transposed
+
+    :param str entity_type: 'chemical', 'disease', 'gene' or 'pathway'
+    :param str profile: 'chemical', 'disease', 'gene' or 'pathway'
+    :rtype: tuple[str,bool]
+    """
+    for kind, (_, row_type, column_type) in MATRIX_TYPES.items():
+        if (row_type, column_type) == (entity_type, profile):
+            return kind, False
+        if (row_type, column_type) == (profile, entity_type):
+            return kind, True
+
+    raise ValueError('no associations between {} and {}'.format(entity_type, profile))
+
+
+def get_signatures(indptr, indices, number_of_hashes=NUMBER_OF_HASHES, seed=0):
+    """returns the MinHash signatures of the rows of a CSR structure
+
+    The hash functions are ``(a * x + b) mod (2^31 - 1)``; rows without entries get the signature ``2^31 - 1``.
+
+    :param numpy.ndarray indptr: CSR index pointer
+    :param numpy.ndarray indices: CSR column indices
+    :param int number_of_hashes: length of the signatures
+    :param int seed: seed of the hash functions
+    :return: array with one signature per row
+    :rtype: numpy.ndarray
+    """
+    random = np.random.RandomState(seed)
+    a = random.randint(1, _PRIME, number_of_hashes).astype(np.uint64)
+    b = random.randint(0, _PRIME, number_of_hashes).astype(np.uint64)
+
+    number_of_rows = len(indptr) - 1
+    signatures = np.full((number_of_rows, number_of_hashes), _EMPTY, dtype=np.uint32)
+    non_empty = np.flatnonzero(np.diff(indptr))
+
+    if not len(non_empty):
+        return signatures
+
+    values = indices.astype(np.uint64)
+    starts = indptr[non_empty]
+
+    for hash_index in range(number_of_hashes):
+        hashed = (a[hash_index] * values + b[hash_index]) % _PRIME
+        signatures[non_empty, hash_index] = np.minimum.reduceat(hashed, starts)
+
+    return signatures
+
+
+def get_band_keys(signatures, number_of_bands=NUMBER_OF_BANDS):
+    """returns one 64-bit hash per band of every signature
+
+    :param numpy.ndarray signatures: MinHash signatures
+    :param int number_of_bands: number of bands
+    :return: array of shape (number of bands, number of signatures)
+    :rtype: numpy.ndarray
+    """
+    number_of_rows, number_of_hashes = signatures.shape
+
+    if number_of_hashes % number_of_bands:
+        raise ValueError('{} hashes can not be split into {} bands'.format(number_of_hashes, number_of_bands))
+
+    rows_per_band = number_of_hashes // number_of_bands
+    multipliers = np.random.RandomState(1).randint(1, 1 << 62, rows_per_band, dtype=np.int64).astype(np.uint64) | 1
+    bands = signatures.reshape(number_of_rows, number_of_bands, rows_per_band).astype(np.uint64)
+
+    with np.errstate(over='ignore'):
+        keys = (bands * multipliers).sum(axis=2, dtype=np.uint64)
+        keys ^= keys >> np.uint64(29)
+
+    return keys.T.copy()
+
+
+class SimilarityIndex(object):
+    """MinHash signatures and banded LSH index of the profiles of all entities of one type"""
+
+    def __init__(self, entity_type, profile, identifiers, indptr, indices, signatures, band_keys, band_orders):
+        """
+        :param str entity_type: type of the indexed entities
+        :param str profile: type of the entities in the profiles
+        :param numpy.ndarray identifiers: identifier of every indexed entity
+        :param numpy.ndarray indptr: CSR index pointer of the profiles
+        :param numpy.ndarray indices: CSR profiles (sorted within every entity)
+        :param numpy.ndarray signatures: MinHash signature of every entity
+        :param numpy.ndarray band_keys: sorted band hashes (one row per band)
+        :param numpy.ndarray band_orders: entity of every band hash
+        """
+        self.entity_type = entity_type
+        self.profile = profile
+        self.identifiers = identifiers
+        self.indptr = indptr
+        self.indices = indices
+        self.signatures = signatures
+        self.band_keys = band_keys
+        self.band_orders = band_orders
+        self._index = None
+
+    def __repr__(self):
+        return 'SimilarityIndex({} by {}, entities={}, bands={})'.format(
+            self.entity_type, self.profile, len(self.identifiers), len(self.band_keys))
+
+    @property
+    def index(self):
+        """entity of every identifier
+
+        :rtype: dict[str,int]
+        """
+        if self._index is None:
+            self._index = {identifier: entity for entity, identifier in enumerate(self.identifiers)}
+        return self._index
+
+    @classmethod
+    def from_manager(cls, manager, entity_type='chemical', profile='gene', number_of_hashes=NUMBER_OF_HASHES,
+                     number_of_bands=NUMBER_OF_BANDS):
+        """builds the index from the association table in the database
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :param str entity_type: 'chemical', 'disease', 'gene' or 'pathway'
+        :param str profile: 'chemical', 'disease', 'gene' or 'pathway'
+        :param int number_of_hashes: length of the MinHash signatures
+        :param int number_of_bands: number of LSH bands
+        :rtype: SimilarityIndex
+        """
+        kind, transposed = get_kind(entity_type, profile)
+        association_matrix = AssociationMatrix.from_manager(manager, kind, weight='binary')
+        matrix = association_matrix.matrix
+        identifiers = association_matrix.row_ids
+
+        if transposed:
+            matrix = matrix.T.tocsr()
+            identifiers = association_matrix.column_ids
+
+        matrix.sort_indices()
+        signatures = get_signatures(matrix.indptr, matrix.indices, number_of_hashes=number_of_hashes)
+        band_keys = get_band_keys(signatures, number_of_bands=number_of_bands)
+        band_orders = np.argsort(band_keys, axis=1, kind='stable').astype(np.int32)
+
+        log.info('similarity index of %s %s by %s', len(identifiers), entity_type, profile)
+
+        return cls(
+            entity_type=entity_type,
+            profile=profile,
+            identifiers=identifiers,
+            indptr=matrix.indptr.astype(np.int64),
+            indices=matrix.indices.astype(np.int32),
+            signatures=signatures,
+            band_keys=np.take_along_axis(band_keys, band_orders, axis=1),
+            band_orders=band_orders,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """loads an index from a ``.npz`` file
+
+        :param str path: path to file
+        :rtype: SimilarityIndex
+        """
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+
+        arrays['entity_type'] = str(arrays['entity_type'])
+        arrays['profile'] = str(arrays['profile'])
+        return cls(**arrays)
+
+    def save(self, path):
+        """saves the index in a ``.npz`` file
+
+        :param str path: path to file
+        """
+        np.savez(
+            path,
+            entity_type=np.array(self.entity_type),
+            profile=np.array(self.profile),
+            identifiers=self.identifiers,
+            indptr=self.indptr,
+            indices=self.indices,
+            signatures=self.signatures,
+            band_keys=self.band_keys,
+            band_orders=self.band_orders,
+        )
+
+    @classmethod
+    def from_cache(cls, manager, entity_type='chemical', profile='gene', cache_dir=PYCTD_DATA_DIR):
+        """loads the index of the current data version from disk or builds and caches it
+
+        :param pyctd.manager.database.BaseDbManager manager: manager connected to the database
+        :param str entity_type: 'chemical', 'disease', 'gene' or 'pathway'
+        :param str profile: 'chemical', 'disease', 'gene' or 'pathway'
+        :param str cache_dir: directory of cached indices
+        :rtype: SimilarityIndex
+        """
+        return cache.load_or_build(manager, 'similarity_{}_{}'.format(entity_type, profile),
+                                   lambda: cls.from_manager(manager, entity_type=entity_type, profile=profile),
+                                   cls.load, cls.save, cache_dir=cache_dir)
+
+    def _get_candidates(self, entity):
+        """returns all entities with a profile sharing at least one band with the profile of an entity"""
+        number_of_bands = len(self.band_keys)
+        query_keys = get_band_keys(self.signatures[entity:entity + 1], number_of_bands=number_of_bands)[:, 0]
+        starts = np.array([np.searchsorted(keys, key) for keys, key in zip(self.band_keys, query_keys)])
+        ends = np.array([np.searchsorted(keys, key, side='right') for keys, key in zip(self.band_keys, query_keys)])
+
+        candidates = np.unique(np.concatenate([
+            self.band_orders[band, start:end] for band, (start, end) in enumerate(zip(starts, ends))
+        ]))
+        candidates = candidates[candidates != entity]
+        return candidates[self.indptr[candidates + 1] > self.indptr[candidates]]
+
+    def jaccard(self, entity, others):
+        """returns the exact Jaccard similarities of the profile of an entity with the profiles of other entities
+
+        The profile of the entity is packed into a bitset, against which the profiles of the others are tested.
+
+        :param int entity: index of the entity
+        :param numpy.ndarray others: indices of the other entities
+        :rtype: numpy.ndarray
+        """
+        others = np.asarray(others, dtype=np.int64)
+        profile = self.indices[self.indptr[entity]:self.indptr[entity + 1]]
+        bits = np.zeros((int(profile.max()) >> 3) + 1 if len(profile) else 1, dtype=np.uint8)
+        np.bitwise_or.at(bits, profile >> 3, (1 << (profile & 7)).astype(np.uint8))
+
+        starts = self.indptr[others]
+        lengths = self.indptr[others + 1] - starts
+        total = lengths.sum()
+
+        if not total:
+            return np.zeros(len(others))
+
+        members = self.indices[np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)]
+        in_range = (members >> 3) < len(bits)
+        hits = np.zeros(total, dtype=np.int64)
+        hits[in_range] = (bits[members[in_range] >> 3] >> (members[in_range] & 7)) & 1
+
+        boundaries = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        intersections = np.add.reduceat(hits, boundaries) * (lengths > 0)
+        unions = len(profile) + lengths - intersections
+        return np.divide(intersections, unions, out=np.zeros(len(others)), where=unions > 0)
+
+    def similar(self, identifier, k=10, min_similarity=0.0):
+        """returns the entities with the most similar profiles (approximate: candidates are found by LSH)
+
+        :param str identifier: identifier of the entity, e.g. MeSH identifier of a chemical
+        :param int k: maximum number of results
+        :param float min_similarity: minimum Jaccard similarity between 0 and 1
+        :return: entities ordered by exact Jaccard similarity
+        :rtype: list[SimilarEntity]
+        """
+        if identifier not in self.index:
+            raise ValueError('{} {} not found'.format(self.entity_type, identifier))
+
+        entity = self.index[identifier]
+
+        if self.indptr[entity + 1] == self.indptr[entity]:
+            return []
+
+        candidates = self._get_candidates(entity)
+        similarities = self.jaccard(entity, candidates)
+        order = np.lexsort((candidates, -similarities))
+        order = order[similarities[order] >= min_similarity][:k]
+
+        return [
+            SimilarEntity(str(self.identifiers[candidate]), float(similarity))
+            for candidate, similarity in zip(candidates[order], similarities[order])
+            if similarity > 0
+        ]
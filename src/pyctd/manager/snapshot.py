@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+
+"""Prebuilt database snapshots which are restored in minutes instead of importing the CTD files again
+
+A snapshot is a (gzip compressed) tar file with a ``manifest.json`` as first member followed by the data: a copy of
+a fully indexed SQLite database made with the SQLite backup API or, for other dialects (or with ``dump=True``), one
+JSON Lines file per table. The manifest lists the CTD release, the data version, the schema version of the models,
+the number of rows of every table and the size and SHA-256 checksum of every file. The SHA-256 checksum of the
+snapshot itself is written next to it (``<snapshot>.sha256``, format of ``sha256sum``).
+
+A snapshot is restored from a local path or URL in one streaming pass: all files are extracted into a staging folder
+while their checksums are computed, and the database is only replaced after every checksum (and the schema version)
+matched. SQLite databases are swapped in atomically by renaming the staged file; dumps are loaded in one transaction
+(atomic on dialects with transactional DDL, e.g. PostgreSQL).
+
+.. code-block:: sh
+
+    pyctd snapshot create ctd.tar.gz
+    pyctd snapshot restore https://example.org/ctd.tar.gz
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+from datetime import datetime
+from urllib.error import URLError
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from sqlalchemy import create_engine, func, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import sqltypes
+
+from . import models
+from .config import get_connection_string
+from .database import dispose_engines, get_engine
+from .export import CHUNKSIZE
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+"""version of the layout of snapshots"""
+
+MANIFEST = 'manifest.json'
+"""name of the manifest in a snapshot"""
+
+SQLITE_FILE = 'pyctd.db'
+"""name of the SQLite database in a snapshot"""
+
+COMPRESSIONS = ('gz', None)
+"""compressions of snapshots"""
+
+BUFFER_SIZE = 2 ** 20
+"""number of bytes read and written at once"""
+
+
+class SnapshotError(Exception):
+    """Raised if a snapshot is incomplete, corrupted or does not fit the installed models"""
+
+
+def get_schema_version(metadata=models.Base.metadata):
+    """returns a fingerprint of the tables and columns of the models
+
+    :param sqlalchemy.MetaData metadata: metadata of the models
+    :rtype: str
+    """
+    schema = [[table.name, [[column.name, str(column.type)] for column in table.columns]]
+              for table in sorted(metadata.tables.values(), key=lambda table: table.name)]
+    return hashlib.sha1(json.dumps(schema).encode('utf-8')).hexdigest()[:16]
+
+
+def _get_checksum(path):
+    """returns size and SHA-256 checksum of a file"""
+    sha256 = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(BUFFER_SIZE), b''):
+            sha256.update(block)
+
+    return {'size': os.path.getsize(path), 'sha256': sha256.hexdigest()}
+
+
+def _get_dump_name(table_name):
+    return 'tables/{}.jsonl.gz'.format(table_name)
+
+
+def _get_binary_columns(table):
+    """returns the positions of the binary columns of a table (base64 encoded in dumps)"""
+    return [position for position, column in enumerate(table.columns) if isinstance(column.type, sqltypes.LargeBinary)]
+
+
+def _get_tables(engine):
+    """returns the tables of the models which exist in the database ordered by their dependencies"""
+    table_names = set(inspect(engine).get_table_names())
+    return [table for table in models.Base.metadata.sorted_tables if table.name in table_names]
+
+
+def _count_rows(engine):
+    with engine.connect() as db_connection:
+        return {table.name: db_connection.execute(select(func.count()).select_from(table)).scalar()
+                for table in _get_tables(engine)}
+
+
+def _backup_sqlite(engine, path):
+    """copies a consistent state of a SQLite database with the backup API"""
+    source = engine.raw_connection()
+    target = sqlite3.connect(path)
+
+    try:
+        source.backup(target)
+        target.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        target.close()
+        source.close()
+
+
+def _dump_tables(engine, directory, chunksize=CHUNKSIZE):
+    """writes every table into a JSON Lines file (column names in the first line, one row per line)
+
+    :return: number of rows per table
+    :rtype: dict[str,int]
+    """
+    os.makedirs(os.path.join(directory, 'tables'), exist_ok=True)
+    counts = {}
+
+    for table in _get_tables(engine):
+        statement = select(table).order_by(*table.primary_key.columns)
+        binary_columns = _get_binary_columns(table)
+        number_of_rows = 0
+
+        with gzip.open(os.path.join(directory, _get_dump_name(table.name)), 'wt', encoding='utf-8') as file, \
+                engine.connect() as db_connection:
+            file.write(json.dumps([column.name for column in table.columns]) + '\n')
+            result = db_connection.execution_options(stream_results=True).execute(statement)
+
+            for rows in result.partitions(chunksize):
+                for row in rows:
+                    row = list(row)
+                    for position in binary_columns:
+                        if row[position] is not None:
+                            row[position] = base64.b64encode(row[position]).decode()
+                    file.write(json.dumps(row, ensure_ascii=False) + '\n')
+                number_of_rows += len(rows)
+
+        log.info('dumped %s rows of %s', number_of_rows, table.name)
+        counts[table.name] = number_of_rows
+
+    return counts
+
+
+def _get_meta(engine):
+    if models.Meta.__tablename__ not in inspect(engine).get_table_names():
+        return {}
+
+    with engine.connect() as db_connection:
+        return dict(db_connection.execute(select(models.Meta.key, models.Meta.value)).fetchall())
+
+
+class _HashingWriter(object):
+    """file object which computes the SHA-256 checksum of all written bytes"""
+
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+
+class _HashingReader(object):
+    """file object which computes the SHA-256 checksum of all read bytes"""
+
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.sha256.update(data)
+        return data
+
+    def hexdigest(self):
+        """reads the rest of the file and returns the checksum of all bytes"""
+        while self.read(BUFFER_SIZE):
+            pass
+        return self.sha256.hexdigest()
+
+
+def create_snapshot(path, connection=None, compression='gz', dump=False, chunksize=CHUNKSIZE):
+    """packages the database with a manifest into a snapshot file and writes its checksum to ``<path>.sha256``
+
+    :param str path: path to the snapshot file, e.g. 'ctd.tar.gz'
+    :param str connection: SQLAlchemy connection string (default: configured connection string)
+    :param str compression: 'gz' or None
+    :param bool dump: if True SQLite databases are dumped table by table as for other dialects (portable, e.g. to
+        restore a SQLite database to MySQL)
+    :param int chunksize: number of rows fetched at once for dumps
+    :return: manifest
+    :rtype: dict
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError('compression {} not in {}'.format(compression, COMPRESSIONS))
+
+    connection = get_connection_string(connection)
+    engine = get_engine(connection)
+    url = make_url(connection)
+    sqlite = url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') and not dump
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.tmp.snapshot.', dir=directory)
+
+    try:
+        if sqlite:
+            log.info('copy %s', url.database)
+            _backup_sqlite(engine, os.path.join(staging, SQLITE_FILE))
+            file_names = [SQLITE_FILE]
+            tables = _count_rows(engine)
+        else:
+            tables = _dump_tables(engine, staging, chunksize=chunksize)
+            file_names = [_get_dump_name(table_name) for table_name in tables]
+
+        meta = _get_meta(engine)
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'kind': 'sqlite' if sqlite else 'dump',
+            'created': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'dialect': url.get_backend_name(),
+            'ctd_release': meta.get('ctd_release'),
+            'data_version': meta.get('data_version'),
+            'schema_version': get_schema_version(),
+            'tables': tables,
+            'files': {file_name: _get_checksum(os.path.join(staging, file_name)) for file_name in file_names},
+        }
+
+        manifest_path = os.path.join(staging, MANIFEST)
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+
+        temporary_path = os.path.join(directory, '.tmp.' + os.path.basename(path))
+        with open(temporary_path, 'wb') as file:
+            writer = _HashingWriter(file)
+            with tarfile.open(fileobj=writer, mode='w|' + (compression or '')) as archive:
+                archive.add(manifest_path, arcname=MANIFEST)
+                for file_name in file_names:
+                    archive.add(os.path.join(staging, file_name), arcname=file_name)
+
+        os.replace(temporary_path, path)
+    finally:
+        shutil.rmtree(staging)
+
+    with open(path + '.sha256', 'w') as file:
+        file.write('{}  {}\n'.format(writer.sha256.hexdigest(), os.path.basename(path)))
+
+    log.info('snapshot of %s tables written to %s', len(tables), path)
+    return manifest
+
+
+def _is_url(source):
+    return urlparse(source).scheme in ('http', 'https', 'ftp', 'file')
+
+
+def _open(source):
+    return urlopen(source) if _is_url(source) else open(source, 'rb')
+
+
+def get_published_checksum(source):
+    """returns the checksum published next to a snapshot (``<source>.sha256``) or None
+
+    :param str source: path or URL of a snapshot
+    :rtype: str
+    """
+    try:
+        with _open(source + '.sha256') as file:
+            checksum = file.read().decode('utf-8').split()[0]
+    except (OSError, URLError, IndexError):
+        return None
+
+    log.info('checksum of %s: %s', source, checksum)
+    return checksum
+
+
+def _check_manifest(manifest, url, force):
+    """raises a SnapshotError if a snapshot can not be restored to a database"""
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise SnapshotError('snapshot format {} is not supported'.format(manifest.get('format')))
+
+    if manifest['kind'] == 'sqlite' and url.get_backend_name() != 'sqlite':
+        raise SnapshotError('snapshot of a SQLite database can not be restored to {}, create it with '
+                            'dump=True'.format(url.get_backend_name()))
+
+    if manifest['schema_version'] != get_schema_version() and not force:
+        raise SnapshotError('schema version {} of snapshot differs from installed schema {}'.format(
+            manifest['schema_version'], get_schema_version()))
+
+    for file_name in manifest['files']:
+        if os.path.isabs(file_name) or os.path.normpath(file_name).startswith('..'):
+            raise SnapshotError('invalid file name {} in snapshot'.format(file_name))
+
+
+def _extract(reader, staging, url, force):
+    """extracts a snapshot stream into a folder and verifies the size and checksum of every file
+
+    :return: manifest
+    :rtype: dict
+    """
+    manifest = None
+    extracted = set()
+
+    with tarfile.open(fileobj=reader, mode='r|*') as archive:
+        for member in archive:
+            if manifest is None:
+                if member.name != MANIFEST:
+                    raise SnapshotError('first file of snapshot is {}, not {}'.format(member.name, MANIFEST))
+                manifest = json.loads(archive.extractfile(member).read().decode('utf-8'))
+                _check_manifest(manifest, url, force)
+                continue
+
+            if member.name not in manifest['files'] or not member.isfile():
+                raise SnapshotError('unexpected file {} in snapshot'.format(member.name))
+
+            path = os.path.join(staging, member.name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            source = archive.extractfile(member)
+            sha256 = hashlib.sha256()
+
+            with open(path, 'wb') as file:
+                for block in iter(lambda: source.read(BUFFER_SIZE), b''):
+                    sha256.update(block)
+                    file.write(block)
+
+            expected = manifest['files'][member.name]
+            checksum = {'size': os.path.getsize(path), 'sha256': sha256.hexdigest()}
+            if checksum != expected:
+                raise SnapshotError('checksum of {} is {}, expected {}'.format(member.name, checksum, expected))
+
+            log.info('extracted and verified %s', member.name)
+            extracted.add(member.name)
+
+    if manifest is None:
+        raise SnapshotError('snapshot is empty')
+
+    missing = set(manifest['files']) - extracted
+    if missing:
+        raise SnapshotError('files {} missing in snapshot'.format(sorted(missing)))
+
+    return manifest
+
+
+def _load_dump(engine, staging, manifest, chunksize=CHUNKSIZE):
+    """creates all tables and inserts the rows of a dump in one transaction"""
+    with engine.begin() as db_connection:
+        models.Base.metadata.drop_all(db_connection)
+        models.Base.metadata.create_all(db_connection)
+
+        for table in models.Base.metadata.sorted_tables:
+            if table.name not in manifest['tables']:
+                continue
+
+            number_of_rows = 0
+
+            with gzip.open(os.path.join(staging, _get_dump_name(table.name)), 'rt', encoding='utf-8') as file:
+                names = json.loads(next(file))
+                binary_names = {table.columns[position].name for position in _get_binary_columns(table)}
+                rows = []
+
+                for line in file:
+                    row = {name: value for name, value in zip(names, json.loads(line)) if name in table.c}
+                    for name in binary_names.intersection(row):
+                        if row[name] is not None:
+                            row[name] = base64.b64decode(row[name])
+                    rows.append(row)
+
+                    if len(rows) == chunksize:
+                        db_connection.execute(table.insert(), rows)
+                        number_of_rows += len(rows)
+                        rows = []
+
+                if rows:
+                    db_connection.execute(table.insert(), rows)
+                    number_of_rows += len(rows)
+
+            if number_of_rows != manifest['tables'][table.name]:
+                raise SnapshotError('{} rows loaded into {}, expected {}'.format(
+                    number_of_rows, table.name, manifest['tables'][table.name]))
+
+            log.info('loaded %s rows into %s', number_of_rows, table.name)
+
+
+def _check_sqlite(path, manifest):
+    """raises a SnapshotError if the staged SQLite database can not be read or has another data version"""
+    database = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+
+    try:
+        meta = dict(database.execute('SELECT key, value FROM {}'.format(models.Meta.__tablename__)).fetchall())
+    except sqlite3.DatabaseError as e:
+        raise SnapshotError('restored database can not be read: {}'.format(e))
+    finally:
+        database.close()
+
+    if meta.get('data_version') != manifest['data_version']:
+        raise SnapshotError('data version {} of restored database differs from manifest {}'.format(
+            meta.get('data_version'), manifest['data_version']))
+
+
+def restore_snapshot(source, connection=None, checksum=None, force=False, chunksize=CHUNKSIZE):
+    """downloads or reads a snapshot, verifies it and replaces the database
+
+    Nothing is changed if a checksum does not match.
+
+    :param str source: path or URL of the snapshot
+    :param str connection: SQLAlchemy connection string (default: configured connection string)
+    :param str checksum: expected SHA-256 checksum of the snapshot file (default: the published checksum in
+        ``<source>.sha256`` if it exists)
+    :param bool force: if True snapshots of other schema versions are restored
+    :param int chunksize: number of rows inserted at once for dumps
+    :return: manifest
+    :rtype: dict
+    """
+    connection = get_connection_string(connection)
+    url = make_url(connection)
+    sqlite = url.get_backend_name() == 'sqlite'
+
+    if sqlite and url.database in (None, '', ':memory:'):
+        raise ValueError('snapshot can not be restored to an in-memory SQLite database')
+
+    checksum = checksum or get_published_checksum(source)
+    if checksum is None:
+        log.warning('no checksum of %s, only the files in the snapshot are verified', source)
+
+    directory = os.path.dirname(os.path.abspath(url.database)) if sqlite else None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.tmp.snapshot.', dir=directory)
+
+    try:
+        log.info('restore snapshot from %s', source)
+
+        with _open(source) as file:
+            reader = _HashingReader(file)
+
+            try:
+                manifest = _extract(reader, staging, url, force)
+            except tarfile.TarError as e:
+                raise SnapshotError('snapshot {} is corrupted: {}'.format(source, e))
+
+            if checksum is not None:
+                file_checksum = reader.hexdigest()
+                if file_checksum != checksum.lower():
+                    raise SnapshotError('checksum of {} is {}, expected {}'.format(source, file_checksum, checksum))
+
+        if not sqlite:
+            _load_dump(get_engine(connection), staging, manifest, chunksize=chunksize)
+        else:
+            path = os.path.join(staging, SQLITE_FILE)
+
+            if manifest['kind'] == 'dump':
+                engine = create_engine('sqlite:///' + path)
+                try:
+                    _load_dump(engine, staging, manifest, chunksize=chunksize)
+                finally:
+                    engine.dispose()
+
+            _check_sqlite(path, manifest)
+
+            dispose_engines(connection)
+            for suffix in ('-wal', '-shm', '-journal'):
+                if os.path.exists(url.database + suffix):
+                    os.remove(url.database + suffix)
+            os.replace(path, url.database)
+    finally:
+        shutil.rmtree(staging)
+
+    log.info('restored snapshot of data version %s (CTD release %s)', manifest['data_version'],
+             manifest['ctd_release'])
+    return manifest
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""Cached statement templates of the ``get_*`` methods of :class:`pyctd.manager.query.QueryManager`
+
+Building an ORM query with chains of ``join``/``filter`` and generating its cache key costs more Python time than
+executing a short lookup in the database. Therefore the statement of every shape of a call (method, the names of the
+given filters, limit and ``load``) is built once as a template with named bind parameters; later calls with the same
+shape only bind their values to the template.
+
+A template is derived from the existing method by calling it on a manager without session (:class:`DataRead` is
+raised instead of reading data), with placeholder values (:func:`get_placeholder`) for the filters. Nothing is executed
+while a template is built. A filter value becomes a bind parameter if its placeholder appears unchanged as value of a
+bind parameter of the built statement. Filters whose value changes the structure of the statement (e.g. an operator
+like ``'>'`` or a value transformed in Python) are part of the shape instead. Statements which depend on data read
+while they are built (e.g. the tree numbers of a chemical in ``get_chemical_ancestors``) are not cached. Values cached
+per data version (e.g. the size of the top-k tables) are used, since templates are cached per data version, too.
+
+Templates are wrapped in :func:`sqlalchemy.lambda_stmt`, so that executing them skips generating the cache key of
+the whole statement.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import bindparam, inspect, lambda_stmt
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.elements import BindParameter
+
+PARAMETER_PREFIX = 'pyctd_'
+"""prefix of the names of the bind parameters in templates"""
+
+STRUCTURAL_ARGUMENTS = ('limit', 'as_df', 'load', 'result_type')
+"""arguments which are always part of the shape"""
+
+Template = namedtuple('Template', ['statement', 'parameters', 'scalars'])
+Template.__doc__ = """Statement with bind parameters named :data:`PARAMETER_PREFIX` + argument name; scalars is True if
+the rows are model instances"""
+
+
+_template_ids = itertools.count()
+
+
+class DataRead(Exception):
+    """raised instead of reading data while a template is built"""
+
+
+class NotCached(DataRead):
+    """raised while a template is built if a value cached per data version is not loaded yet"""
+
+
+def get_placeholder(name):
+    """returns the placeholder value of an argument used to build a template
+
+    :param str name: name of the argument
+    :rtype: str
+    """
+    return '<{}{}>'.format(PARAMETER_PREFIX, name)
+
+
+def is_parameter(name, value):
+    """returns True if the value of an argument is a candidate for a bind parameter
+
+    Only non-empty strings and numbers are candidates; ``None``, empty values and booleans select the structure of the
+    statement (``if gene_symbol: ...``).
+    """
+    return name not in STRUCTURAL_ARGUMENTS and bool(value) and isinstance(value, (str, int, float)) and \
+        not isinstance(value, bool)
+
+
+def get_shape(method, arguments):
+    """returns the shape of a call and the names of the candidates for bind parameters
+
+    :param str method: name of the method
+    :param dict arguments: argument names and values
+    :return: hashable shape or None if a structural argument is not hashable
+    :rtype: tuple[tuple,frozenset]
+    """
+    names, structure = [], []
+
+    for name, value in sorted(arguments.items()):
+        if is_parameter(name, value):
+            names.append(name)
+        else:
+            if isinstance(value, list):
+                value = tuple(value)
+            structure.append((name, value))
+
+    try:
+        hash(tuple(structure))
+    except TypeError:
+        return None, None
+
+    return (method, tuple(structure), tuple(names)), frozenset(names)
+
+
+def _get_bind_values(statement):
+    values = []
+    visitors.traverse(statement, {}, {'bindparam': lambda bind: values.append(bind.value)})
+    return values
+
+
+def _contains(value, placeholder):
+    if isinstance(value, str):
+        return placeholder in value
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return any(_contains(x, placeholder) for x in value)
+    return placeholder in str(value)
+
+
+def find_parameters(statement, names):
+    """returns the names of the arguments whose placeholders are unchanged values of bind parameters
+
+    :param statement: statement built with placeholders
+    :param iter[str] names: names of the arguments with placeholders
+    :rtype: frozenset[str]
+    """
+    values = _get_bind_values(statement)
+    found = []
+
+    for name in names:
+        placeholder = get_placeholder(name)
+        unchanged = [value for value in values if value == placeholder]
+        changed = [value for value in values if value != placeholder and _contains(value, placeholder)]
+        if unchanged and not changed:
+            found.append(name)
+
+    return frozenset(found)
+
+
+def make_template(query, names):
+    """returns a template of a query built with placeholders
+
+    :param sqlalchemy.orm.query.Query query: query built with placeholders for the names
+    :param iter[str] names: names of the arguments which become bind parameters
+    :rtype: Template
+    """
+    placeholders = {get_placeholder(name): name for name in names}
+
+    def replace(element):
+        if isinstance(element, BindParameter) and isinstance(element.value, str) and element.value in placeholders:
+            return bindparam(PARAMETER_PREFIX + placeholders[element.value], type_=element.type)
+
+    statement = visitors.replacement_traverse(query.statement, {}, replace)
+    template_id = next(_template_ids)
+
+    descriptions = query.column_descriptions
+    entity = inspect(descriptions[0]['expr'], raiseerr=False) if len(descriptions) == 1 else None
+    scalars = getattr(entity, 'is_mapper', False) or getattr(entity, 'is_aliased_class', False)
+
+    return Template(lambda_stmt(lambda: statement, track_closure_variables=False, track_on=[template_id]),
+                    tuple(sorted(placeholders.values())), scalars)
+
+
+class TemplateCache(object):
+    """least recently used cache of templates (and the bind parameters of shapes), safe for concurrent threads"""
+
+    def __init__(self, size):
+        """
+        :param int size: maximum number of entries
+        """
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """returns the entry of a key and marks it as recently used"""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        """adds an entry and evicts the least recently used entries if the cache is full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def values(self):
+        """returns a list of all entries"""
+        with self._lock:
+            return list(self._entries.values())
+
+    def clear(self):
+        """removes all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def execute(session, template, arguments):
+    """executes a template with the values of the arguments and returns the results like the ORM query (model
+    instances are unique like in the results of the ORM query)
+
+    :param sqlalchemy.orm.Session session: session
+    :param Template template: template
+    :param dict arguments: argument names and values
+    :rtype: list
+    """
+    parameters = {PARAMETER_PREFIX + name: arguments[name] for name in template.parameters}
+    result = session.execute(template.statement, parameters)
+    return result.scalars().unique().all() if template.scalars else result.all()
@@ -1,13 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+import importlib.util
+import json
 import logging
 import os
 import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
+import pandas
+from sqlalchemy import create_engine, event, exc, func, select, text
+from sqlalchemy.dialects import postgresql
+
 import pyctd
 from pyctd.constants import PYCTD_DATA_DIR
-from pyctd.manager import table_conf
+from pyctd.manager import cache, explain, export, statements, table_conf
+from pyctd.manager.async_query import AsyncQueryManager
 from pyctd.manager.database import DbManager, BaseDbManager
 from pyctd.manager.defaults import DEFAULT_SQLITE_TEST_DATABASE_NAME, sqlalchemy_connection_string_4_tests
 from pyctd.manager.models import (
@@ -25,6 +38,7 @@ from pyctd.manager.models import (
     ChemGeneIxnGeneForm,
     ChemGeneIxnPubmed,
     ChemGeneIxnInteractionAction,
+    InteractionActionType,
     ChemicalDiseasePubmedid,
     ChemicalDiseaseOmim,
     ChemicalSynonym,
@@ -39,13 +53,20 @@ from pyctd.manager.models import (
     DiseaseSynonym,
     DiseaseSlimmapping,
     DiseaseAltdiseaseid,
+    DiseaseTreenumber,
     Action,
     ChemGoEnriched,
     ChemicalParenttreenumber,
     ChemPathwayEnriched,
-    ExposureEvent
+    ExposureEvent,
+    Vocabulary,
+    Base
 )
+from pyctd.manager.loading import LazyLoadError
+from pyctd.manager.packed import PackedStorageError, pack, unpack, unpack_many
 from pyctd.manager.query import QueryManager
+from pyctd.manager.readonly import ReadOnlyError, ReadOnlyQueryManager
+from pyctd.manager.snapshot import SnapshotError, create_snapshot, restore_snapshot
 
 log = logging.getLogger(__name__)
 
@@ -55,14 +76,13 @@ connection = sqlalchemy_connection_string_4_tests
 
 # test data folder
 test_data_folder = os.path.join(PYCTD_DATA_DIR, 'tests')
-if not os.path.exists(test_data_folder):
-    os.mkdir(test_data_folder)
+os.makedirs(test_data_folder, exist_ok=True)
 
 
 def download_urls(cls, *args, **kwargs):
     """overwrites pyctd.manager.database.DbManager.download_urls in TestImport.setup"""
 
-    file_names = [x['file_name'] for x in list(table_conf.tables.values())]
+    file_names = [x.file_name for x in list(table_conf.tables.values())]
     for file_name in file_names:
         test_file_path = os.path.join(dir_path, test_data_location, file_name)
         destination_path = os.path.join(test_data_folder, file_name)
@@ -74,7 +94,7 @@ class TestImport(unittest.TestCase):
     def setUpClass(cls):
         DbManager.pyctd_data_dir = test_data_folder
         DbManager.download_urls = download_urls
-        pyctd.update(connection=connection)
+        pyctd.update(connection=connection, top_k=2)
         cls.query = QueryManager(connection=connection)
         cls.session = BaseDbManager(connection=connection).session
 
@@ -100,6 +120,7 @@ class TestImport(unittest.TestCase):
             (ChemGeneIxnGeneForm, 12),
             (ChemGeneIxnPubmed, 12),
             (ChemGeneIxnInteractionAction, 6),
+            (InteractionActionType, 6),
             (ChemicalDiseasePubmedid, 12),
             (ChemicalDiseaseOmim, 12),
             (ChemicalSynonym, 6),
@@ -114,6 +135,7 @@ class TestImport(unittest.TestCase):
             (DiseaseSynonym, 6),
             (DiseaseSlimmapping, 6),
             (DiseaseAltdiseaseid, 6),
+            (DiseaseTreenumber, 6),
             (Action, 3),
             (ChemGoEnriched, 3),
             (ChemicalParenttreenumber, 6),
@@ -203,6 +225,32 @@ class TestImport(unittest.TestCase):
 
     def test_direct_evidences(self):
         direct_evidences = self.query.direct_evidences
+        self.assertEqual(['DirectEvidence1', 'DirectEvidence2', 'DirectEvidence3', 'DirectEvidence4',
+                          'DirectEvidence5', 'DirectEvidence6'], direct_evidences)
+
+    def test_vocabulary(self):
+        self.assertEqual(6, self.session.query(Vocabulary).filter(Vocabulary.name == 'gene_form').count())
+        self.assertEqual(2, self.query.vocabulary('gene_form')['GeneForm1_1'])
+
+        with self.assertRaises(ValueError):
+            self.query.vocabulary('unknown')
+
+        self.query.gene_forms, self.query.actions
+        statements = []
+
+        def count_statements(*args):
+            statements.append(args[2])
+
+        event.listen(self.query.engine, 'before_cursor_execute', count_statements)
+        try:
+            self.assertIn('GeneForm1_1', self.query.gene_forms)
+            self.assertEqual(['TypeName1', 'TypeName2', 'TypeName3'], self.query.actions)
+        finally:
+            event.remove(self.query.engine, 'before_cursor_execute', count_statements)
+        self.assertEqual([], statements)
+
+        pathway = self.query.get_pathway(pathway_id='PathwayID1')[0]
+        self.assertIn(pathway, self.query.pathways)
 
     def test_get_disease_pathways(self):
         disease_pathways = self.query.get_disease_pathways()[0]
@@ -228,5 +276,898 @@ class TestImport(unittest.TestCase):
     def test_get_chemical__by__disease(self):
         r = self.query.get_chemical__by__disease(disease_name='DiseaseName1', limit=1)[0]
 
+    def test_top_k(self):
+        self.assertEqual(2, self.query.top_k)
+        self.assertIsNotNone(self.query.data_version)
+
+        for method, name in [('get_chemical__by__disease', 'DiseaseName1'),
+                             ('get_go_enriched__by__chemical_name', 'ChemicalName1'),
+                             ('get_pathway_enriched__by__chemical_name', 'ChemicalName1')]:
+            all_results = getattr(self.query, method)(name)
+            self.assertEqual(all_results[:1], getattr(self.query, method)(name, limit=1))
+            self.assertEqual(all_results[:2], getattr(self.query, method)(name, limit=2))
+            self.assertEqual(all_results[:3], getattr(self.query, method)(name, limit=3))
+
+        statements = []
+
+        def count_statements(*args):
+            statements.append(args[2])
+
+        event.listen(self.query.engine, 'before_cursor_execute', count_statements)
+        try:
+            self.assertEqual(2, self.query.top_k)
+        finally:
+            event.remove(self.query.engine, 'before_cursor_execute', count_statements)
+        self.assertEqual([], statements)
+
+    def test_graph(self):
+        graph = self.query.get_graph(cache=False)
+        chemical_genes = {}
+        for ixn in self.query.session.query(ChemGeneIxn):
+            if ixn.chemical and ixn.gene:
+                chemical_genes.setdefault(ixn.chemical.chemical_id, set()).add(str(ixn.gene.gene_id))
+
+        chemical_id, gene_ids = sorted(chemical_genes.items())[0]
+        chemical = graph.node('chemical', chemical_id)
+        self.assertEqual('chemical', graph.node_type(chemical))
+        genes = graph.neighbors(chemical, node_type='gene')
+        self.assertEqual(gene_ids, {graph.identifier(node) for node in genes})
+
+        diseases = graph.expand(chemical, path=('gene', 'disease'))
+        self.assertTrue(set(diseases) <= set(graph.k_hop(chemical, 2, node_type='disease')))
+
+        gene = genes[0]
+        self.assertEqual([chemical, gene], graph.shortest_path(chemical, gene))
+        self.assertEqual(chemical, graph.shortest_path(gene, chemical)[-1])
+
+        subgraph = graph.subgraph([chemical, gene])
+        self.assertEqual(2, subgraph.number_of_nodes)
+        self.assertEqual(1, subgraph.number_of_edges)
+
+        path = os.path.join(PYCTD_DATA_DIR, 'test_graph.npz')
+        graph.save(path)
+        loaded = pyctd.manager.graph.Graph.load(path)
+        os.remove(path)
+        self.assertEqual(list(genes), list(loaded.neighbors(chemical, node_type='gene')))
+
+    def test_cache_files(self):
+        cache_dir = tempfile.mkdtemp()
+        other = QueryManager.from_session(self.query.session)
+        other.connection = 'sqlite:///other.db'
+        built = []
+
+        def build():
+            built.append(1)
+            return pyctd.manager.graph.Graph.from_manager(self.query)
+
+        def from_cache(manager):
+            return cache.load_or_build(manager, 'graph', build, pyctd.manager.graph.Graph.load,
+                                       pyctd.manager.graph.Graph.save, cache_dir=cache_dir)
+
+        try:
+            graph = from_cache(self.query)
+            from_cache(self.query)
+            from_cache(other)
+            self.assertEqual(2, len(built))
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+
+            path = cache.get_path(self.query, 'graph', cache_dir=cache_dir)
+            stale_path = path.replace(self.query.data_version, '20000101000000000000')
+            os.rename(path, stale_path)
+            self.assertEqual(graph.number_of_edges, from_cache(self.query).number_of_edges)
+            self.assertEqual(3, len(built))
+            self.assertFalse(os.path.exists(stale_path))
+            self.assertTrue(os.path.exists(cache.get_path(other, 'graph', cache_dir=cache_dir)))
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_matrix(self):
+        chemical_disease = self.query.get_matrix('chemical_disease', cache=False)
+        self.assertEqual((3, 3), chemical_disease.matrix.shape)
+        self.assertEqual(['ChemicalID1', 'ChemicalID2', 'ChemicalID3'], list(chemical_disease.row_ids))
+        self.assertEqual([[1, 1, 0], [0, 2, 1], [0, 0, 1]], chemical_disease.matrix.toarray().tolist())
+        self.assertEqual(1, chemical_disease.row_index['ChemicalID2'])
+
+        scores = self.query.get_matrix('chemical_disease', weight='inference_score')
+        self.assertAlmostEqual(1.1, scores.matrix[0, scores.column_index['DiseaseID2']], places=5)
+        self.assertEqual(list(chemical_disease.column_ids), list(scores.column_ids))
+
+        direct = self.query.get_matrix('chemical_disease', direct_evidence='DirectEvidence1')
+        self.assertEqual([('ChemicalID1', 'DiseaseID1', 1)], list(direct.to_frame().itertuples(index=False)))
+        cached = self.query.get_matrix('chemical_disease', direct_evidence='DirectEvidence1')
+        self.assertEqual(direct.matrix.nnz, cached.matrix.nnz)
+        self.assertEqual(('chemical', 'disease'), (cached.row_type, cached.column_type))
+
+        chemical_gene = self.query.get_matrix('chemical_gene', organism_id=6).to_frame()
+        self.assertEqual([('ChemicalID2', '3', 1)], list(chemical_gene.itertuples(index=False)))
+
+        gene_pathway = self.query.get_matrix('gene_pathway', weight='binary')
+        self.assertEqual([2, 2, 1], list(gene_pathway.matrix.sum(axis=1).A1))
+
+        with self.assertRaises(ValueError):
+            self.query.get_matrix('gene_pathway', weight='inference_score')
+        with self.assertRaises(ValueError):
+            self.query.get_matrix('chemical_disease', organism_id=9606)
+
+    def test_similarity(self):
+        self.assertEqual([('ChemicalID2', 0.5)], self.query.similar_chemicals('ChemicalID3'))
+        self.assertEqual([('ChemicalID2', 0.5)], self.query.similar_chemicals('ChemicalID3', profile='disease'))
+        self.assertEqual([], self.query.similar_chemicals('ChemicalID3', min_similarity=0.6))
+        self.assertEqual([], self.query.similar_chemicals('ChemicalID1'))
+
+        index = self.query.get_similarity_index('gene', profile='chemical')
+        self.assertIs(index, self.query.get_similarity_index('gene', profile='chemical'))
+        self.assertEqual([('2', 0.5)], index.similar('3'))
+        self.assertEqual([1.0, 0.5, 0.0], list(index.jaccard(index.index['3'], [2, 1, 0])))
+
+        with self.assertRaises(ValueError):
+            self.query.similar_chemicals('ChemicalID9')
+        with self.assertRaises(ValueError):
+            self.query.get_similarity_index('chemical', profile='pathway')
+
+    def test_propagate(self):
+        genes = self.query.propagate(['ChemicalID1'], node_type='gene')
+        self.assertEqual(['rank', 'node_type', 'identifier', 'score'], list(genes.columns))
+        self.assertEqual('1', genes.identifier[0])
+        self.assertEqual({'1', '2', '3'}, set(genes.identifier))
+        self.assertEqual([1, 2, 3], list(genes['rank']))
+
+        propagator = self.query.get_propagator()
+        self.assertIs(propagator, self.query.get_propagator())
+        scores = propagator.scores([['ChemicalID1'], [('gene', '3'), ('disease', 'DiseaseID1')]], tolerance=1e-10)
+        self.assertAlmostEqual(1, scores[:, 0].sum())
+        self.assertAlmostEqual(1, scores[:, 1].sum())
+
+        nodes = self.query.propagate(['ChemicalID1'], limit=None, exclude_seeds=False)
+        self.assertEqual(('chemical', 'ChemicalID1'), tuple(nodes.loc[0, ['node_type', 'identifier']]))
+        self.assertEqual(12, len(nodes))
+
+        batch = self.query.propagate_batch({'a': ['ChemicalID1'], 'b': ['ChemicalID3'], 'c': ['unknown']},
+                                           node_type='disease', limit=2)
+        self.assertEqual(['a', 'a', 'b', 'b'], list(batch.seed_set))
+        self.assertEqual('DiseaseID3', batch.identifier[2])
+
+        chemical_gene = self.query.propagate(['ChemicalID1'], edge_types=['chem_gene_ixn'], limit=None)
+        self.assertEqual([('gene', '1')], list(zip(chemical_gene.node_type, chemical_gene.identifier)))
+
+        with self.assertRaises(ValueError):
+            self.query.propagate(['ChemicalID1'], edge_types=['unknown'])
+
+    def test_export(self):
+        directory = tempfile.mkdtemp()
+
+        path = os.path.join(directory, 'chemical_diseases.tsv.gz')
+        self.assertEqual(2, self.query.export('get_chemical_diseases', path, chemical_name='ChemicalName1'))
+        exported = pandas.read_csv(path, sep='\t')
+        self.assertEqual(['DirectEvidence1', 'DirectEvidence4'], sorted(exported.direct_evidence))
+
+        path = os.path.join(directory, 'genes.jsonl')
+        self.assertEqual(3, self.query.export('get_gene', path, children=True))
+        with open(path) as file:
+            genes = [json.loads(line) for line in file]
+        self.assertEqual(['Synonym1_1', 'Synonym1_2'], genes[0]['synonyms'])
+        self.assertEqual(1, genes[0]['gene_id'])
+
+        counts = self.query.export_tables(os.path.join(directory, 'tables'), tables=['chemical', 'chem_gene_ixn'],
+                                          children=True, chunksize=2)
+        self.assertEqual(3, counts[os.path.join(directory, 'tables', 'chemical.tsv')])
+        interactions = pandas.read_csv(os.path.join(directory, 'tables', 'chem_gene_ixn.tsv'), sep='\t')
+        self.assertEqual('1|2', interactions.pubmed_ids[0])
+        self.assertEqual(6, len(interactions))
+
+        counts = self.query.export_neo4j(os.path.join(directory, 'neo4j'))
+        self.assertEqual(6, counts[os.path.join(directory, 'neo4j', 'chemical__disease.csv')])
+        genes = pandas.read_csv(os.path.join(directory, 'neo4j', 'gene.csv'))
+        self.assertEqual(['gene_id:ID(Gene)', 'gene_symbol', 'gene_name', ':LABEL'], list(genes.columns))
+        relations = pandas.read_csv(os.path.join(directory, 'neo4j', 'chem_gene_ixn.csv'))
+        self.assertEqual([':START_ID(Chemical)', ':END_ID(Gene)', 'organism_id:long', 'interaction', ':TYPE'],
+                         list(relations.columns))
+
+        with self.assertRaises(ValueError):
+            self.query.export('get_gene', os.path.join(directory, 'genes.csv'))
+
+        path = os.path.join(directory, 'chemicals.jsonl')
+        self.assertEqual(3, self.query.export('get_chemical', path, synonym='%', chunksize=1))
+        statement = select(Chemical).join(ChemicalSynonym).order_by(Chemical.id)
+        self.assertEqual(3, export.export_statement(self.query.engine, statement, path, chunksize=1, unique=True))
+        with open(path) as file:
+            self.assertEqual([1, 2, 3], [json.loads(line)['id'] for line in file])
+
+        with self.assertRaises(exc.OperationalError):
+            export.export_statement(self.query.engine, statement.where(text('unknown = 1')),
+                                    os.path.join(directory, 'failed.jsonl'))
+        self.assertNotIn('.tmp.failed.jsonl', os.listdir(directory))
+        self.assertNotIn('failed.jsonl', os.listdir(directory))
+
+        shutil.rmtree(directory)
+
+    def test_snapshot(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'ctd.tar.gz')
+        restored = 'sqlite:///' + os.path.join(directory, 'restored', 'pyctd.db')
+
+        manifest = create_snapshot(path, connection=connection)
+        self.assertEqual('sqlite', manifest['kind'])
+        self.assertEqual(3, manifest['tables']['pyctd_chemical'])
+        self.assertEqual(self.query.data_version, manifest['data_version'])
+        self.assertTrue(os.path.exists(path + '.sha256'))
+
+        self.assertEqual(manifest, restore_snapshot(path, connection=restored))
+        query = QueryManager(connection=restored)
+        self.assertEqual(self.query.data_version, query.data_version)
+        self.assertEqual(6, query.count('get_chemical_diseases'))
+
+        path = os.path.join(directory, 'ctd.tar')
+        manifest = create_snapshot(path, connection=connection, compression=None, dump=True)
+        self.assertEqual('dump', manifest['kind'])
+        restore_snapshot(path, connection=restored)
+        query = QueryManager(connection=restored)
+        self.assertEqual([x.inference_score for x in self.query.get_chemical_diseases()],
+                         [x.inference_score for x in query.get_chemical_diseases()])
+
+        with self.assertRaises(SnapshotError):
+            restore_snapshot(path, connection=restored, checksum='0' * 64)
+
+        path = os.path.join(directory, 'corrupted.tar')
+        create_snapshot(path, connection=connection, compression=None)
+        with open(path, 'r+b') as file:
+            file.seek(4096)
+            byte = file.read(1)
+            file.seek(4096)
+            file.write(bytes([byte[0] ^ 1]))
+        with self.assertRaises(SnapshotError):
+            restore_snapshot(path, connection=restored)
+        self.assertEqual(self.query.data_version, query.data_version)
+        self.assertEqual(6, query.count('get_chemical_diseases'))
+
+        query.engine.dispose()
+        shutil.rmtree(directory)
+
+    def test_resolve(self):
+        resolver = self.query.get_resolver()
+        self.assertIs(resolver, self.query.get_resolver())
+
+        candidate = self.query.resolve('ChemcalName2')[0]
+        self.assertEqual(('chemical', 'ChemicalID2', 'ChemicalName2'), candidate[:3])
+        self.assertLess(candidate.score, 1)
+        self.assertEqual(1.0, self.query.resolve('CHEMICALNAME2')[0].score)
+
+        genes = self.query.resolve('GeneSymbol1', entity_types=['gene'], limit=2)
+        self.assertEqual([('gene', '1', 'GeneSymbol1', 1.0)], genes[:1])
+        self.assertEqual(2, len(genes))
+        self.assertEqual([], self.query.resolve('xyz', min_score=0.5))
+        self.assertEqual('DiseaseID1', self.query.resolve('synonym1_2', entity_types=['disease'])[0].identifier)
+
+        results = self.query.resolve_batch(['DiseaseName3', 'unknown', 'Chemical Name1'], limit=1)
+        self.assertEqual(['DiseaseID3', 'ChemicalID1'], list(results.identifier))
+        self.assertEqual(['DiseaseName3', 'Chemical Name1'], list(results['query']))
+
+        path = os.path.join(PYCTD_DATA_DIR, 'test_resolver.idx')
+        resolver.save(path)
+        loaded = pyctd.manager.resolver.EntityResolver.load(path)
+        self.assertEqual(resolver.resolve('GeneName2'), loaded.resolve('GeneName2'))
+        del loaded
+        os.remove(path)
+
+    def test_resolve_empty_database(self):
+        directory = tempfile.mkdtemp()
+        manager = BaseDbManager(connection='sqlite:///' + os.path.join(directory, 'empty.db'))
+        Base.metadata.create_all(manager.engine)
+
+        try:
+            resolver = pyctd.manager.resolver.EntityResolver.from_manager(manager)
+            self.assertEqual([], resolver.resolve('ChemicalName1'))
+
+            path = os.path.join(directory, 'resolver.idx')
+            resolver.save(path)
+            loaded = pyctd.manager.resolver.EntityResolver.load(path)
+            self.assertEqual([], loaded.resolve('ChemicalName1'))
+            del loaded
+        finally:
+            manager.engine.dispose()
+            shutil.rmtree(directory)
+
+    def test_enrich(self):
+        results = self.query.enrich([1, 2, 999])
+        self.assertEqual(['PathwayID2', 'PathwayID1', 'PathwayID3'], list(results.pathway_id))
+        self.assertEqual([2, 1, 1], list(results.target_match_qty))
+        self.assertEqual([2, 2, 2], list(results.target_total_qty))
+        self.assertEqual([2, 1, 2], list(results.background_match_qty))
+        self.assertAlmostEqual(1 / 3, results.p_value[0])
+        self.assertAlmostEqual(2 / 3, results.p_value[1])
+        self.assertAlmostEqual(1, results.corrected_p_value[0])
+
+        fdr = self.query.enrich([1, 2], correction='fdr_bh')
+        self.assertEqual([1, 1, 1], list(fdr.corrected_p_value))
+
+        batch = self.query.enrich_batch({'a': [1, 2], 'b': [3], 'c': []})
+        self.assertEqual(['a', 'a', 'a', 'b'], list(batch.gene_set))
+        self.assertEqual('PathwayID3', batch.pathway_id[3])
+        self.assertEqual(0, len(self.query.enrich_batch([[1, 2], [3]], max_p_value=0.5)))
+        self.assertEqual(4, len(self.query.enrich_batch([[1, 2], [3]], max_p_value=1)))
+
+        with self.assertRaises(ValueError):
+            self.query.enrich([1], against='go')
+
+    def test_hierarchy(self):
+        disease1, disease2 = self.query.get_disease(disease_id='DiseaseID1')[0], \
+            self.query.get_disease(disease_id='DiseaseID2')[0]
+        chemical1, chemical3 = self.query.get_chemical(chemical_id='ChemicalID1')[0], \
+            self.query.get_chemical(chemical_id='ChemicalID3')[0]
+        entries = [
+            DiseaseTreenumber(disease=disease2, tree_number='TreeNumber1_1.1'),
+            DiseaseTreenumber(disease=disease2, tree_number='TreeNumber1_2/1'),
+            ChemicalTreenumber(chemical=chemical3, tree_number='TreeNumber1_1.1.1'),
+        ]
+        self.query.session.add_all(entries)
+        self.query.session.commit()
+
+        try:
+            self.assertEqual([disease2], self.query.get_disease_descendants(disease_id='DiseaseID1'))
+            self.assertEqual({disease1, disease2},
+                             set(self.query.get_disease_descendants(tree_number='TreeNumber1_1', include_self=True)))
+            self.assertEqual([], self.query.get_disease_descendants(tree_number='TreeNumber1_10'))
+            self.assertEqual([disease1], self.query.get_disease_ancestors(disease_id='DiseaseID2'))
+            self.assertEqual([disease1], self.query.get_disease_ancestors(tree_number='TreeNumber1_2/1'))
+
+            self.assertEqual([chemical3], self.query.get_chemical_descendants(chemical_id='ChemicalID1'))
+            self.assertEqual({chemical1, chemical3},
+                             set(self.query.get_chemical_ancestors(chemical_id='ChemicalID3', include_self=True)))
+
+            branch = self.query.get_chemical_diseases(disease_branch='TreeNumber1_1')
+            self.assertEqual({'DiseaseID1', 'DiseaseID2'}, {x.disease.disease_id for x in branch})
+            self.assertEqual(4, len(branch))
+            self.assertEqual(4, len(self.query.get_gene_disease(disease_branch='TreeNumber1_1')))
+
+            with self.assertRaises(ValueError):
+                self.query.get_disease_descendants()
+        finally:
+            for entry in entries:
+                self.query.session.delete(entry)
+            self.query.session.commit()
+
+    def test_paginate(self):
+        method = 'get_chem_gene_interaction_actions'
+        expected = sorted(self.query.get_chem_gene_interaction_actions(), key=lambda x: x.id)
+        results, cursors, cursor = [], [], None
+        while True:
+            page = self.query.paginate(method, page_size=4, cursor=cursor)
+            results.extend(page.items)
+            cursors.append(page.cursor)
+            if not page.cursor:
+                break
+            cursor = page.cursor
+        self.assertEqual(expected, results)
+        self.assertEqual(2, len(cursors))
+
+        page = self.query.paginate(method, page_size=3, cursor=cursors[0], as_df=True)
+        self.assertEqual([x.id for x in expected[4:]], list(page.items.id))
+        page = self.query.paginate(method, page_size=3, result_type='array')
+        self.assertEqual([x.id for x in expected[:3]], list(page.items['id']))
+        self.assertEqual(expected[3:6], self.query.paginate(method, page_size=3, cursor=page.cursor).items)
+
+        ranked, cursor = [], None
+        while True:
+            page = self.query.paginate('get_chemical__by__disease', 'DiseaseName2', page_size=1, cursor=cursor)
+            ranked.extend(page.items)
+            cursor = page.cursor
+            if not cursor:
+                break
+        self.assertEqual(set(self.query.get_chemical__by__disease('DiseaseName2')), set(ranked))
+        self.assertEqual(len(self.query.get_chemical__by__disease('DiseaseName2')), len(ranked))
+
+        for method, kwargs in [('get_chemical', {'synonym': '%'}),
+                               ('get_disease', {'synonym': '%'}),
+                               ('get_chem_gene_interaction_actions', {'gene_form': 'GeneForm1_1'}),
+                               ('get_chem_gene_interaction_actions', {'chemical_name': 'ChemicalName%'}),
+                               ('get_disease_descendants', {'tree_number': 'TreeNumber1_1', 'include_self': True})]:
+            expected = sorted(getattr(self.query, method)(**kwargs), key=lambda x: x.id)
+            self.assertTrue(expected)
+            for page_size in range(1, len(expected) + 2):
+                results, cursor = [], None
+                while True:
+                    page = self.query.paginate(method, page_size=page_size, cursor=cursor, **kwargs)
+                    results.extend(page.items)
+                    cursor = page.cursor
+                    if not cursor:
+                        break
+                self.assertEqual(expected, results, (method, page_size))
+
+        with self.assertRaises(ValueError):
+            self.query.paginate('get_gene', cursor=cursors[0])
+
+    def test_count(self):
+        for method, kwargs in [('get_chem_gene_interaction_actions', {}),
+                               ('get_chem_gene_interaction_actions', {'chemical_name': 'ChemicalName2'}),
+                               ('get_chemical__by__disease', {'disease_name': 'DiseaseName2', 'limit': 1}),
+                               ('get_chemical_diseases', {'disease_branch': 'TreeNumber1_1'}),
+                               ('get_disease_descendants', {'tree_number': 'TreeNumber1_1', 'include_self': True}),
+                               ('get_chemical', {'synonym': '%'}),
+                               ('get_chemical', {'synonym': '%', 'limit': 2}),
+                               ('get_disease', {'synonym': '%'}),
+                               ('get_gene', {'gene_symbol': 'unknown'})]:
+            number = len(getattr(self.query, method)(**kwargs))
+            self.assertEqual(number, self.query.count(method, **kwargs))
+            self.assertEqual(number > 0, self.query.exists(method, **kwargs))
+            self.assertGreaterEqual(self.query.estimate(method, **kwargs), number)
+        self.assertEqual(6, self.query.estimate('get_chem_gene_interaction_actions'))
+
+    def test_estimate_sqlite(self):
+        engine = create_engine('sqlite://')
+        with engine.begin() as connection:
+            connection.exec_driver_sql('CREATE TABLE t (a INTEGER, b INTEGER)')
+            connection.exec_driver_sql('CREATE INDEX ix_t_a ON t (a)')
+            connection.exec_driver_sql('INSERT INTO t VALUES ' + ', '.join(
+                '({}, {})'.format(i % 10, i) for i in range(100)))
+
+        statement = text('SELECT * FROM t WHERE a = 1')
+        self.assertIsNone(explain.estimate_rows(engine, statement))
+
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        self.assertEqual(10, explain.estimate_rows(engine, statement))
+        self.assertEqual(100, explain.estimate_rows(engine, text('SELECT * FROM t WHERE b = 1')))
+        self.assertEqual(1, explain.estimate_rows(engine, text('SELECT * FROM t WHERE rowid = 1')))
+        self.assertEqual(25, explain.estimate_rows(engine, text('SELECT * FROM t WHERE a > 1')))
+
+    def test_explain(self):
+        statement = self.query._get_query('get_chemical_ancestors', tree_number='D01.029.105').statement
+        sql, parameters = explain._compile(statement, postgresql.dialect())
+        self.assertNotIn('POSTCOMPILE', sql)
+        self.assertIn('IN (%(', sql)
+        self.assertTrue(explain.explain(self.query.engine, statement))
+
+    def test_interaction_action_codes(self):
+        action = self.query.session.query(Action).filter(Action.type_name == 'TypeName2').one()
+        type_ids = DbManager(connection=connection).get_interaction_action_type_ids(['decreases^TypeName2'])
+        entry = ChemGeneIxnInteractionAction(chem_gene_ixn__id=1,
+                                             interaction_action_type__id=type_ids['decreases^TypeName2'])
+        self.query.session.add(entry)
+        self.query.session.commit()
+
+        try:
+            self.assertEqual(7, len(type_ids))
+            self.assertEqual('decreases^TypeName2', entry.interaction_action)
+            self.assertEqual('decreases', entry.interaction_action_type.interaction)
+            self.assertEqual(action, entry.interaction_action_type.action)
+
+            results = self.query.get_chem_gene_interaction_actions(interaction='decreases', action='TypeName2')
+            self.assertEqual([1], [x.id for x in results])
+            self.assertEqual(results, self.query.get_chem_gene_interaction_actions(action='Code2'))
+            self.assertEqual(results, self.query.get_chem_gene_interaction_actions(interaction_action='decreases^%'))
+            self.assertEqual([], self.query.get_chem_gene_interaction_actions(interaction='increases'))
+
+            with self.assertRaises(ValueError):
+                self.query.get_chem_gene_interaction_actions(interaction='unknown')
+
+            with self.assertRaises(ValueError):
+                self.query.get_chem_gene_interaction_actions(action='unknown')
+        finally:
+            self.query.session.delete(entry)
+            self.query.session.delete(entry.interaction_action_type)
+            self.query.session.commit()
+
+    def test_statement_cache(self):
+        calls = [
+            ('get_gene', {'gene_symbol': 'GeneSymbol1'}),
+            ('get_gene', {'gene_symbol': 'GeneSymbol%'}),
+            ('get_chem_gene_interaction_actions', {'chemical_name': 'ChemicalName2', 'load': 'chemical'}),
+            ('get_chemical__by__disease', {'disease_name': 'DiseaseName2', 'limit': 1}),
+            ('get_chemical_diseases', {'disease_branch': 'TreeNumber1_1'}),
+            ('get_chemical_ancestors', {'chemical_id': 'ChemicalID1', 'include_self': True}),
+            ('get_chemical', {'synonym': '%'}),
+            ('get_disease', {'synonym': '%'}),
+        ]
+        templates = self.query._get_cached('statements', lambda: statements.TemplateCache(500))
+        templates.clear()
+        executed = []
+
+        def record(*args):
+            executed.append(args[2:4])
+
+        event.listen(self.query.engine, 'after_cursor_execute', record)
+        try:
+            cached = [getattr(self.query, method)(**kwargs) for method, kwargs in calls]
+        finally:
+            event.remove(self.query.engine, 'after_cursor_execute', record)
+        self.assertNotIn(statements.get_placeholder(''), str(executed))
+
+        self.query.statement_cache_size = 0
+        try:
+            self.assertEqual([getattr(self.query, method)(**kwargs) for method, kwargs in calls], cached)
+        finally:
+            del self.query.statement_cache_size
+
+        self.assertEqual(['GeneSymbol1'], [x.gene_symbol for x in cached[0]])
+        self.assertEqual(3, len(cached[1]))
+        self.assertEqual(3, len(cached[6]))
+        self.assertEqual(3, len(cached[7]))
+
+        templates = [x for x in templates.values() if isinstance(x, statements.Template)]
+        self.assertIn(('gene_symbol',), [x.parameters for x in templates])
+        self.assertIn(('disease_name',), [x.parameters for x in templates])
+        self.assertIn(('synonym',), [x.parameters for x in templates])
+
+        executed.clear()
+        event.listen(self.query.engine, 'after_cursor_execute', record)
+        try:
+            self.assertEqual(cached[0], self.query.get_gene(gene_symbol='GeneSymbol1'))
+            templates.clear()
+            self.assertEqual(cached[1], self.query.get_gene(gene_symbol='GeneSymbol%'))
+        finally:
+            event.remove(self.query.engine, 'after_cursor_execute', record)
+        self.assertEqual(2, len(executed))
+
+    def test_template_cache(self):
+        templates = statements.TemplateCache(2)
+        templates.set('a', 1)
+        templates.set('b', 2)
+        self.assertEqual(1, templates.get('a'))
+        templates.set('c', 3)
+        self.assertEqual([1, 3], templates.values())
+        self.assertIsNone(templates.get('b'))
+        self.assertEqual(2, len(templates))
+
+    def test_instrument(self):
+        instrumentation = self.query.instrument(slow_query_threshold=0)
+
+        try:
+            results = self.query.get_chem_gene_interaction_actions(load='chemical')
+            self.query.paginate('get_gene', page_size=1)
+            self.query.count('get_gene')
+
+            stats = instrumentation.stats()
+            self.assertEqual(['get_chem_gene_interaction_actions', 'paginate', 'count'], list(stats))
+
+            method_stats = stats['get_chem_gene_interaction_actions']
+            self.assertEqual(1, method_stats['calls'])
+            self.assertEqual(len(results), method_stats['rows_returned'])
+            self.assertGreater(method_stats['rows_hydrated'], len(results))
+            self.assertEqual(1, method_stats['histogram'][float('inf')])
+            self.assertEqual(1, stats['paginate']['rows_returned'])
+
+            slow_query = instrumentation.slow_queries[0]
+            self.assertEqual('get_chem_gene_interaction_actions', slow_query.method)
+            self.assertTrue(slow_query.statement.startswith('SELECT'))
+            self.assertTrue(slow_query.plan)
+
+            metrics = instrumentation.to_prometheus()
+            self.assertIn('pyctd_query_duration_seconds_count{method="count"} 1', metrics)
+            self.assertIn('pyctd_query_duration_seconds_bucket{method="paginate",le="+Inf"} 1', metrics)
+
+            instrumentation.reset()
+            self.assertEqual({}, instrumentation.stats())
+            self.assertEqual(0, len(instrumentation.slow_queries))
+
+            self.query.get_graph()
+            self.query.get_matrix('chemical_disease')
+            self.assertEqual({}, instrumentation.stats())
+
+            with self.query.engine.connect() as connection:
+                instrumentation._after_cursor_execute(connection, None, 'SELECT 1', (), None, False)
+
+            self.assertIsNot(instrumentation, self.query.instrument())
+            self.assertFalse(event.contains(Base, 'load', instrumentation._on_load))
+            instrumentation = self.query.instrumentation
+            self.assertTrue(event.contains(Base, 'load', instrumentation._on_load))
+        finally:
+            self.query.uninstrument()
+
+        self.assertIsNone(self.query.instrumentation)
+        self.assertFalse(event.contains(Base, 'load', instrumentation._on_load))
+        self.query.get_gene()
+        self.assertEqual({}, instrumentation.stats())
+
     def get_action(self):
         action = self.query.get_action()[0]
+
+    def test_load(self):
+        self.query.session.expire_all()
+        with self.query.lazy_load_guard(raise_on_lazy=True) as guard:
+            interactions = self.query.get_chem_gene_interaction_actions(load=['pubmed_id_list', 'chemical.synonyms'])
+            pubmed_ids = [x.pubmed_id for ixn in interactions for x in ixn.pubmed_ids]
+            self.assertEqual(pubmed_ids, [x for ixn in interactions for x in ixn.pubmed_id_list])
+            synonyms = {x.synonym for ixn in interactions for x in ixn.chemical.synonyms}
+        self.assertEqual(12, len(pubmed_ids))
+        self.assertEqual(5, len(synonyms))
+        self.assertEqual(0, guard.count)
+
+        interactions = self.query.session.query(ChemGeneIxn).filter(
+            ChemGeneIxn.pubmed_ids.any(ChemGeneIxnPubmed.pubmed_id == 4)).all()
+        self.assertEqual([2], [ixn.id for ixn in interactions])
+
+    def test_get_parent_ids(self):
+        self.assertEqual('rows', self.query.id_lists)
+        self.assertEqual({1: [1], 4: [2]}, self.query.get_parent_ids('chem_gene_ixn__pubmed_id', [1, 4, 99]))
+
+    def test_get_by_pubmed(self):
+        self.assertTrue(self.query.has_id_index)
+
+        executed = []
+
+        def record(*args):
+            executed.append(args[2])
+
+        event.listen(self.query.engine, 'before_cursor_execute', record)
+        try:
+            self.assertTrue(self.query.has_id_index)
+        finally:
+            event.remove(self.query.engine, 'before_cursor_execute', record)
+        self.assertEqual([], executed)
+
+        with self.query.lazy_load_guard(raise_on_lazy=True):
+            results = self.query.get_by_pubmed([4, 1, 99], load={'chemical__disease': 'chemical'})
+            self.assertEqual([1, 4, 99], list(results))
+            self.assertEqual(['chem_gene_ixn', 'chemical__disease', 'gene__disease'], list(results[1]))
+            self.assertEqual('ChemicalID1', results[1]['chemical__disease'][0].chemical.chemical_id)
+
+        self.assertEqual({'chem_gene_ixn': [2], 'chemical__disease': [2], 'gene__disease': [2]},
+                         {name: [x.id for x in rows] for name, rows in results[4].items()})
+        self.assertEqual({'chem_gene_ixn': [], 'chemical__disease': [], 'gene__disease': []}, results[99])
+
+    def test_lazy_load_guard(self):
+        self.query.session.expire_all()
+        gene = self.query.get_gene(limit=1)[0]
+        with self.assertRaises(LazyLoadError):
+            with self.query.lazy_load_guard(raise_on_lazy=True):
+                gene.synonyms
+        with self.assertRaises(ValueError):
+            self.query.get_chemical(load='gene_interactions')
+
+        self.assertIsInstance(self.query.get_exposure_event(load=['chemical', 'disease']), list)
+
+    def test_result_type(self):
+        chemical_diseases = self.query.get_chemical_diseases(result_type='tuple', chemical_name='ChemicalName1')
+        self.assertEqual({'ChemicalID1'}, {x.chemical_id for x in chemical_diseases})
+        self.assertEqual(len(chemical_diseases), len(self.query.get_chemical_diseases(chemical_name='ChemicalName1')))
+
+        gene = self.query.get_gene(result_type='record', limit=1)[0]
+        self.assertEqual(('id', 'gene_symbol', 'gene_name', 'gene_id'), gene.__slots__)
+        self.assertEqual('GeneSymbol1', gene.gene_symbol)
+
+        enriched = self.query.get_pathway_enriched__by__chemical_name('ChemicalName1', result_type='array')
+        self.assertIn('corrected_p_value', enriched.dtype.names)
+        self.assertIn('pathway_id', enriched.dtype.names)
+
+        chemicals = self.query.get_chemical(synonym='%')
+        self.assertEqual(3, len(chemicals))
+        for result_type in ('tuple', 'record', 'array'):
+            self.assertEqual([x.id for x in chemicals],
+                             [x['id'] if result_type == 'array' else x.id
+                              for x in self.query.get_chemical(synonym='%', result_type=result_type)])
+        self.assertEqual(2, len(self.query.get_chemical(synonym='%', limit=2, result_type='tuple')))
+
+        with self.assertRaises(ValueError):
+            self.query.get_chemical(result_type='tuple', load='synonyms')
+
+    def test_async_query(self):
+        async def run():
+            q = AsyncQueryManager(connection=connection)
+            genes, pathways = await q.gather(q.get_gene(limit=1, load='synonyms'), q.get_pathway())
+            gene_forms = await q.gene_forms
+            stream = q.stream('get_chem_gene_interaction_actions', load='pubmed_ids', batch_size=2)
+            ixns = [ixn async for ixn in stream]
+            stream = q.stream('get_chem_gene_interaction_actions', action='TypeName1')
+            action_ixns = [ixn.id async for ixn in stream]
+            await q.dispose()
+            return genes, pathways, gene_forms, ixns, action_ixns
+
+        genes, pathways, gene_forms, ixns, action_ixns = asyncio.run(run())
+        self.assertEqual([x.id for x in self.query.get_chem_gene_interaction_actions(action='TypeName1')],
+                         action_ixns)
+        self.assertEqual(['Synonym1_1', 'Synonym1_2'], [x.synonym for x in genes[0].synonyms])
+        self.assertEqual(3, len(pathways))
+        self.assertEqual(self.query.gene_forms, gene_forms)
+        self.assertEqual(12, sum(len(ixn.pubmed_ids) for ixn in ixns))
+
+    def test_read_only(self):
+        query = ReadOnlyQueryManager(connection=connection, mmap_size=2 ** 20, cache_size=512, prewarm=True)
+        self.assertTrue(query.connection.endswith('?mode=ro&uri=true'))
+        self.assertEqual([x.gene_id for x in self.query.get_gene()], [x.gene_id for x in query.get_gene()])
+
+        with query.engine.connect() as db_connection:
+            self.assertEqual(2 ** 20, db_connection.exec_driver_sql('PRAGMA mmap_size').scalar())
+            self.assertEqual(1, db_connection.exec_driver_sql('PRAGMA query_only').scalar())
+            self.assertTrue(db_connection.exec_driver_sql('PRAGMA main.table_info("pyctd_gene")').all())
+            for statement in ('PRAGMA query_only = OFF', 'pragma QUERY_ONLY(0)', 'PRAGMA main.query_only=0',
+                              'PRAGMA journal_mode = WAL', 'PRAGMA writable_schema = ON'):
+                with self.assertRaises(ReadOnlyError):
+                    db_connection.exec_driver_sql(statement)
+            self.assertEqual(1, db_connection.exec_driver_sql('PRAGMA query_only').scalar())
+
+        query.session.add(Pathway(pathway_id='PathwayID4', pathway_name='PathwayName4'))
+        with self.assertRaises(ReadOnlyError):
+            query.session.commit()
+        query.session.rollback()
+        query.remove_session()
+        query.engine.dispose()
+
+        with self.assertRaises(ValueError):
+            ReadOnlyQueryManager(connection='sqlite://')
+
+    @unittest.skipUnless(importlib.util.find_spec('duckdb_engine'), 'needs pip install pyctd[columnar]')
+    def test_columnar(self):
+        from pyctd.manager.columnar import ColumnarQueryManager
+
+        directory = os.path.join(test_data_folder, 'parquet')
+        DbManager(connection=connection).build_parquet(directory)
+        query = ColumnarQueryManager(directory, threads=2)
+
+        try:
+            self.assertEqual(self.query.data_version, query.data_version)
+            self.assertEqual(self.query.gene_forms, query.gene_forms)
+
+            for method, kwargs in [('get_gene', {'gene_id': 1}),
+                                   ('get_chem_gene_interaction_actions', {'gene_symbol': 'GeneSymbol%'}),
+                                   ('get_chem_gene_interaction_actions', {'interaction_action': 'Interaction%',
+                                                                          'chemical_name': 'ChemicalName2'}),
+                                   ('get_chemical_diseases', {'disease_branch': 'TreeNumber1_1'}),
+                                   ('get_chemical__by__disease', {'disease_name': 'DiseaseName2'})]:
+                expected = getattr(self.query, method)(**kwargs)
+                self.assertEqual(sorted(x.id for x in expected),
+                                 sorted(x.id for x in getattr(query, method)(**kwargs)))
+                self.assertEqual(len(expected), query.count(method, **kwargs))
+
+            chemical_diseases = query.get_chemical_diseases(as_df=True)
+            self.assertEqual(6, len(chemical_diseases))
+            self.assertIn('inference_score', chemical_diseases.columns)
+
+            page = query.paginate('get_gene', page_size=2)
+            self.assertEqual([1, 2], [x.id for x in page.items])
+        finally:
+            query.remove_session()
+            query.engine.dispose()
+
+    def test_shared_engine(self):
+        query = QueryManager(connection=connection)
+        self.assertIs(self.query.engine, query.engine)
+        self.assertIs(self.query.session, query.session)
+
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(query.session))
+        thread.start()
+        thread.join()
+        self.assertIsNot(query.session, sessions[0])
+
+        with query.session_scope() as session:
+            self.assertIs(session, query.session)
+        self.assertIsNot(session, query.session)
+
+    def test_concurrent_caches(self):
+        calls = []
+
+        def load():
+            calls.append(threading.get_ident())
+            time.sleep(0.05)
+            return object()
+
+        barrier = threading.Barrier(8)
+        results = []
+
+        def run():
+            barrier.wait()
+            try:
+                results.append((self.query._get_cached('concurrent_test', load), self.query.get_graph()))
+            finally:
+                self.query.remove_session()
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(8, len(results))
+        self.assertEqual(1, len({id(value) for value, _ in results}))
+        self.assertEqual(1, len({id(graph) for _, graph in results}))
+
+
+class TestPackedImport(unittest.TestCase):
+    packed_connection = 'sqlite:///pyctd_test_packed.db'
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(test_data_folder, exist_ok=True)
+        DbManager.pyctd_data_dir = test_data_folder
+        DbManager.download_urls = download_urls
+        pyctd.update(connection=cls.packed_connection, packed=True)
+        cls.query = QueryManager(connection=cls.packed_connection)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.query.remove_session()
+        cls.query.engine.dispose()
+        os.remove('pyctd_test_packed.db')
+        shutil.rmtree(test_data_folder)
+
+    def test_pack(self):
+        ids = [2 ** 40, 7, 22659286, 16120699, 7]
+        self.assertEqual(sorted(ids), unpack(pack(ids)))
+        self.assertEqual(3, len(pack([1, 2, 3])))
+
+        values, counts = unpack_many([pack([5, 300]), b'', pack([2 ** 40])])
+        self.assertEqual([5, 300, 2 ** 40], values.tolist())
+        self.assertEqual([2, 0, 1], counts.tolist())
+
+    def test_id_lists(self):
+        self.assertEqual('packed', self.query.id_lists)
+        with self.query.engine.connect() as db_connection:
+            self.assertEqual(0, db_connection.execute(select(func.count()).select_from(ChemGeneIxnPubmed)).scalar())
+
+        with self.assertRaises(PackedStorageError):
+            self.query.session.query(ChemicalDiseaseOmim).count()
+
+        with self.assertRaises(PackedStorageError):
+            self.query.session.query(ChemGeneIxn).filter(
+                ChemGeneIxn.pubmed_ids.any(ChemGeneIxnPubmed.pubmed_id == 1)).all()
+
+        with self.query.lazy_load_guard(raise_on_lazy=True):
+            interactions = self.query.get_chem_gene_interaction_actions(load='pubmed_ids')
+            expected = [[1, 2], [3, 4], [5, 6], [7, 8], [9, 10], [11, 12]]
+            self.assertEqual(expected, [[x.pubmed_id for x in ixn.pubmed_ids] for ixn in interactions])
+            self.assertEqual(expected, [ixn.pubmed_id_list for ixn in interactions])
+
+        async def stream():
+            q = AsyncQueryManager(connection=self.packed_connection)
+            ixns = [ixn async for ixn in q.stream('get_chem_gene_interaction_actions', load='pubmed_ids')]
+            await q.dispose()
+            return ixns
+
+        self.assertEqual(12, sum(len(ixn.pubmed_ids) for ixn in asyncio.run(stream())))
+
+        self.query.session.expire_all()
+        chemical_diseases = self.query.get_chemical_diseases(chemical_name='ChemicalName1')
+        with self.query.lazy_load_guard() as guard:
+            self.assertEqual([[1, 2]], sorted(cd.omim_id_list for cd in chemical_diseases)[:1])
+        self.assertEqual(len(chemical_diseases), guard.count)
+        self.assertEqual(6, len(self.query.get_gene_disease()))
+
+    def test_get_parent_ids(self):
+        interactions = {ixn.id: ixn.pubmed_id_list for ixn in self.query.get_chem_gene_interaction_actions()}
+        parent_ids = self.query.get_parent_ids('chem_gene_ixn__pubmed_id', [1, 4, 99])
+        self.assertEqual({1, 4}, set(parent_ids))
+        for pubmed_id, ixn_ids in parent_ids.items():
+            self.assertEqual(sorted(ixn_id for ixn_id, pubmed_ids in interactions.items() if pubmed_id in pubmed_ids),
+                             ixn_ids)
+
+        with self.assertRaises(ValueError):
+            self.query.get_parent_ids('chemical__synonym', [1])
+
+    def test_get_by_pubmed(self):
+        results = self.query.get_by_pubmed([1, 4, 99], load='pubmed_id_list')
+        self.assertEqual({'chem_gene_ixn': [1], 'chemical__disease': [1], 'gene__disease': [1]},
+                         {name: [x.id for x in rows] for name, rows in results[1].items()})
+        self.assertTrue(all(4 in row.pubmed_id_list for rows in results[4].values() for row in rows))
+        self.assertEqual([], results[99]['chem_gene_ixn'])
+
+    def test_export(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'interactions.jsonl')
+        self.query.export('get_chem_gene_interaction_actions', path, children=True)
+
+        with open(path) as file:
+            interactions = [json.loads(line) for line in file]
+        self.assertEqual([[1, 2], [3, 4], [5, 6], [7, 8], [9, 10], [11, 12]],
+                         [ixn['pubmed_ids'] for ixn in interactions])
+        shutil.rmtree(directory)
+
+
+class TestStartup(unittest.TestCase):
+    def test_lazy_imports(self):
+        home = tempfile.mkdtemp()
+        env = dict(os.environ, HOME=home, PYTHONPATH=os.pathsep.join(sys.path))
+
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            "import sys, pyctd; print(sorted(m for m in ('numpy', 'pandas', 'requests', 'sqlalchemy') "
+            "if m in sys.modules))"
+        ], env=env)
+        self.assertEqual(b'[]', output.strip())
+
+        output = subprocess.check_output([sys.executable, '-m', 'pyctd', 'get-connection'], env=env)
+        self.assertIn(b'pyctd.db', output)
+        self.assertEqual([], os.listdir(home))
+
+        shutil.rmtree(home)